@@ -0,0 +1,123 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+class SemanticAnswerCache:
+    """
+    Caches generated answers keyed on the query embedding.
+
+    A lookup hits when a cached query in the same (madhhab, language, mode)
+    partition has cosine similarity >= `threshold` with the new query, since all
+    three change the system prompt. Entries expire after `ttl` seconds, the
+    least recently used are evicted past `max_entries`, and everything is
+    dropped when the corpus version changes (e.g. after a re-ingest).
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 86400.0, threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.corpus_version = None
+
+        self._entries = OrderedDict()  # id -> entry dict
+        self._partitions = {}          # partition key -> (ids, matrix) or None when stale
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(vector):
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else None
+
+    def check_corpus_version(self, version):
+        """Drops every entry when the corpus has changed since they were stored."""
+        with self._lock:
+            if version != self.corpus_version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._partitions.clear()
+                self.corpus_version = version
+
+    def _matrix(self, partition):
+        cached = self._partitions.get(partition)
+        if cached is None:
+            ids = [entry_id for entry_id, entry in self._entries.items() if entry["partition"] == partition]
+            matrix = np.stack([self._entries[i]["vector"] for i in ids]) if ids else None
+            cached = self._partitions[partition] = (ids, matrix)
+        return cached
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        self._partitions.pop(entry["partition"], None)
+
+    def lookup(self, query_vector, madhhab: str, language: str, mode: str):
+        """Returns the cached {"response", "sources", ...} payload, or None."""
+        if query_vector is None:
+            return None
+        q = self._normalize(query_vector)
+        partition = (madhhab, language, mode)
+        with self._lock:
+            ids, matrix = self._matrix(partition) if q is not None else ([], None)
+            if matrix is not None and matrix.shape[1] == q.shape[0]:
+                scores = matrix @ q
+                now = time.monotonic()
+                for i in np.argsort(-scores):
+                    if scores[i] < self.threshold:
+                        break
+                    entry = self._entries[ids[i]]
+                    if now - entry["created_at"] > self.ttl:
+                        continue
+                    self._entries.move_to_end(ids[i])
+                    self.hits += 1
+                    return {**entry["payload"], "similarity": float(scores[i])}
+            self.misses += 1
+            return None
+
+    def store(self, query_vector, madhhab: str, language: str, mode: str, payload: dict):
+        if query_vector is None:
+            return
+        v = self._normalize(query_vector)
+        if v is None:
+            return
+        partition = (madhhab, language, mode)
+        with self._lock:
+            self._entries[next(self._ids)] = {
+                "vector": v,
+                "partition": partition,
+                "payload": payload,
+                "created_at": time.monotonic(),
+            }
+            self._partitions.pop(partition, None)
+            self.stores += 1
+
+            now = time.monotonic()
+            for entry_id in [i for i, e in self._entries.items() if now - e["created_at"] > self.ttl]:
+                self._remove(entry_id)
+                self.evictions += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
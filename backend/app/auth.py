@@ -1,9 +1,15 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session
 from . import models, database, config
+from .user_cache import UserCache, UserSnapshot
 
 import bcrypt
 
@@ -20,21 +26,122 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     except Exception:
         return False
 
-def get_password_hash(password: str) -> str:
+def get_password_hash(password: str, rounds: Optional[int] = None) -> str:
     # bcrypt (direct) requires bytes, returns bytes
     password_bytes = password.encode("utf-8")[:72]
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=rounds or config.settings.BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password_bytes, salt)
     return hashed.decode("utf-8")
 
+def hash_rounds(hashed_password: str) -> Optional[int]:
+    """The cost factor of a "$2b$12$..." hash, or None if it can't be parsed."""
+    try:
+        return int(hashed_password.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+class PasswordHasher:
+    """
+    Runs bcrypt on its own small thread pool so a login burst can't exhaust the
+    request threadpool. At most `workers + queue_limit` operations are admitted
+    at once; beyond that callers get a 503 with Retry-After instead of queueing
+    without bound.
+    """
+
+    def __init__(self, rounds: int = 12, workers: int = 4, queue_limit: int = 32):
+        self.rounds = rounds
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.latencies = deque(maxlen=1000)
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self.in_flight >= self.workers + self.queue_limit:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many sign-in attempts in progress. Please try again shortly.",
+                    headers={"Retry-After": "1"},
+                )
+            self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.wrap_future(self._executor.submit(fn, *args))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+                self.latencies.append(time.perf_counter() - started)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        return hash_rounds(hashed_password) != self.rounds
+
+    async def rehash(self, password: str, hashed_password: str, store) -> bool:
+        """
+        Re-hashes `password` at the current cost if `hashed_password` used another,
+        and passes the new hash to the async `store`. Returns whether it did; when the
+        pool is saturated it skips, and a later login tries again.
+        """
+        if not self.needs_rehash(hashed_password):
+            return False
+        try:
+            rehashed = await self.hash(password)
+        except HTTPException:
+            return False
+        await store(rehashed)
+        with self._lock:
+            self.rehashed += 1
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            return {
+                "rounds": self.rounds,
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed,
+                "latency_p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+                "latency_p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 1) if latencies else None,
+            }
+
+password_hasher = PasswordHasher(
+    rounds=config.settings.BCRYPT_ROUNDS,
+    workers=config.settings.PASSWORD_HASH_WORKERS,
+    queue_limit=config.settings.PASSWORD_HASH_QUEUE_LIMIT,
+)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=config.settings.ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode["exp"] = expire
     return jwt.encode(to_encode, config.settings.SECRET_KEY, algorithm=config.settings.ALGORITHM)
 
-async def get_current_user(request: Request, db: Session = Depends(database.get_db)) -> Optional[models.User]:
-    """Optional auth — returns None for guests, User object for authenticated requests."""
+user_cache = UserCache(config.settings.USER_CACHE_SIZE, config.settings.USER_CACHE_TTL_SECONDS)
+
+def invalidate_user(user_id: int):
+    """Call after any write to a User row so the next request re-reads it."""
+    user_cache.invalidate(user_id)
+
+def get_current_user(request: Request, db: Session = Depends(database.get_db)) -> Optional[UserSnapshot]:
+    """Optional auth — returns None for guests, a UserSnapshot for authenticated requests.
+    Snapshots are cached by the token's user id claim; on a miss this runs a DB query,
+    so call it from sync handlers or through the threadpool."""
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
         return None
@@ -46,11 +153,27 @@ async def get_current_user(request: Request, db: Session = Depends(database.get_
             return None
     except JWTError:
         return None
-    return db.query(models.User).filter(models.User.email == email).first()
 
-async def require_current_user(request: Request, db: Session = Depends(database.get_db)) -> models.User:
+    # Tokens issued before the uid claim existed fall back to the lookup by email.
+    user_id = payload.get("uid")
+    if user_id is not None:
+        snapshot = user_cache.get(user_id)
+        if snapshot is not None and snapshot.email == email:
+            return snapshot
+        user = db.get(models.User, user_id)
+        if user is None or user.email != email:
+            return None
+    else:
+        user = db.query(models.User).filter(models.User.email == email).first()
+        if user is None:
+            return None
+    snapshot = UserSnapshot.from_user(user)
+    user_cache.put(snapshot)
+    return snapshot
+
+def require_current_user(request: Request, db: Session = Depends(database.get_db)) -> UserSnapshot:
     """Required auth — raises 401 if not authenticated."""
-    user = await get_current_user(request, db)
+    user = get_current_user(request, db)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
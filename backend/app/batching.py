@@ -0,0 +1,91 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+HISTOGRAM_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item calls into batch calls.
+
+    Callers block in `submit`. A collector thread waits up to `window` seconds
+    after the first pending item (or until `max_batch_size` items are queued),
+    then hands the batch to `batch_fn` on a small worker pool, so one batch
+    can be in flight while the next is being collected. `batch_fn` takes a
+    list of items and returns a list of results in the same order.
+    """
+
+    def __init__(self, batch_fn, window: float = 0.005, max_batch_size: int = 32, max_in_flight: int = 4, name: str = "batcher"):
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch_size = max(1, max_batch_size)
+        self.name = name
+        self._pending = []
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix=f"{name}-batch")
+        self._collector = None
+
+        self.batches = 0
+        self.items = 0
+        self.histogram = {bucket: 0 for bucket in HISTOGRAM_BUCKETS}
+        self.histogram["+Inf"] = 0
+
+    def submit(self, item, timeout: float = None):
+        future = Future()
+        with self._cond:
+            if self._collector is None or not self._collector.is_alive():
+                self._collector = threading.Thread(target=self._collect, name=f"{self.name}-collector", daemon=True)
+                self._collector.start()
+            self._pending.append((item, future))
+            self._cond.notify()
+        return future.result(timeout=timeout)
+
+    def _collect(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+            self._record(len(batch))
+            self._pool.submit(self._run, batch)
+
+    def _run(self, batch):
+        try:
+            results = self.batch_fn([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"{self.name}: batch_fn returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _record(self, size: int):
+        self.batches += 1
+        self.items += size
+        for bucket in HISTOGRAM_BUCKETS:
+            if size <= bucket:
+                self.histogram[bucket] += 1
+                return
+        self.histogram["+Inf"] += 1
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "batch_size_histogram": {str(k): v for k, v in self.histogram.items()},
+        }
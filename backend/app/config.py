@@ -13,6 +13,91 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-super-secret-key-for-ilm-ai-v2")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 1 Week
+    # bcrypt cost; existing hashes are upgraded on the next successful login
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    # Dedicated bcrypt threads, and how many more hashes may wait before 503s
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PASSWORD_HASH_QUEUE_LIMIT: int = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+
+    # Database connection pool, per worker process: DB_POOL_SIZE kept open, up to DB_MAX_OVERFLOW more under load
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT_SECONDS: float = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+    # Replace connections older than this, before the server or a proxy drops them
+    DB_POOL_RECYCLE_SECONDS: int = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    # Apply pending schema migrations when the app starts; turn off when deploys run scripts/migrate.py
+    AUTO_MIGRATE: bool = os.getenv("AUTO_MIGRATE", "true").lower() == "true"
+
+    # Write-behind chat history: rows per INSERT, and longest a row waits for its batch
+    HISTORY_BATCH_SIZE: int = int(os.getenv("HISTORY_BATCH_SIZE", "100"))
+    HISTORY_FLUSH_INTERVAL_MS: float = float(os.getenv("HISTORY_FLUSH_INTERVAL_MS", "50"))
+    # Finish each answer only once its history row is committed, so /history on any worker shows it;
+    # false answers first, and only readers in the same worker are guaranteed to see the turn
+    HISTORY_WAIT_FOR_COMMIT: bool = os.getenv("HISTORY_WAIT_FOR_COMMIT", "true").lower() == "true"
+
+    # Hold each Groq model to the free tier's requests/tokens per minute client-side; turn off on a plan with
+    # higher limits (server 429s still move a query to the next model either way)
+    GROQ_CLIENT_BUDGETS: bool = os.getenv("GROQ_CLIENT_BUDGETS", "true").lower() == "true"
+
+    # Load indexes, open the DB pool and create API clients at startup, before GET /ready reports ready;
+    # off, all of it happens on first use and /ready is ready once migrations are done
+    WARMUP: bool = os.getenv("WARMUP", "false").lower() == "true"
+
+    # Alternative API endpoints (a proxy, or the stand-ins in scripts/fake_apis.py); empty for the real services
+    GEMINI_API_ENDPOINT: str = os.getenv("GEMINI_API_ENDPOINT", "")
+    GROQ_BASE_URL: str = os.getenv("GROQ_BASE_URL", "")
+    TAVILY_API_BASE_URL: str = os.getenv("TAVILY_API_BASE_URL", "")
+
+    # Per-stage timings (embedding, retrieval, web search, LLM, ...) in a Server-Timing response header;
+    # the same timings always feed the histograms on GET /metrics
+    SERVER_TIMING: bool = os.getenv("SERVER_TIMING", "true").lower() == "true"
+
+    # Worker threads for blocking DB / SDK calls made from async handlers
+    THREADPOOL_SIZE: int = int(os.getenv("THREADPOOL_SIZE", "64"))
+
+    # Retrieval Settings
+    VECTOR_INDEX_REFRESH_SECONDS: float = float(os.getenv("VECTOR_INDEX_REFRESH_SECONDS", "30"))
+    # BM25 keyword search over the corpus text, fused with semantic results
+    LEXICAL_SEARCH: bool = os.getenv("LEXICAL_SEARCH", "true").lower() == "true"
+    RRF_K: int = int(os.getenv("RRF_K", "60"))
+    # BM25 hits scoring below this share of an average-length document containing every query term once are dropped
+    LEXICAL_MIN_SCORE: float = float(os.getenv("LEXICAL_MIN_SCORE", "0.5"))
+    # Cap on verses loaded for one query's explicit references (e.g. a whole surah)
+    MAX_REFERENCE_VERSES: int = int(os.getenv("MAX_REFERENCE_VERSES", "40"))
+    # Per-process cache of authenticated users' profiles (not usage counters)
+    USER_CACHE_SIZE: int = int(os.getenv("USER_CACHE_SIZE", "10000"))
+    USER_CACHE_TTL_SECONDS: float = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+    # Directory for the shared, memory-mapped int8 embedding store (in-process index only)
+    EMBEDDING_STORE_DIR: str = os.getenv("EMBEDDING_STORE_DIR", "")
+    # pgvector ANN index on PostgreSQL: hnsw, ivfflat or none
+    VECTOR_ANN_INDEX: str = os.getenv("VECTOR_ANN_INDEX", "hnsw")
+    HNSW_M: int = int(os.getenv("HNSW_M", "16"))
+    HNSW_EF_CONSTRUCTION: int = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+    HNSW_EF_SEARCH: int = int(os.getenv("HNSW_EF_SEARCH", "40"))
+    IVFFLAT_LISTS: int = int(os.getenv("IVFFLAT_LISTS", "100"))
+    IVFFLAT_PROBES: int = int(os.getenv("IVFFLAT_PROBES", "10"))
+
+    # Tokens of retrieved context in the system prompt (lowered to fit the smallest fallback model),
+    # and the most any one passage may take before it is trimmed to its most relevant sentences
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+    CONTEXT_PASSAGE_TOKENS: int = int(os.getenv("CONTEXT_PASSAGE_TOKENS", "300"))
+
+    # Web search is started speculatively and never waited on past this deadline
+    WEB_SEARCH_DEADLINE_SECONDS: float = float(os.getenv("WEB_SEARCH_DEADLINE_SECONDS", "4"))
+
+    # Semantic answer cache: reuse an answer when a new query is this similar to a cached one
+    ANSWER_CACHE_SIZE: int = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+    ANSWER_CACHE_TTL_SECONDS: float = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+    ANSWER_CACHE_THRESHOLD: float = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+    # Query embedding cache; set EMBEDDING_CACHE_PATH to persist it across restarts
+    EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", "")
+
+    # Micro-batching of concurrent embedding calls
+    EMBEDDING_BATCH_WINDOW_MS: float = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+    EMBEDDING_BATCH_MAX_SIZE: int = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
 
     class Config:
         case_sensitive = True
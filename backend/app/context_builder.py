@@ -0,0 +1,232 @@
+import re
+from dataclasses import dataclass
+from typing import NamedTuple
+from .lexical_index import tokenize
+
+# Context windows of the Groq models we route to; unknown models get the smallest.
+MODEL_CONTEXT_WINDOWS = {
+    "llama-3.3-70b-versatile": 131072,
+    "llama-3.1-70b-versatile": 131072,
+    "mixtral-8x7b-32768": 32768,
+    "llama3-8b-8192": 8192,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Average characters per token by script for each tokenizer family. Llama 3's
+# 128k vocabulary packs English at ~4 chars/token; Mixtral's 32k vocabulary has
+# few Arabic or Bengali merges and falls back to bytes (~3 tokens per Bengali
+# character). Estimates only: neither tokenizer ships with the Groq SDK.
+TOKENIZER_RATIOS = {
+    "llama3": {"latin": 4.0, "arabic": 2.0, "bengali": 1.0, "other": 1.5},
+    "mixtral": {"latin": 3.3, "arabic": 1.0, "bengali": 0.35, "other": 1.0},
+}
+MODEL_TOKENIZERS = {
+    "llama-3.3-70b-versatile": "llama3",
+    "llama-3.1-70b-versatile": "llama3",
+    "mixtral-8x7b-32768": "mixtral",
+    "llama3-8b-8192": "llama3",
+}
+
+_ARABIC = re.compile("[\u0600-\u06FF\u0750-\u077F\uFB50-\uFDFF\uFE70-\uFEFF]")
+_BENGALI = re.compile("[\u0980-\u09FF]")
+_NON_LATIN = re.compile("[^\u0000-\u024F]")
+# Sentence ends in English, Arabic (؟ ۔) and Bangla (। ॥), or a line break.
+_SENTENCE_END = re.compile(r"(?<=[.!?؟۔।॥])\s+|\n+")
+
+# Reading order and weight of each source kind: Quran, then Hadith, then Fiqh, then the web.
+SOURCE_PRIORITY = {"quran": 1.0, "hadith": 0.8, "fiqh": 0.7, "web": 0.4}
+
+# Every verse is its own citation, so verses are never dropped as repeats (of each other or of
+# anything else); they still make later passages that quote them count as duplicates.
+EXEMPT_FROM_DEDUP = frozenset({"quran"})
+
+def context_window(model: str) -> int:
+    return MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+def count_tokens(text: str, model: str) -> int:
+    """Estimated tokens for `text` under `model`'s tokenizer, counting each script at its own rate."""
+    if not text:
+        return 0
+    ratios = TOKENIZER_RATIOS[MODEL_TOKENIZERS.get(model, "mixtral")]
+    arabic = len(_ARABIC.findall(text))
+    bengali = len(_BENGALI.findall(text))
+    other = len(_NON_LATIN.findall(text)) - arabic - bengali
+    latin = len(text) - arabic - bengali - other
+    return int(
+        latin / ratios["latin"] + arabic / ratios["arabic"] + bengali / ratios["bengali"] + other / ratios["other"]
+    ) + 1
+
+def count_tokens_any(text: str, models) -> int:
+    """The largest estimate across `models`, so the text fits whichever one serves the request."""
+    return max(count_tokens(text, model) for model in models)
+
+@dataclass
+class Passage:
+    """One retrieved source as it appears in the prompt: `header` and `footer` are kept whole, `body` may be trimmed."""
+    kind: str
+    header: str
+    body: str
+    footer: str = ""
+    rank: int = 0
+
+    def render(self, body: str = None) -> str:
+        return f"{self.header}{self.body if body is None else body}{self.footer}"
+
+class BuiltContext(NamedTuple):
+    context: str
+    web_context: str
+    tokens: int
+    budget: int
+    included: int
+    trimmed: int
+    duplicates: int
+    dropped: int
+    kept: tuple  # indices of the passages that made it into the context, in the caller's order
+
+def split_sentences(text: str):
+    return [s.strip() for s in _SENTENCE_END.split(text) if s and s.strip()]
+
+def _covered(words: set, other: set) -> float:
+    """Share of `words` already present in `other`."""
+    return len(words & other) / len(words)
+
+class ContextBuilder:
+    """
+    Packs retrieved passages into a token budget for the system prompt.
+
+    Passages are taken in order of source priority times reciprocal rank. A
+    passage whose words are mostly covered by one already taken (the same
+    hadith in two collections) is skipped, as is any sentence repeating one
+    already taken (a web page quoting a verse), and a passage longer than
+    `passage_tokens` keeps only its sentences that share the most terms with
+    the query. The budget is `budget_tokens`, lowered if
+    needed so the prompt plus a completion fits the smallest context window
+    among the models that may serve it.
+    """
+
+    MIN_PASSAGE_TOKENS = 40
+    MIN_DEDUP_WORDS = 6
+
+    def __init__(self, budget_tokens: int = 3000, passage_tokens: int = 300, dedup_threshold: float = 0.8, completion_tokens: int = 1024):
+        self.budget_tokens = budget_tokens
+        self.passage_tokens = passage_tokens
+        self.dedup_threshold = dedup_threshold
+        self.completion_tokens = completion_tokens
+
+        self.builds = 0
+        self.tokens = 0
+        self.passages_in = 0
+        self.passages_out = 0
+        self.trimmed = 0
+        self.duplicates = 0
+
+    def budget_for(self, models, reserved_tokens: int = 0) -> int:
+        smallest = min(context_window(model) for model in models)
+        return max(0, min(self.budget_tokens, smallest - self.completion_tokens - reserved_tokens))
+
+    @staticmethod
+    def score(passage: Passage) -> float:
+        return SOURCE_PRIORITY.get(passage.kind, 0.5) / (passage.rank + 1)
+
+    def trim(self, body: str, terms: set, limit: int, models) -> str:
+        """The sentences of `body` sharing the most query terms (ties to the earlier one) that fit in `limit` tokens, in reading order."""
+        sentences = split_sentences(body)
+        scored = sorted(
+            range(len(sentences)),
+            key=lambda i: (-len(terms & set(tokenize(sentences[i]))), i),
+        )
+        kept, used = set(), 0
+        for i in scored:
+            cost = count_tokens_any(sentences[i], models) + 1
+            if used + cost <= limit:
+                kept.add(i)
+                used += cost
+        if not kept:
+            # A single sentence over the limit: keep its opening words.
+            words = sentences[scored[0]].split() if sentences else []
+            while words and count_tokens_any(" ".join(words), models) > limit - 1:
+                words = words[:max(1, len(words) * 3 // 4)] if len(words) > 1 else []
+            return " ".join(words) + " …" if words else ""
+        parts, previous = [], -1
+        for i in sorted(kept):
+            if i != previous + 1:
+                parts.append("…")
+            parts.append(sentences[i])
+            previous = i
+        if previous != len(sentences) - 1:
+            parts.append("…")
+        return " ".join(parts)
+
+    def _novel_sentences(self, body: str, taken_sentences):
+        """`body` without sentences already taken; also returns the word sets of the sentences kept."""
+        kept, kept_words, removed = [], [], False
+        for sentence in split_sentences(body):
+            words = set(tokenize(sentence))
+            if len(words) >= self.MIN_DEDUP_WORDS:
+                if any(_covered(words, other) >= self.dedup_threshold for other in taken_sentences):
+                    removed = True
+                    continue
+                kept_words.append(words)
+            kept.append(sentence)
+        return (" ".join(kept) if removed else body), kept_words
+
+    def build(self, query: str, passages, models, reserved_tokens: int = 0) -> BuiltContext:
+        budget = self.budget_for(models, reserved_tokens)
+        terms = set(tokenize(query))
+        order = sorted(range(len(passages)), key=lambda i: (-self.score(passages[i]), i))
+
+        chosen, taken_passages, taken_sentences = {}, [], []
+        used = trimmed = duplicates = dropped = 0
+        for i in order:
+            passage = passages[i]
+            words = set(tokenize(passage.body))
+            if passage.kind in EXEMPT_FROM_DEDUP:
+                body, sentences = passage.body, [set(tokenize(s)) for s in split_sentences(passage.body)]
+            elif len(words) >= self.MIN_DEDUP_WORDS and any(
+                _covered(words, other) >= self.dedup_threshold for other in taken_passages
+            ):
+                duplicates += 1
+                continue
+            else:
+                body, sentences = self._novel_sentences(passage.body, taken_sentences)
+                if not body:
+                    duplicates += 1
+                    continue
+            frame = count_tokens_any(passage.render(""), models)
+            limit = min(self.passage_tokens, budget - used) - frame
+            if limit < self.MIN_PASSAGE_TOKENS:
+                dropped += 1
+                continue
+            if count_tokens_any(body, models) > limit:
+                body = self.trim(body, terms, limit, models)
+                trimmed += 1
+            text = passage.render(body)
+            chosen[i] = text
+            used += count_tokens_any(text, models) + 1
+            if len(words) >= self.MIN_DEDUP_WORDS:
+                taken_passages.append(words)
+            taken_sentences.extend(sentences)
+
+        # Back in the caller's order (Quran, Hadith, Fiqh, web, each by rank) for the prompt.
+        local = "\n".join(chosen[i] for i in sorted(chosen) if passages[i].kind != "web")
+        web = "\n\n".join(chosen[i] for i in sorted(chosen) if passages[i].kind == "web")
+
+        self.builds += 1
+        self.tokens += used
+        self.passages_in += len(passages)
+        self.passages_out += len(chosen)
+        self.trimmed += trimmed
+        self.duplicates += duplicates
+        return BuiltContext(local, web, used, budget, len(chosen), trimmed, duplicates, dropped, tuple(sorted(chosen)))
+
+    def stats(self) -> dict:
+        return {
+            "budget_tokens": self.budget_tokens,
+            "passage_tokens": self.passage_tokens,
+            "builds": self.builds,
+            "mean_context_tokens": self.tokens / self.builds if self.builds else 0.0,
+            "passages_in": self.passages_in,
+            "passages_out": self.passages_out,
+            "trimmed": self.trimmed,
+            "duplicates": self.duplicates,
+        }
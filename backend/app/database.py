@@ -1,21 +1,101 @@
 import os
+import threading
+import time
+from collections import deque
 from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeout
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from dotenv import load_dotenv
+from . import config
 
 load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./ilmai.db")
 
+class PoolMetrics:
+    """How long callers wait to check a connection out of the pool, and how often they give up."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.waits = deque(maxlen=window)
+
+    def record(self, waited: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            self.waits.append(waited)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self.waits)
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total / (self.checkouts + self.timeouts) * 1000, 2) if waits else None,
+                "wait_p50_ms": round(waits[len(waits) // 2] * 1000, 2) if waits else None,
+                "wait_p99_ms": round(waits[int(len(waits) * 0.99)] * 1000, 2) if waits else None,
+                "wait_max_ms": round(self.wait_max * 1000, 2),
+            }
+
+pool_metrics = PoolMetrics()
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records checkout wait (queueing plus any new connection) in `pool_metrics`."""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeout:
+            pool_metrics.record(time.perf_counter() - started, timed_out=True)
+            raise
+        pool_metrics.record(time.perf_counter() - started)
+        return connection
+
 connect_args = {}
+engine_args = {"pool_pre_ping": config.settings.DB_POOL_PRE_PING}
 if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
     connect_args["check_same_thread"] = False
 
+# In-memory SQLite keeps the dialect's default pool: separate pooled connections would be separate databases.
+if SQLALCHEMY_DATABASE_URL != "sqlite://" and ":memory:" not in SQLALCHEMY_DATABASE_URL:
+    engine_args.update(
+        poolclass=TimedQueuePool,
+        pool_size=config.settings.DB_POOL_SIZE,
+        max_overflow=config.settings.DB_MAX_OVERFLOW,
+        pool_timeout=config.settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=config.settings.DB_POOL_RECYCLE_SECONDS,
+    )
+
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args=connect_args
+    SQLALCHEMY_DATABASE_URL, connect_args=connect_args, **engine_args
 )
 
+def pool_stats() -> dict:
+    """Current pool occupancy plus checkout wait times, for /stats."""
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            max_overflow=config.settings.DB_MAX_OVERFLOW,
+            in_use=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+        )
+        stats.update(pool_metrics.stats())
+    return stats
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+import numpy as np
+from sqlalchemy.orm import Session
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not coordinated across workers
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SCAN_BLOCK_ROWS = 8192
+
+@contextmanager
+def _build_lock(path: str):
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def quantize_int8(matrix: np.ndarray):
+    """Symmetric per-row int8 quantization: row ~= codes * scale."""
+    if matrix.shape[0] == 0:
+        return np.empty(matrix.shape, dtype=np.int8), np.empty(0, dtype=np.float32)
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+class MappedEmbeddingStore:
+    """
+    On-disk, memory-mapped embeddings for one corpus table.
+
+    Each version directory holds the row ids, an int8 matrix with per-row
+    float32 scales for the scan, and the normalized float32 matrix used to
+    rescore the shortlist exactly. Files are opened with mmap, so every
+    worker process shares the same page-cache copy, and only the
+    shortlisted float32 rows are ever paged in.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        self.codes = np.load(os.path.join(path, "int8.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r")
+        self.exact = np.load(os.path.join(path, "float32.npy"), mmap_mode="r")
+
+    @property
+    def dim(self) -> int:
+        return self.meta["dim"]
+
+    @property
+    def signature(self):
+        return tuple(self.meta["signature"])
+
+    def search(self, q: np.ndarray, top_k: int, threshold: float, oversample: int = 8, rows=None):
+        """
+        q must be L2-normalized float32. With `rows` (sorted positions), only those
+        rows are scanned. Returns (id, score) pairs, best first.
+        """
+        positions = np.arange(len(self.ids)) if rows is None else rows
+        n = len(positions)
+        if n == 0 or top_k <= 0:
+            return []
+
+        # Approximate scores from int8 codes, a block at a time to bound temporaries.
+        approx = np.empty(n, dtype=np.float32)
+        for start in range(0, n, SCAN_BLOCK_ROWS):
+            if rows is None:
+                block, scales = self.codes[start:start + SCAN_BLOCK_ROWS], self.scales[start:start + SCAN_BLOCK_ROWS]
+            else:
+                block_rows = rows[start:start + SCAN_BLOCK_ROWS]
+                block, scales = self.codes[block_rows], self.scales[block_rows]
+            approx[start:start + SCAN_BLOCK_ROWS] = (block.astype(np.float32) @ q) * scales
+
+        shortlist_size = min(n, top_k * oversample)
+        shortlist = positions[np.argpartition(-approx, shortlist_size - 1)[:shortlist_size]]
+        shortlist.sort()  # sequential page access
+
+        # Exact float32 rescoring of the shortlist only.
+        exact = np.asarray(self.exact[shortlist]) @ q
+        order = np.argsort(-exact)[:top_k]
+        return [(int(self.ids[shortlist[i]]), float(exact[i])) for i in order if exact[i] >= threshold]
+
+    @staticmethod
+    def build(db: Session, model, root: str, signature) -> str:
+        """Writes a new store version for `model` and points `<table>.json` at it."""
+        table = model.__tablename__
+        start = time.perf_counter()
+        rows = db.query(model.id, model.embedding).filter(model.embedding.isnot(None)).all()
+
+        dims = {}
+        for _, emb in rows:
+            if emb is not None and len(emb):
+                dims[len(emb)] = dims.get(len(emb), 0) + 1
+        dim = max(dims, key=dims.get) if dims else 0
+        kept = [(row_id, emb) for row_id, emb in rows if emb is not None and len(emb) == dim]
+
+        ids = np.fromiter((row_id for row_id, _ in kept), dtype=np.int64, count=len(kept))
+        matrix = np.asarray([emb for _, emb in kept], dtype=np.float32).reshape(len(kept), dim)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        codes, scales = quantize_int8(matrix)
+
+        version = f"{table}.{int(time.time() * 1000)}"
+        tmp_dir = os.path.join(root, f".{version}.tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        np.save(os.path.join(tmp_dir, "ids.npy"), ids)
+        np.save(os.path.join(tmp_dir, "int8.npy"), codes)
+        np.save(os.path.join(tmp_dir, "scales.npy"), scales)
+        np.save(os.path.join(tmp_dir, "float32.npy"), matrix)
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({"table": table, "dim": dim, "count": len(ids), "signature": list(signature), "built_at": time.time()}, f)
+        os.replace(tmp_dir, os.path.join(root, version))
+
+        pointer_tmp = os.path.join(root, f".{table}.json.tmp")
+        with open(pointer_tmp, "w") as f:
+            json.dump({"current": version}, f)
+        os.replace(pointer_tmp, os.path.join(root, f"{table}.json"))
+
+        # Older versions may still be mapped by other workers; unlinking is safe on POSIX.
+        for name in os.listdir(root):
+            if name.startswith(f"{table}.") and name != version and not name.endswith(".json"):
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+        logger.info(f"Built {table} embedding store: {len(ids)} x {dim} "
+                    f"(int8 {codes.nbytes / 1e6:.1f} MB + float32 {matrix.nbytes / 1e6:.1f} MB) "
+                    f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return os.path.join(root, version)
+
+    @classmethod
+    def current(cls, root: str, table: str):
+        pointer = os.path.join(root, f"{table}.json")
+        if not os.path.exists(pointer):
+            return None
+        with open(pointer) as f:
+            version = json.load(f)["current"]
+        path = os.path.join(root, version)
+        return cls(path) if os.path.isdir(path) else None
+
+    @classmethod
+    def open_or_build(cls, db: Session, model, root: str, signature):
+        """Maps the current store if it matches `signature`; otherwise one worker rebuilds it."""
+        os.makedirs(root, exist_ok=True)
+        table = model.__tablename__
+        store = cls.current(root, table)
+        if store is not None and store.signature == tuple(signature):
+            return store
+        with _build_lock(os.path.join(root, f".{table}.lock")):
+            # Another worker may have finished the build while we waited.
+            store = cls.current(root, table)
+            if store is not None and store.signature == tuple(signature):
+                return store
+            return cls(cls.build(db, model, root, signature))
@@ -1,14 +1,36 @@
-from sentence_transformers import SentenceTransformer
-import torch
+import threading
+from .batching import MicroBatcher
+from . import config
 
 class EmbeddingService:
     def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        # This model produces 384-dimensional embeddings
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model = SentenceTransformer(model_name, device=self.device)
+        # This model produces 384-dimensional embeddings. torch and the model are
+        # loaded on first use, so importing this module stays cheap.
+        self.model_name = model_name
+        self._model = None
+        self._model_lock = threading.Lock()
+        # Single-text calls arriving together are encoded as one batch.
+        self.batcher = MicroBatcher(
+            self.generate_embeddings_batch,
+            window=config.settings.EMBEDDING_BATCH_WINDOW_MS / 1000,
+            max_batch_size=config.settings.EMBEDDING_BATCH_MAX_SIZE,
+            max_in_flight=1,
+            name="local-embed",
+        )
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    import torch
+                    from sentence_transformers import SentenceTransformer
+                    self.device = "cuda" if torch.cuda.is_available() else "cpu"
+                    self._model = SentenceTransformer(self.model_name, device=self.device)
+        return self._model
 
     def generate_embedding(self, text: str):
-        return self.model.encode(text).tolist()
+        return self.batcher.submit(text)
 
     def generate_embeddings_batch(self, texts: list[str]):
         return self.model.encode(texts).tolist()
@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import insert
+from . import models
+from .telemetry import record_stage
+
+logger = logging.getLogger(__name__)
+
+class HistoryWriter:
+    """
+    Write-behind queue for ChatHistory rows, so answering a query never waits
+    on the history commit.
+
+    `add` only enqueues and returns the row's sequence number. A writer thread
+    waits up to `flush_interval` seconds after the first pending row (or until
+    `batch_size` rows are queued), then inserts the batch in one statement and
+    one commit. `wait_for(seq)` blocks until that row is committed, flushing
+    at once; callers waiting together share a commit. Readers in the same
+    process call `wait_for_user` first; it returns once every row queued for
+    that user so far is committed. The queue is per process, so readers in
+    other workers only see a turn once it is committed. `close` drains the
+    queue on shutdown. Rows still queued if the process dies are lost.
+    """
+
+    def __init__(self, session_factory, batch_size: int = 100, flush_interval: float = 0.05):
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._pending = []       # (seq, row)
+        self._last_seq = {}      # user id -> seq of that user's newest queued row
+        self._queued_seq = 0
+        self._written_seq = 0
+        self._urgent = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._writer = None
+
+        self.batches = 0
+        self.rows = 0
+        self.failed = 0
+        self.reader_waits = 0
+        self.last_batch_ms = 0.0
+
+    def add(self, user_id: int, session_id: int, query: str, response: str, language: str):
+        row = {
+            "user_id": user_id,
+            "session_id": session_id,
+            "query": query,
+            "response": response,
+            "language": language,
+            # Stamped now, not at insert, so history keeps answer order whatever the batching.
+            "timestamp": datetime.utcnow(),
+        }
+        with self._cond:
+            closed = self._closed
+            if not closed:
+                if self._writer is None or not self._writer.is_alive():
+                    self._writer = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                    self._writer.start()
+                self._queued_seq += 1
+                self._pending.append((self._queued_seq, row))
+                self._last_seq[user_id] = self._queued_seq
+                self._cond.notify_all()
+            seq = self._queued_seq
+        if closed:
+            # A stream that finished during shutdown, after the queue was drained.
+            self._write([row])
+            return None
+        return seq
+
+    def wait_for(self, seq, timeout: float = 5.0) -> bool:
+        """Blocks until the row `add` numbered `seq` is committed; False if `timeout` passed first."""
+        with self._cond:
+            if seq is None or seq <= self._written_seq:
+                return True
+            self._urgent = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._written_seq >= seq, timeout)
+
+    def wait_for_user(self, user_id: int, timeout: float = 5.0) -> bool:
+        """Blocks until the user's queued rows are committed; False if `timeout` passed first."""
+        with self._cond:
+            target = self._last_seq.get(user_id)
+            if target is None or target <= self._written_seq:
+                return True
+            self.reader_waits += 1
+        return self.wait_for(target, timeout)
+
+    def close(self, timeout: float = 10.0):
+        """Writes everything still queued, then stops the writer thread."""
+        with self._cond:
+            self._closed = True
+            self._urgent = True
+            self._cond.notify_all()
+            writer = self._writer
+        if writer is not None:
+            writer.join(timeout)
+            if writer.is_alive():
+                logger.error(f"History writer still busy after {timeout:.0f}s; {len(self._pending)} rows not written")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.batch_size and not self._urgent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                if not self._pending:
+                    self._urgent = False
+            self._write([row for _, row in batch])
+            with self._cond:
+                self._written_seq = batch[-1][0]
+                for user_id in {row["user_id"] for _, row in batch}:
+                    if self._last_seq.get(user_id, 0) <= self._written_seq:
+                        del self._last_seq[user_id]
+                self._cond.notify_all()
+
+    def _write(self, rows):
+        started = time.perf_counter()
+        db = self.session_factory()
+        try:
+            db.execute(insert(models.ChatHistory), rows)
+            db.commit()
+            self.rows += len(rows)
+        except Exception as e:
+            # One bad row (e.g. its session was deleted meanwhile) shouldn't cost the rest of the batch.
+            db.rollback()
+            logger.warning(f"History batch of {len(rows)} failed ({e}); retrying row by row")
+            for row in rows:
+                try:
+                    db.execute(insert(models.ChatHistory), [row])
+                    db.commit()
+                    self.rows += 1
+                except Exception as row_error:
+                    db.rollback()
+                    self.failed += 1
+                    logger.error(f"Dropped history row for session {row['session_id']}: {row_error}")
+        finally:
+            db.close()
+        self.batches += 1
+        elapsed = time.perf_counter() - started
+        self.last_batch_ms = elapsed * 1000
+        record_stage("history_commit", elapsed)
+
+    def stats(self) -> dict:
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            "batch_size": self.batch_size,
+            "flush_interval_ms": self.flush_interval * 1000,
+            "pending": pending,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": self.rows / self.batches if self.batches else 0.0,
+            "failed": self.failed,
+            "reader_waits": self.reader_waits,
+            "last_batch_ms": round(self.last_batch_ms, 2),
+        }
@@ -0,0 +1,215 @@
+import logging
+import re
+import sys
+import threading
+import time
+from collections import Counter, namedtuple
+import numpy as np
+from sqlalchemy.orm import Session
+from .database import SessionLocal
+from .vector_index import Partitions, table_signature
+
+logger = logging.getLogger(__name__)
+
+TEXT_FIELDS = ("english_text", "arabic_text", "bangla_text", "ruling_title", "translation")
+
+# Harakat, superscript alef, Quranic annotation marks and tatweel carry no lexical meaning.
+_ARABIC_MARKS = re.compile("[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+_ARABIC_LETTER_VARIANTS = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا", "ى": "ي", "ة": "ه", "ؤ": "و", "ئ": "ي"})
+# \w alone would split Bangla words at vowel signs, so take the whole Bengali and Arabic blocks.
+_TOKEN = re.compile(r"[\w\u0980-\u09FF\u0600-\u06FF]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have he her his i in is it its me my of on or our she so that the their them they
+this to was we were what when where which who whom why will with you your do does did how can about into than then there
+""".split())
+
+# Everything a search reads, swapped in as one object so a rebuild never shows half-updated arrays.
+Postings = namedtuple("Postings", "ids doc_lengths terms avg_length partitions")
+
+def normalize(text: str) -> str:
+    text = _ARABIC_MARKS.sub("", text.casefold())
+    return text.translate(_ARABIC_LETTER_VARIANTS)
+
+def tokenize(text: str):
+    if not text:
+        return []
+    return [t for t in _TOKEN.findall(normalize(text)) if t not in STOPWORDS and len(t) > 1]
+
+class LexicalIndex:
+    """
+    In-process BM25 inverted index over the text columns of one corpus table.
+
+    Postings are stored per term as parallel numpy arrays (document position,
+    term frequency) so scoring a query is a handful of vectorized updates.
+    Like VectorIndex, it rebuilds when the table's signature changes,
+    and accepts the same `partition_by` filters. With `background=True`,
+    `refresh` hands the rebuild to a thread and searches keep using the
+    current postings until the new ones are swapped in.
+    """
+
+    def __init__(
+        self, model, refresh_interval: float = 30.0, k1: float = 1.5, b: float = 0.75, min_coverage: float = 0.5,
+        min_score: float = 0.0, partition_by=(),
+    ):
+        self.model = model
+        self.fields = [name for name in TEXT_FIELDS if hasattr(model, name)]
+        self.partition_by = tuple(partition_by)
+        self.refresh_interval = refresh_interval
+        self.k1 = k1
+        self.b = b
+        # A document must contain at least this share of the query's distinct terms.
+        self.min_coverage = min_coverage
+        # ...and score at least this share of what an average-length document holding
+        # each query term once would, so a lone common word doesn't count as a hit.
+        self.min_score = min_score
+
+        self.postings = Postings(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), {}, 0.0, None)
+        self.build_ms = 0.0
+        self.memory_bytes = 0
+        self._signature = None
+        self._checked_at = 0.0
+        self._building = False
+        self._lock = threading.Lock()
+
+    def _table_signature(self, db: Session):
+        return table_signature(db, self.model)
+
+    def refresh(self, db: Session, force: bool = False, background: bool = False):
+        if not force and self._signature is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        # A background caller never waits: whoever holds the lock is already checking or building.
+        if not self._lock.acquire(blocking=not background):
+            return
+        try:
+            if self._building or (not force and self._signature is not None and time.monotonic() - self._checked_at < self.refresh_interval):
+                return
+            signature = self._table_signature(db)
+            self._checked_at = time.monotonic()
+            if not force and signature == self._signature:
+                return
+            if background:
+                self._building = True
+                threading.Thread(target=self._build_in_background, args=(signature,), name=f"bm25-{self.model.__tablename__}", daemon=True).start()
+            else:
+                self._build(db)
+                self._signature = signature
+        finally:
+            self._lock.release()
+
+    def _build_in_background(self, signature):
+        db = SessionLocal()
+        try:
+            self._build(db)
+            self._signature = signature
+        except Exception as e:
+            logger.error(f"BM25 rebuild for {self.model.__tablename__} failed: {e}")
+        finally:
+            db.close()
+            self._building = False
+
+    def _build(self, db: Session):
+        start = time.perf_counter()
+        columns = [self.model.id] + [getattr(self.model, name) for name in self.fields + list(self.partition_by)]
+        rows = db.query(*columns).all()
+        text_end = 1 + len(self.fields)
+
+        ids = np.empty(len(rows), dtype=np.int64)
+        lengths = np.empty(len(rows), dtype=np.float32)
+        postings = {}
+        for position, row in enumerate(rows):
+            ids[position] = row[0]
+            tokens = []
+            for value in row[1:text_end]:
+                tokens.extend(tokenize(value))
+            lengths[position] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((position, tf))
+
+        terms = {
+            term: (np.array([p for p, _ in entries], dtype=np.int32), np.array([tf for _, tf in entries], dtype=np.float32))
+            for term, entries in postings.items()
+        }
+        partitions = Partitions(self.partition_by, [row[text_end:] for row in rows]) if self.partition_by else None
+        self.postings = Postings(ids, lengths, terms, float(lengths.mean()) if len(lengths) else 0.0, partitions)
+        self.build_ms = (time.perf_counter() - start) * 1000
+        self.memory_bytes = (
+            ids.nbytes + lengths.nbytes + sys.getsizeof(terms)
+            + sum(sys.getsizeof(term) + docs.nbytes + tfs.nbytes for term, (docs, tfs) in terms.items())
+        )
+        logger.info(f"Built BM25 index for {self.model.__tablename__}: {len(ids)} docs, {len(terms)} terms, "
+                    f"{self.memory_bytes / 1e6:.1f} MB in {self.build_ms:.0f} ms")
+
+    def _scores(self, postings: Postings, query: str):
+        terms = set(tokenize(query))
+        n = len(postings.ids)
+        if not terms or n == 0:
+            return None
+
+        scores = np.zeros(n, dtype=np.float32)
+        matched = np.zeros(n, dtype=np.int16)
+        norm = self.k1 * (1 - self.b + self.b * postings.doc_lengths / (postings.avg_length or 1.0))
+        # Score of an average-length document containing each indexed query term once.
+        reference = 0.0
+        for term in terms:
+            entry = postings.terms.get(term)
+            if entry is None:
+                continue
+            docs, tfs = entry
+            idf = np.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            reference += idf
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm[docs])
+            matched[docs] += 1
+
+        scores[matched < self.min_coverage * len(terms)] = 0
+        scores[scores < self.min_score * reference] = 0
+        return scores
+
+    def _top(self, postings: Postings, scores, top_k: int, rows=None):
+        candidates = np.flatnonzero(scores) if rows is None else rows[scores[rows] > 0]
+        if len(candidates) == 0 or top_k <= 0:
+            return []
+        k = min(top_k, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(int(postings.ids[i]), float(scores[i])) for i in top]
+
+    def _rows(self, postings: Postings, filters):
+        if not filters:
+            return None
+        if postings.partitions is None:
+            raise ValueError(f"{self.model.__tablename__} lexical index has no partitions")
+        return postings.partitions.positions(filters)
+
+    def search(self, query: str, top_k: int = 3, filters=None):
+        """Returns a list of (id, bm25 score) pairs, best first."""
+        postings = self.postings
+        scores = self._scores(postings, query)
+        if scores is None:
+            return []
+        return self._top(postings, scores, top_k, self._rows(postings, filters))
+
+    def search_groups(self, query: str, column: str, values, top_k: int = 3):
+        """Top-k (id, score) pairs per value of a partition column, from one scoring pass."""
+        postings = self.postings
+        scores = self._scores(postings, query)
+        if scores is None:
+            return {value: [] for value in values}
+        return {value: self._top(postings, scores, top_k, self._rows(postings, {column: value})) for value in values}
+
+    def stats(self) -> dict:
+        return {
+            "documents": len(self.postings.ids),
+            "terms": len(self.postings.terms),
+            "build_ms": round(self.build_ms, 1),
+            "memory_mb": round(self.memory_bytes / 1e6, 2),
+            "building": self._building,
+        }
+
+def reciprocal_rank_fusion(rankings, k: int = 60):
+    """Merges ranked (id, score) lists: each id scores sum(1 / (k + rank)). Returns (id, fused score) pairs."""
+    fused = {}
+    for ranking in rankings:
+        for rank, (row_id, _) in enumerate(ranking, start=1):
+            fused[row_id] = fused.get(row_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -1,43 +1,182 @@
+import logging
 import os
-from groq import Groq
+import threading
+import time
 from dotenv import load_dotenv
+from . import config
+from .context_builder import context_window, count_tokens
+from .llm_router import ModelRouter, is_rate_limit_error, rate_limit_reset
+from .telemetry import stage, record_stage, LLM_REQUESTS, LLM_FALLBACKS, LLM_UNAVAILABLE, LLM_TOKENS
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Models to try in order of preference
+MODELS_TO_TRY = [
+    "llama-3.3-70b-versatile",
+    "llama-3.1-70b-versatile",
+    "mixtral-8x7b-32768",
+    "llama3-8b-8192"
+]
+
+# Reserved for the completion when estimating a request's token cost
+MAX_COMPLETION_TOKENS_ESTIMATE = 1024
+
+ERROR_PREFIXES = ("Error connecting to Groq", "All Groq models rate limited or failed")
+
+def is_error_response(text: str) -> bool:
+    """True for the fallback messages returned in place of a completion."""
+    return text.startswith(ERROR_PREFIXES)
+
+def fits_context(model: str, system_prompt: str, user_query: str) -> bool:
+    """Whether the prompt plus a completion fits in `model`'s context window."""
+    prompt_tokens = count_tokens(system_prompt, model) + count_tokens(user_query, model)
+    if prompt_tokens + MAX_COMPLETION_TOKENS_ESTIMATE <= context_window(model):
+        return True
+    logger.warning(f"Skipping {model}: ~{prompt_tokens} prompt tokens exceed its {context_window(model)}-token context window")
+    return False
+
+def record_usage(model: str, usage):
+    """Counts the tokens Groq reported for one completion."""
+    if usage is None:
+        return
+    LLM_TOKENS.inc(usage.prompt_tokens, model=model, direction="in")
+    LLM_TOKENS.inc(usage.completion_tokens, model=model, direction="out")
+    logger.info(f"{model}: {usage.prompt_tokens} input / {usage.completion_tokens} output tokens")
+
+def estimate_tokens(*texts: str) -> int:
+    # ~4 characters per token for English; close enough for budgeting.
+    return sum(len(t) for t in texts) // 4 + MAX_COMPLETION_TOKENS_ESTIMATE
+
 class LLMProvider:
     def __init__(self):
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+        self._client = None
+        self._client_lock = threading.Lock()
         self.model = "llama-3.3-70b-versatile"
+        self.router = ModelRouter(MODELS_TO_TRY, None if config.settings.GROQ_CLIENT_BUDGETS else {})
+
+    @property
+    def client(self):
+        """The Groq client, created on first use so importing the app needs neither the SDK nor a key."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from groq import Groq
+                    # The router handles 429s itself, so don't let the SDK retry them behind its back.
+                    self._client = Groq(api_key=os.getenv("GROQ_API_KEY"), base_url=config.settings.GROQ_BASE_URL or None, max_retries=0)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def _create(self, model: str, system_prompt: str, user_query: str, stream: bool = False):
+        raw = self.client.chat.completions.with_raw_response.create(
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_query},
+            ],
+            model=model,
+            temperature=0.2,
+            stream=stream,
+        )
+        self.router.states[model].update_from_headers(raw.headers)
+        return raw.parse()
+
+    def _unavailable_message(self, estimated: int, last_error: str) -> str:
+        LLM_UNAVAILABLE.inc()
+        if last_error:
+            return f"All Groq models rate limited or failed. Last error: {last_error}"
+        wait = max(0.0, self.router.next_available_in(estimated))
+        return f"All Groq models rate limited or failed. Please try again in {wait:.0f}s."
 
     def generate_response(self, system_prompt: str, user_query: str):
-        # List of models to try in order of preference
-        models_to_try = [
-            "llama-3.3-70b-versatile",
-            "llama-3.1-70b-versatile",
-            "mixtral-8x7b-32768",
-            "llama3-8b-8192"
-        ]
-        
+        with stage("llm"):
+            return self._generate(system_prompt, user_query)
+
+    def _generate(self, system_prompt: str, user_query: str):
+        estimated = estimate_tokens(system_prompt, user_query)
         last_error = ""
-        for model in models_to_try:
+        fits = lambda model: fits_context(model, system_prompt, user_query)
+        for model, entry in self.router.candidates(estimated, fits):
+            state = self.router.states[model]
+            started = time.perf_counter()
             try:
-                chat_completion = self.client.chat.completions.create(
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_query},
-                    ],
-                    model=model,
-                    temperature=0.2,
-                )
-                return chat_completion.choices[0].message.content
+                chat_completion = self._create(model, system_prompt, user_query)
             except Exception as e:
                 error_msg = str(e)
                 last_error = error_msg
-                if "rate_limit_exceeded" in error_msg.lower():
+                if is_rate_limit_error(e):
                     # Move to next model if rate limited
+                    state.record_rate_limit(rate_limit_reset(e))
+                    LLM_REQUESTS.inc(model=model, outcome="rate_limited")
+                    LLM_FALLBACKS.inc(model=model)
                     continue
+                state.record_failure()
+                LLM_REQUESTS.inc(model=model, outcome="error")
                 return f"Error connecting to Groq ({model}): {error_msg}"
-        
-        return f"All Groq models rate limited or failed. Last error: {last_error}"
+            usage = getattr(chat_completion, "usage", None)
+            state.record_success(entry, time.perf_counter() - started, getattr(usage, "total_tokens", None))
+            LLM_REQUESTS.inc(model=model, outcome="success")
+            record_usage(model, usage)
+            return chat_completion.choices[0].message.content
+
+        return self._unavailable_message(estimated, last_error)
+
+    def stream_response(self, system_prompt: str, user_query: str):
+        """
+        Yields the completion in chunks as Groq generates it. Falls through to the
+        next model on a rate limit, as long as nothing has been yielded yet.
+        The response headers are long gone by then, so the `llm_first_token` and
+        `llm` stages only reach the metrics, not Server-Timing.
+        """
+        estimated = estimate_tokens(system_prompt, user_query)
+        last_error = ""
+        requested = time.perf_counter()
+        fits = lambda model: fits_context(model, system_prompt, user_query)
+        for model, entry in self.router.candidates(estimated, fits):
+            state = self.router.states[model]
+            started = time.perf_counter()
+            yielded = False
+            try:
+                stream = self._create(model, system_prompt, user_query, stream=True)
+                for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        if not yielded:
+                            record_stage("llm_first_token", time.perf_counter() - requested)
+                        yielded = True
+                        yield delta
+                    # Groq reports usage on the final chunk of a stream.
+                    record_usage(model, getattr(getattr(chunk, "x_groq", None), "usage", None))
+                state.record_success(entry, time.perf_counter() - started)
+                LLM_REQUESTS.inc(model=model, outcome="success")
+                record_stage("llm", time.perf_counter() - requested)
+                return
+            except GeneratorExit:
+                # The client went away mid-stream; the model itself served the request.
+                state.record_success(entry, time.perf_counter() - started)
+                LLM_REQUESTS.inc(model=model, outcome="success")
+                raise
+            except Exception as e:
+                error_msg = str(e)
+                last_error = error_msg
+                if is_rate_limit_error(e):
+                    state.record_rate_limit(rate_limit_reset(e))
+                    LLM_REQUESTS.inc(model=model, outcome="rate_limited")
+                    if not yielded:
+                        LLM_FALLBACKS.inc(model=model)
+                        continue
+                else:
+                    state.record_failure()
+                    LLM_REQUESTS.inc(model=model, outcome="error")
+                yield f"Error connecting to Groq ({model}): {error_msg}"
+                return
+
+        yield self._unavailable_message(estimated, last_error)
+
+    def stats(self) -> dict:
+        return self.router.stats()
 
 llm_provider = LLMProvider()
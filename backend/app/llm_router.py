@@ -0,0 +1,206 @@
+import re
+import threading
+import time
+from collections import deque
+
+# Client-side budgets per model: (requests per minute, tokens per minute).
+# Defaults follow Groq's free tier; models not listed are only limited by the circuit breaker.
+DEFAULT_MODEL_LIMITS = {
+    "llama-3.3-70b-versatile": (30, 12000),
+    "llama-3.1-70b-versatile": (30, 6000),
+    "mixtral-8x7b-32768": (30, 5000),
+    "llama3-8b-8192": (30, 6000),
+}
+
+_DURATION = re.compile(r"(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m(?!s))?(?:(\d+(?:\.\d+)?)s)?(?:(\d+(?:\.\d+)?)ms)?")
+_TRY_AGAIN = re.compile(r"try again in ((?:\d+(?:\.\d+)?(?:h|ms|m|s))+)", re.IGNORECASE)
+
+def parse_duration(value) -> float:
+    """Parses Groq-style durations ("7.66s", "1m23.5s", "120ms") or plain seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    match = _DURATION.fullmatch(value)
+    if not match or not any(match.groups()):
+        return None
+    hours, minutes, seconds, millis = (float(g) if g else 0.0 for g in match.groups())
+    return hours * 3600 + minutes * 60 + seconds + millis / 1000
+
+def rate_limit_reset(error: Exception) -> float:
+    """Seconds until a rate-limited model can be retried, from response headers or the error text."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header in ("retry-after", "x-ratelimit-reset-tokens", "x-ratelimit-reset-requests"):
+        seconds = parse_duration(headers.get(header))
+        if seconds is not None:
+            return seconds
+    match = _TRY_AGAIN.search(str(error))
+    if match:
+        return parse_duration(match.group(1))
+    return None
+
+def is_rate_limit_error(error: Exception) -> bool:
+    if getattr(error, "status_code", None) == 429:
+        return True
+    message = str(error).lower()
+    return "rate_limit_exceeded" in message or "rate limit" in message
+
+class ModelState:
+    """Rate-limit window, circuit breaker, client-side budgets and stats for one model."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, rpm: int = None, tpm: int = None, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self.circuit = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.blocked_until = 0.0
+        self._window = deque()  # (timestamp, tokens) per admitted request
+
+        self.successes = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=500)
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        while self._window and now - self._window[0][0] >= 60.0:
+            self._window.popleft()
+
+    def available_at(self, estimated_tokens: int, now: float) -> float:
+        """Earliest time this model could take the request (== now if it can right away)."""
+        ready = max(now, self.blocked_until)
+        if self.circuit == self.OPEN:
+            ready = max(ready, self.opened_at + self.cooldown)
+        elif self.circuit == self.HALF_OPEN and self.probe_in_flight:
+            ready = max(ready, now + self.cooldown)
+
+        self._trim(now)
+        if self.rpm and len(self._window) >= self.rpm:
+            ready = max(ready, self._window[len(self._window) - self.rpm][0] + 60.0)
+        if self.tpm:
+            used = sum(tokens for _, tokens in self._window)
+            if used + estimated_tokens > self.tpm:
+                # Wait until enough old requests age out of the window.
+                freed = 0
+                for timestamp, tokens in self._window:
+                    freed += tokens
+                    if used - freed + estimated_tokens <= self.tpm:
+                        ready = max(ready, timestamp + 60.0)
+                        break
+                else:
+                    ready = max(ready, now + 60.0)
+        return ready
+
+    def try_acquire(self, estimated_tokens: int):
+        """Admits a request if the model can serve it now; returns a window entry to settle later."""
+        with self._lock:
+            now = time.monotonic()
+            if self.available_at(estimated_tokens, now) > now:
+                self.rejected += 1
+                return None
+            if self.circuit == self.OPEN:
+                self.circuit = self.HALF_OPEN
+            if self.circuit == self.HALF_OPEN:
+                self.probe_in_flight = True
+            entry = [now, estimated_tokens]
+            self._window.append(entry)
+            return entry
+
+    def record_success(self, entry, latency: float, tokens_used: int = None):
+        with self._lock:
+            if tokens_used is not None:
+                entry[1] = tokens_used
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.circuit = self.CLOSED
+            self.probe_in_flight = False
+            self.latencies.append(latency)
+
+    def record_rate_limit(self, reset_seconds: float = None):
+        with self._lock:
+            self.rate_limited += 1
+            self.probe_in_flight = False
+            self.blocked_until = max(self.blocked_until, time.monotonic() + (reset_seconds if reset_seconds is not None else self.cooldown))
+            if self.circuit == self.HALF_OPEN:
+                self.circuit = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.probe_in_flight = False
+            if self.circuit == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.circuit = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def update_from_headers(self, headers):
+        """Adopts the server's view of the remaining budget from x-ratelimit-* response headers."""
+        if not headers:
+            return
+        for remaining_header, reset_header in (
+            ("x-ratelimit-remaining-requests", "x-ratelimit-reset-requests"),
+            ("x-ratelimit-remaining-tokens", "x-ratelimit-reset-tokens"),
+        ):
+            remaining = headers.get(remaining_header)
+            reset = parse_duration(headers.get(reset_header))
+            if remaining is not None and reset is not None and str(remaining).strip() == "0":
+                with self._lock:
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + reset)
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            latencies = sorted(self.latencies)
+            return {
+                "circuit": self.circuit,
+                "blocked_for_seconds": round(max(0.0, self.blocked_until - now), 2),
+                "successes": self.successes,
+                "failures": self.failures,
+                "rate_limited": self.rate_limited,
+                "rejected": self.rejected,
+                "requests_last_minute": len(self._window),
+                "tokens_last_minute": sum(tokens for _, tokens in self._window),
+                "latency_p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+                "latency_p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+            }
+
+class ModelRouter:
+    """Orders models by preference, skipping any that cannot serve a request right now."""
+
+    def __init__(self, models, limits=None):
+        limits = DEFAULT_MODEL_LIMITS if limits is None else limits
+        self.models = list(models)
+        self.states = {name: ModelState(name, *limits.get(name, (None, None))) for name in self.models}
+
+    def candidates(self, estimated_tokens: int, fits=None):
+        """
+        Yields (model, window entry) for each model that admits the request, in preference order.
+        `fits(model)`, if given, is checked first so a model that can't take the prompt spends no budget.
+        """
+        for name in self.models:
+            if fits is not None and not fits(name):
+                continue
+            entry = self.states[name].try_acquire(estimated_tokens)
+            if entry is not None:
+                yield name, entry
+
+    def next_available_in(self, estimated_tokens: int) -> float:
+        now = time.monotonic()
+        return min(state.available_at(estimated_tokens, now) for state in self.states.values()) - now
+
+    def stats(self) -> dict:
+        return {name: state.stats() for name, state in self.states.items()}
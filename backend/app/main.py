@@ -1,33 +1,88 @@
-from fastapi import FastAPI, Depends, HTTPException, Query, status, Request, Body
+import time
+# Taken before the framework imports, so /ready can report how long importing the app took.
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Depends, HTTPException, Query, status, Request, Body, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy import text
+from sqlalchemy import func, text
 from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional
 from datetime import datetime, timedelta
-
-from .database import engine, get_db
-from . import models, auth, config
-from .llm import llm_provider
+from contextlib import asynccontextmanager
+import anyio
+import asyncio
+import json
+
+from .database import engine, get_db, SessionLocal, pool_stats
+from . import models, auth, config, metering, migrations, telemetry
+from .llm import llm_provider, is_error_response, MODELS_TO_TRY, MAX_COMPLETION_TOKENS_ESTIMATE
+from .context_builder import ContextBuilder, Passage, count_tokens_any
+from .answer_cache import SemanticAnswerCache
+from .history_writer import HistoryWriter
 from .rag import rag_engine
+from .tools.tavily_search import search_tool
+from .references import parse_references, ReferenceResolver
+from .pagination import keyset_page, NEXT_CURSOR_HEADER
+from .readiness import Readiness
 import logging
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+readiness = Readiness(_import_started)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Blocking DB, embedding and LLM calls are offloaded to this pool, so size it for in-flight queries.
+    anyio.to_thread.current_default_thread_limiter().total_tokens = config.settings.THREADPOOL_SIZE
+    # Schema changes go through the migrations module; deployments that migrate out of band turn this off.
+    # A failed migration stops startup rather than serving against a partial schema.
+    if config.settings.AUTO_MIGRATE:
+        applied = readiness.run("migrations", migrations.migrate, engine, required=True)
+        if applied:
+            logger.info(f"Applied migrations {applied}")
+    # The server answers /health while warming up; /ready reports 503 until it is done.
+    warmup = None
+    if config.settings.WARMUP:
+        warmup = asyncio.ensure_future(run_in_threadpool(warm_up))
+    else:
+        readiness.mark_ready()
+    yield
+    if warmup is not None and not warmup.done():
+        await warmup
+    # Answered turns still queued for the history table.
+    await run_in_threadpool(history_writer.close)
+
 app = FastAPI(
     title="IlmAI API", 
     description="RAG-based Islamic Knowledge Assistant Backend",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
+)
+
+answer_cache = SemanticAnswerCache(
+    max_entries=config.settings.ANSWER_CACHE_SIZE,
+    ttl=config.settings.ANSWER_CACHE_TTL_SECONDS,
+    threshold=config.settings.ANSWER_CACHE_THRESHOLD,
 )
 
-# Initialize database tables
-with engine.connect() as conn:
-    conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
-    conn.commit()
-models.Base.metadata.create_all(bind=engine)
+context_builder = ContextBuilder(
+    budget_tokens=config.settings.CONTEXT_TOKEN_BUDGET,
+    passage_tokens=config.settings.CONTEXT_PASSAGE_TOKENS,
+    completion_tokens=MAX_COMPLETION_TOKENS_ESTIMATE,
+)
+
+history_writer = HistoryWriter(
+    SessionLocal,
+    batch_size=config.settings.HISTORY_BATCH_SIZE,
+    flush_interval=config.settings.HISTORY_FLUSH_INTERVAL_MS / 1000,
+)
 
 # Enable CORS
 app.add_middleware(
@@ -43,8 +98,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "Server-Timing"],
 )
 
+# Outermost, so each request's duration covers CORS handling and the whole response body.
+app.add_middleware(telemetry.TimingMiddleware, server_timing_header=config.settings.SERVER_TIMING)
+
 # Pydantic models
 class UserCreate(BaseModel):
     email: EmailStr
@@ -70,17 +129,59 @@ class UserResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# List views return narrow rows; full bodies come from the per-item endpoints.
+CONTENT_PREVIEW_CHARS = 280
+
+class SessionSummary(BaseModel):
+    id: int
+    title: Optional[str]
+    created_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+class HistoryItem(BaseModel):
+    id: int
+    session_id: Optional[int]
+    query: str
+    response: str
+    language: Optional[str]
+    timestamp: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+class CitationSummary(BaseModel):
+    id: int
+    source_type: Optional[str]
+    source_id: Optional[str]
+    preview: Optional[str]
+    timestamp: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+class CitationResponse(BaseModel):
+    id: int
+    source_type: Optional[str]
+    source_id: Optional[str]
+    content: Optional[str]
+    timestamp: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to IlmAI API", "status": "operational"}
 
-@app.post("/signup", response_model=UserResponse)
-def signup(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    hashed_password = auth.get_password_hash(user.password)
+# These lookups end their transaction so the pooled connection isn't held while bcrypt runs.
+def email_registered(db: Session, email: str) -> bool:
+    registered = db.query(models.User.id).filter(models.User.email == email).first() is not None
+    db.rollback()
+    return registered
+
+def create_user(db: Session, user: UserCreate, hashed_password: str) -> models.User:
     new_user = models.User(
         email=user.email,
         hashed_password=hashed_password,
@@ -91,27 +192,51 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
     db.refresh(new_user)
     return new_user
 
+def find_credentials(db: Session, email: str):
+    credentials = db.query(models.User.id, models.User.email, models.User.hashed_password).filter(models.User.email == email).first()
+    db.rollback()
+    return credentials
+
+def store_password_hash(db: Session, user_id: int, hashed_password: str):
+    db.query(models.User).filter(models.User.id == user_id).update({models.User.hashed_password: hashed_password}, synchronize_session=False)
+    db.commit()
+
+# bcrypt runs on auth.password_hasher's own pool; only the short DB calls use the request threadpool.
+@app.post("/signup", response_model=UserResponse)
+async def signup(user: UserCreate, db: Session = Depends(get_db)):
+    if await run_in_threadpool(email_registered, db, user.email):
+        raise HTTPException(status_code=400, detail="Email already registered")
+    
+    hashed_password = await auth.password_hasher.hash(user.password)
+    return await run_in_threadpool(create_user, db, user, hashed_password)
+
 @app.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = await run_in_threadpool(find_credentials, db, form_data.username)
+    if not user or not await auth.password_hasher.verify(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    access_token = auth.create_access_token(data={"sub": user.email})
+
+    # Upgrade hashes made with a different cost while the plaintext is at hand.
+    await auth.password_hasher.rehash(
+        form_data.password, user.hashed_password,
+        lambda rehashed: run_in_threadpool(store_password_hash, db, user.id, rehashed),
+    )
+
+    access_token = auth.create_access_token(data={"sub": user.email, "uid": user.id})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/me", response_model=UserResponse)
-async def read_users_me(request: Request, db: Session = Depends(get_db)):
-    current_user = await auth.require_current_user(request, db)
+def read_users_me(request: Request, db: Session = Depends(get_db)):
+    current_user = auth.require_current_user(request, db)
     return current_user
 
 @app.patch("/me", response_model=UserResponse)
-async def update_user(request: Request, user_update: UserUpdate, db: Session = Depends(get_db)):
-    current_user = await auth.require_current_user(request, db)
+def update_user(request: Request, user_update: UserUpdate, db: Session = Depends(get_db)):
+    current_user = db.get(models.User, auth.require_current_user(request, db).id)
     
     if user_update.full_name is not None:
         current_user.full_name = user_update.full_name
@@ -121,17 +246,28 @@ async def update_user(request: Request, user_update: UserUpdate, db: Session = D
         current_user.ui_language = user_update.ui_language
         
     db.commit()
+    auth.invalidate_user(current_user.id)
     db.refresh(current_user)
     return current_user
 
-@app.get("/sessions")
-async def get_sessions(request: Request, db: Session = Depends(get_db)):
-    current_user = await auth.require_current_user(request, db)
-    return db.query(models.ChatSession).filter(models.ChatSession.user_id == current_user.id).order_by(models.ChatSession.created_at.desc()).all()
+@app.get("/sessions", response_model=List[SessionSummary])
+def get_sessions(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """Newest first; pass the X-Next-Cursor response header back as `cursor` for the next page."""
+    current_user = auth.require_current_user(request, db)
+    query = db.query(models.ChatSession.id, models.ChatSession.title, models.ChatSession.created_at).filter(
+        models.ChatSession.user_id == current_user.id
+    )
+    return keyset_page(query, models.ChatSession.created_at, models.ChatSession.id, cursor, limit, response)
 
-@app.post("/sessions")
-async def create_session(request: Request, title: str = "New Conversation", db: Session = Depends(get_db)):
-    current_user = await auth.require_current_user(request, db)
+@app.post("/sessions", response_model=SessionSummary)
+def create_session(request: Request, title: str = "New Conversation", db: Session = Depends(get_db)):
+    current_user = auth.require_current_user(request, db)
     new_session = models.ChatSession(user_id=current_user.id, title=title)
     db.add(new_session)
     db.commit()
@@ -139,8 +275,9 @@ async def create_session(request: Request, title: str = "New Conversation", db:
     return new_session
 
 @app.delete("/sessions/{session_id}")
-async def delete_session(session_id: int, request: Request, db: Session = Depends(get_db)):
-    current_user = await auth.require_current_user(request, db)
+def delete_session(session_id: int, request: Request, db: Session = Depends(get_db)):
+    current_user = auth.require_current_user(request, db)
+    history_writer.wait_for_user(current_user.id)
     session = db.query(models.ChatSession).filter(
         models.ChatSession.id == session_id,
         models.ChatSession.user_id == current_user.id
@@ -151,37 +288,40 @@ async def delete_session(session_id: int, request: Request, db: Session = Depend
     db.commit()
     return {"message": "Session deleted"}
 
-@app.get("/history/{session_id}")
-async def get_session_history(session_id: int, request: Request, db: Session = Depends(get_db)):
-    current_user = await auth.require_current_user(request, db)
-    return db.query(models.ChatHistory).filter(
-        models.ChatHistory.user_id == current_user.id,
-        models.ChatHistory.session_id == session_id
-    ).order_by(models.ChatHistory.timestamp.asc()).all()
-
-@app.post("/query")
-async def process_query(
+@app.get("/history/{session_id}", response_model=List[HistoryItem])
+def get_session_history(
+    session_id: int,
     request: Request,
-    query: str = Query(...), 
-    session_id: int = Query(None),
-    mode: str = Query("standard"),
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
     db: Session = Depends(get_db),
 ):
-    current_user = await auth.require_current_user(request, db)
-    
-    # Check Usage Limit
-    now = datetime.utcnow()
-    # Reset usage if it's a new day
-    if not current_user.last_usage_reset or current_user.last_usage_reset.date() < now.date():
-        current_user.usage_count = 0
-        current_user.last_usage_reset = now
-        db.commit()
-    
-    if current_user.tier == "free" and current_user.usage_count >= current_user.usage_limit:
-        raise HTTPException(
-            status_code=403, 
-            detail="Daily inquiry limit reached. Upgrade to Pro for unlimited research."
-        )
+    """Oldest first, paged like /sessions."""
+    current_user = auth.require_current_user(request, db)
+    # Read-your-writes when answers don't wait for their commit (HISTORY_WAIT_FOR_COMMIT=false):
+    # a turn this worker just answered may still be queued.
+    history_writer.wait_for_user(current_user.id)
+    query = db.query(
+        models.ChatHistory.id,
+        models.ChatHistory.session_id,
+        models.ChatHistory.query,
+        models.ChatHistory.response,
+        models.ChatHistory.language,
+        models.ChatHistory.timestamp,
+    ).filter(
+        models.ChatHistory.user_id == current_user.id,
+        models.ChatHistory.session_id == session_id
+    )
+    return keyset_page(query, models.ChatHistory.timestamp, models.ChatHistory.id, cursor, limit, response, descending=False)
+
+def start_turn(request: Request, query: str, session_id: Optional[int], db: Session) -> dict:
+    """
+    Auth, usage metering and session resolution for a query, committed as one
+    write transaction; blocking, so run in the threadpool. This is the only
+    commit on the request path: the answered turn goes to the history writer.
+    """
+    current_user = auth.require_current_user(request, db)
     
     # Ensure session exists or create one
     if session_id:
@@ -195,101 +335,384 @@ async def process_query(
         # Create a new session for this query
         chat_session = models.ChatSession(user_id=current_user.id, title=query[:50] + "...")
         db.add(chat_session)
-        db.commit()
-        db.refresh(chat_session)
-        session_id = chat_session.id
+        db.flush()  # assigns the id inside the transaction, so no re-read after commit
+    session_id, session_title = chat_session.id, chat_session.title
 
-    logger.info(f"Processing query: {query} (User: {current_user.email}, Session: {session_id}, Mode: {mode})")
+    # Check and count usage atomically (with the daily reset), so concurrent queries can't overshoot the limit.
+    if not metering.consume_quota(db, current_user.id):
+        db.rollback()
+        telemetry.USAGE_LIMIT_REJECTIONS.inc()
+        raise HTTPException(
+            status_code=403, 
+            detail="Daily inquiry limit reached. Upgrade to Pro for unlimited research."
+        )
+    db.commit()
+
+    # Plain values only: touching expired ORM attributes later would lazy-load on the event loop.
+    return {
+        "user_id": current_user.id,
+        "email": current_user.email,
+        "madhhab": current_user.preferred_madhhab,
+        "language": current_user.ui_language,
+        "session_id": session_id,
+        "session_title": session_title,
+    }
+
+def format_quran(v, rank: int = 0):
+    text = v.english_text or v.arabic_text
+    return (
+        Passage("quran", f"Quran {v.surah_number}:{v.ayah_number} - ", text, rank=rank),
+        f"Quran {v.surah_number}:{v.ayah_number}",
+        {"type": "quran", "id": f"Quran {v.surah_number}:{v.ayah_number}", "content": text},
+    )
+
+def format_hadith(h, rank: int = 0):
+    text = h.english_text or h.arabic_text
+    return (
+        Passage("hadith", f"Hadith ({h.book_name}) #{h.hadith_number} - ", text, rank=rank),
+        f"{h.book_name} {h.hadith_number}",
+        {"type": "hadith", "id": f"{h.book_name} #{h.hadith_number}", "content": text},
+    )
+
+def format_fiqh(f, rank: int = 0):
+    text = f.translation or f.arabic_text
+    reference = ", ".join(part for part in (f.source_book, f.reference_page and f"p. {f.reference_page}") if part)
+    return (
+        Passage("fiqh", f"Fiqh ({f.madhhab}) {f.ruling_title} - ", text, f" [{reference}]" if reference else "", rank=rank),
+        f"{f.madhhab}: {f.ruling_title}",
+        {"type": "fiqh", "id": f"{f.madhhab}: {f.ruling_title}", "content": text},
+    )
+
+def retrieve_sources(model, formatter, query_vector, query_text: str, top_k: int = 3, filters=None):
+    """Runs one corpus search on its own session so several can run in parallel threads."""
+    db = SessionLocal()
+    try:
+        rows = rag_engine.retrieve(db, model, query_vector, top_k=top_k, query_text=query_text, filters=filters)
+        return [formatter(row, rank) for rank, row in enumerate(rows)]
+    finally:
+        db.close()
+
+def fiqh_sources(query_vector, query_text: str, madhhab: str, mode: str):
+    """
+    Comparative mode takes the top rulings from every madhhab in one pass; otherwise
+    a user with a preferred madhhab searches only that madhhab's partition.
+    """
+    db = SessionLocal()
+    try:
+        if mode == "comparative":
+            groups = rag_engine.retrieve_groups(
+                db, models.FiqhSource, query_vector, "madhhab", models.MADHAHIB, top_k=2, query_text=query_text,
+            )
+            # Ranked within each madhhab, so every school's best ruling competes for the context budget equally.
+            return [format_fiqh(row, rank) for rows in groups.values() for rank, row in enumerate(rows)]
+        filters = {"madhhab": madhhab} if madhhab in models.MADHAHIB else None
+        rows = rag_engine.retrieve(db, models.FiqhSource, query_vector, top_k=3, query_text=query_text, filters=filters)
+        return [format_fiqh(row, rank) for rank, row in enumerate(rows)]
+    finally:
+        db.close()
+
+reference_resolver = ReferenceResolver(
+    max_verses=config.settings.MAX_REFERENCE_VERSES,
+    refresh_interval=config.settings.VECTOR_INDEX_REFRESH_SECONDS,
+)
+
+def reference_sources(references, language: str):
+    """
+    Loads the passages a query names explicitly, e.g. "2:255" or "Bukhari 1".
+    Returns the usual (context, citation, source) triples plus the passages
+    rendered as a plain answer for text-only requests.
+    """
+    db = SessionLocal()
+    try:
+        verses, hadiths = reference_resolver.resolve(db, references)
+        # Ranked by position, so a long range keeps its opening verses when the budget runs out.
+        local = [format_quran(v, rank) for rank, v in enumerate(verses)] + [format_hadith(h, rank) for rank, h in enumerate(hadiths)]
+        passages = []
+        for row, (_, citation, _) in zip(verses + hadiths, local):
+            translation = (row.bangla_text if language == "bn" else None) or row.english_text
+            passages.append("\n\n".join(part for part in (f"**{citation}**", row.arabic_text, translation) if part))
+        return local, "\n\n".join(passages)
+    finally:
+        db.close()
+
+def web_sources(query: str):
+    try:
+        web_results = search_tool.search(query, timeout=config.settings.WEB_SEARCH_DEADLINE_SECONDS)
+    except Exception as e:
+        logger.error(f"Web search failed: {e}")
+        return []
+    return [
+        (Passage("web", f"Source: {res['url']}\nContent: ", res['content'], rank=rank), res['url'], {"type": "web", "id": res['url'], "content": res['content']})
+        for rank, res in enumerate(web_results)
+    ]
+
+def build_system_prompt(query: str, sources, madhhab: str, language: str, mode: str):
+    """
+    Packs the (passage, citation, source) triples into the context budget of every
+    model the router may fall back to, renders the system prompt and logs its
+    estimated input tokens. Returns the prompt and the triples whose passages made
+    it in, so clients are only shown sources the model actually saw.
+    """
+    with telemetry.stage("prompt"):
+        instructions = rag_engine.construct_system_prompt("", "", madhhab=madhhab, language=language, mode=mode)
+        reserved = count_tokens_any(instructions + query, MODELS_TO_TRY)
+        built = context_builder.build(query, [passage for passage, _, _ in sources], MODELS_TO_TRY, reserved_tokens=reserved)
+        logger.info(
+            f"Prompt ~{reserved + built.tokens} input tokens: context {built.tokens}/{built.budget} from "
+            f"{built.included}/{len(sources)} passages ({built.trimmed} trimmed, {built.duplicates} duplicate, {built.dropped} over budget)"
+        )
+        prompt = rag_engine.construct_system_prompt(
+            built.context, built.web_context, madhhab=madhhab, language=language, mode=mode,
+        )
+        return prompt, [sources[i] for i in built.kept]
+
+def lookup_answer(query_vector, madhhab: str, language: str, mode: str):
+    if query_vector is None:
+        return None
+    # A short-lived session: the request's own would hold a pooled connection through generation.
+    db = SessionLocal()
+    try:
+        answer_cache.check_corpus_version(rag_engine.corpus_version(db))
+    finally:
+        db.close()
+    return answer_cache.lookup(query_vector, madhhab, language, mode)
+
+def store_answer(prepared: dict, response: str):
+    if prepared["ready_response"] is not None or prepared.get("filtered") or is_error_response(response):
+        return
+    answer_cache.store(prepared["query_vector"], prepared["madhhab"], prepared["language"], prepared["mode"], {
+        "response": response,
+        "sources_found": prepared["sources_found"],
+        "citations": prepared["citations"],
+        "sources": prepared["sources"],
+    })
+
+async def prepare_query(
+    request: Request, query: str, session_id: Optional[int], mode: str, db: Session,
+    text_only: bool = False, hadith_grade: Optional[str] = None, hadith_book: Optional[str] = None,
+) -> dict:
+    """
+    Auth, usage check, session resolution and retrieval shared by /query and /query/stream.
+    Every blocking step runs in the threadpool; the corpus searches run concurrently.
+    `ready_response` is set when no generation is needed: an answer-cache hit, or a
+    `text_only` request whose query resolved to explicit references.
+    `hadith_grade` / `hadith_book` restrict hadith retrieval, e.g. to "Sahih" only.
+    """
+    with telemetry.stage("session"):
+        turn = await run_in_threadpool(start_turn, request, query, session_id, db)
+
+    logger.info(f"Processing query: {query} (User: {turn['email']}, Session: {turn['session_id']}, Mode: {mode})")
+
+    # A query that only names passages ("2:255", "Surah Al-Kahf 1-10", "Bukhari 1") is answered
+    # from them directly: no embedding, similarity search or web search. Passages cited
+    # alongside a question are looked up the same way and join the retrieved sources.
+    parsed = parse_references(query)
+    referenced = []
+    if parsed.references:
+        with telemetry.stage("references"):
+            referenced, passages = await run_in_threadpool(reference_sources, parsed.references, turn["language"])
+        logger.info(f"Resolved {len(parsed.references)} reference(s) to {len(referenced)} passage(s)")
+        if referenced and parsed.standalone:
+            prepared = {
+                **turn,
+                "query_vector": None,
+                "mode": mode,
+                "ready_response": passages if text_only else None,
+                "sources_found": True,
+                "citations": list(dict.fromkeys(citation for _, citation, _ in referenced)),
+                "sources": [source for _, _, source in referenced],
+                "web_search": None,
+            }
+            if not text_only:
+                prepared["system_prompt"], kept = await run_in_threadpool(
+                    build_system_prompt, query, referenced, turn["madhhab"], turn["language"], mode,
+                )
+                prepared["citations"] = list(dict.fromkeys(citation for _, citation, _ in kept))
+                prepared["sources"] = [source for _, _, source in kept]
+            return prepared
+
+    # Start web search alongside retrieval when local sources look unlikely to suffice.
+    deadline = config.settings.WEB_SEARCH_DEADLINE_SECONDS
+    web_started = time.monotonic()
+    web_task = None
+    if search_tool.should_prefetch(query, local_search_available=rag_engine.api_available or config.settings.LEXICAL_SEARCH):
+        web_task = asyncio.ensure_future(run_in_threadpool(web_sources, query))
     
     # 1. Retrieval
-    context_parts = []
-    citations = []
-    sources = []
-    
     # Advanced neural semantic search
-    query_vector = rag_engine.get_embedding(query)
-    quran_results = db.query(models.QuranVerse).all()
-    hadith_results = db.query(models.Hadith).all()
-
-    matches_quran = rag_engine.search_semantic(query_vector, quran_results, top_k=3)
-    matches_hadith = rag_engine.search_semantic(query_vector, hadith_results, top_k=3)
-                
-    for v in matches_quran:
-        text = v.english_text or v.arabic_text
-        context_parts.append(f"Quran {v.surah_number}:{v.ayah_number} - {text}")
-        citations.append(f"Quran {v.surah_number}:{v.ayah_number}")
-        sources.append({
-            "type": "quran",
-            "id": f"Quran {v.surah_number}:{v.ayah_number}",
-            "content": text
-        })
-        
-    for h in matches_hadith:
-        text = h.english_text or h.arabic_text
-        context_parts.append(f"Hadith ({h.book_name}) #{h.hadith_number} - {text}")
-        citations.append(f"{h.book_name} {h.hadith_number}")
-        sources.append({
-            "type": "hadith",
-            "id": f"{h.book_name} #{h.hadith_number}",
-            "content": text
-        })
-
-    context = "\n".join(context_parts)
+    query_vector = await run_in_threadpool(rag_engine.get_embedding, query)
+
+    # A near-identical question under the same prompt settings can reuse its answer.
+    # Filtered retrieval and cited passages change the context, so such answers are neither reused nor cached.
+    hadith_filters = {"grade": hadith_grade, "book_name": hadith_book} if hadith_grade or hadith_book else None
+    cached = None
+    if not hadith_filters and not referenced:
+        with telemetry.stage("answer_cache"):
+            cached = await run_in_threadpool(lookup_answer, query_vector, turn["madhhab"], turn["language"], mode)
+    if cached:
+        if web_task is not None:
+            web_task.cancel()
+        logger.info(f"Answer cache hit (similarity {cached['similarity']:.3f})")
+        return {
+            **turn,
+            "query_vector": query_vector,
+            "mode": mode,
+            "ready_response": cached["response"],
+            "sources_found": cached["sources_found"],
+            "citations": cached["citations"],
+            "sources": cached["sources"],
+            "web_search": None,
+        }
+
+    with telemetry.stage("retrieval"):
+        matches_quran, matches_hadith, matches_fiqh = await asyncio.gather(
+            run_in_threadpool(retrieve_sources, models.QuranVerse, format_quran, query_vector, query),
+            run_in_threadpool(retrieve_sources, models.Hadith, format_hadith, query_vector, query, 3, hadith_filters),
+            run_in_threadpool(fiqh_sources, query_vector, query, turn["madhhab"], mode),
+        )
+    cited = {source["id"] for _, _, source in referenced}
+    local = referenced + [match for match in matches_quran + matches_hadith + matches_fiqh if match[2]["id"] not in cited]
     
     # 2. Web Fallback
-    web_context = ""
-    if not context or len(context_parts) < 2:
+    web = []
+    web_outcome = None
+    if len(local) < 2:
+        if web_task is None:
+            web_started = time.monotonic()
+            web_task = asyncio.ensure_future(run_in_threadpool(web_sources, query))
+            web_outcome = "fallback"
+        else:
+            web_outcome = "speculative_used"
         try:
-            from .tools.tavily_search import search_tool
-            web_results = search_tool.search(query)
-            web_parts = [f"Source: {res['url']}\nContent: {res['content']}" for res in web_results]
-            for res in web_results: 
-                citations.append(res['url'])
-                sources.append({
-                    "type": "web",
-                    "id": res['url'],
-                    "content": res['content']
-                })
-            web_context = "\n\n".join(web_parts)
-        except Exception as e:
-            logger.error(f"Web search failed: {e}")
+            remaining = max(0.0, deadline - (time.monotonic() - web_started))
+            with telemetry.stage("web_wait"):
+                web = await asyncio.wait_for(web_task, timeout=remaining)
+        except asyncio.TimeoutError:
+            logger.warning(f"Web search missed its {deadline:.1f}s deadline; answering without it")
+            web_outcome = "timed_out"
+    elif web_task is not None:
+        web_task.cancel()
+        web_outcome = "speculative_wasted"
+    if web_outcome:
+        search_tool.record(web_outcome)
+        logger.info(f"Web search: {web_outcome}")
+
+    system_prompt, kept = await run_in_threadpool(
+        build_system_prompt, query, local + web, turn["madhhab"], turn["language"], mode,
+    )
+
+    return {
+        **turn,
+        "query_vector": query_vector,
+        "mode": mode,
+        "ready_response": None,
+        "filtered": bool(hadith_filters or referenced),
+        "system_prompt": system_prompt,
+        "sources_found": bool(kept),
+        "citations": list({citation for _, citation, _ in kept}),
+        "sources": [source for _, _, source in kept],
+        "web_search": web_outcome,
+    }
+
+def save_turn(prepared: dict, query: str, response: str, wait: bool = True):
+    """
+    Queues a finished exchange for the history writer; usage was already counted by start_turn.
+    With HISTORY_WAIT_FOR_COMMIT, blocks until the row is committed (sharing the commit with
+    concurrent answers), so the turn is in /history on every worker by the time the client has it.
+    """
+    seq = history_writer.add(prepared["user_id"], prepared["session_id"], query, response, prepared["language"])
+    if wait and config.settings.HISTORY_WAIT_FOR_COMMIT:
+        history_writer.wait_for(seq)
+
+@app.post("/query")
+async def process_query(
+    request: Request,
+    query: str = Query(...), 
+    session_id: int = Query(None),
+    mode: str = Query("standard"),
+    text_only: bool = Query(False),
+    hadith_grade: Optional[str] = Query(None),
+    hadith_book: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+):
+    prepared = await prepare_query(request, query, session_id, mode, db, text_only, hadith_grade, hadith_book)
 
     # 3. Generation
-    system_prompt = rag_engine.construct_system_prompt(
-        context, 
-        web_context, 
-        madhhab=current_user.preferred_madhhab, 
-        language=current_user.ui_language,
-        mode=mode
-    )
-    response = llm_provider.generate_response(system_prompt, query)
+    response = prepared["ready_response"]
+    if response is None:
+        response = await run_in_threadpool(llm_provider.generate_response, prepared["system_prompt"], query)
+        store_answer(prepared, response)
     
-    # 4. Save History
-    new_history = models.ChatHistory(
-        user_id=current_user.id,
-        session_id=session_id,
-        query=query,
-        response=response,
-        language=current_user.ui_language
-    )
-    db.add(new_history)
-    
-    # Increment usage
-    current_user.usage_count += 1
-    db.commit()
+    # 4. Save History (batched with concurrent answers)
+    await run_in_threadpool(save_turn, prepared, query, response)
 
     return {
         "response": response,
-        "sources_found": bool(context or web_context),
-        "citations": list(set(citations)),
-        "sources": sources,
-        "session_id": session_id,
-        "session_title": chat_session.title
+        "sources_found": prepared["sources_found"],
+        "citations": prepared["citations"],
+        "sources": prepared["sources"],
+        "session_id": prepared["session_id"],
+        "session_title": prepared["session_title"]
     }
 
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/query/stream")
+async def process_query_stream(
+    request: Request,
+    query: str = Query(...), 
+    session_id: int = Query(None),
+    mode: str = Query("standard"),
+    text_only: bool = Query(False),
+    hadith_grade: Optional[str] = Query(None),
+    hadith_book: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Server-Sent Events variant of /query: a `sources` frame as soon as retrieval
+    finishes, then `token` frames as Groq generates, then `done`. The generator
+    is synchronous, so Starlette iterates it in the threadpool.
+    """
+    prepared = await prepare_query(request, query, session_id, mode, db, text_only, hadith_grade, hadith_book)
+
+    def event_stream():
+        yield sse_event("sources", {
+            "sources_found": prepared["sources_found"],
+            "citations": prepared["citations"],
+            "sources": prepared["sources"],
+            "session_id": prepared["session_id"],
+            "session_title": prepared["session_title"],
+        })
+        chunks = []
+        saved = False
+        try:
+            if prepared["ready_response"] is not None:
+                stream = [prepared["ready_response"]]
+            else:
+                stream = llm_provider.stream_response(prepared["system_prompt"], query)
+            for chunk in stream:
+                chunks.append(chunk)
+                yield sse_event("token", {"text": chunk})
+            store_answer(prepared, "".join(chunks))
+            # Saved before `done`, so the turn is in /history once the client sees the stream end.
+            save_turn(prepared, query, "".join(chunks))
+            saved = True
+            yield sse_event("done", {})
+        finally:
+            # A client that disconnected mid-stream gets its partial answer recorded.
+            if chunks and not saved:
+                save_turn(prepared, query, "".join(chunks), wait=False)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.delete("/history/{history_id}")
-async def delete_history_item(history_id: int, request: Request, db: Session = Depends(get_db)):
-    current_user = await auth.require_current_user(request, db)
+def delete_history_item(history_id: int, request: Request, db: Session = Depends(get_db)):
+    current_user = auth.require_current_user(request, db)
     item = db.query(models.ChatHistory).filter(
         models.ChatHistory.id == history_id,
         models.ChatHistory.user_id == current_user.id
@@ -303,21 +726,22 @@ async def delete_history_item(history_id: int, request: Request, db: Session = D
     return {"message": "Deleted successfully"}
 
 @app.delete("/history")
-async def clear_history(request: Request, db: Session = Depends(get_db)):
-    current_user = await auth.require_current_user(request, db)
+def clear_history(request: Request, db: Session = Depends(get_db)):
+    current_user = auth.require_current_user(request, db)
+    history_writer.wait_for_user(current_user.id)
     db.query(models.ChatHistory).filter(models.ChatHistory.user_id == current_user.id).delete()
     db.commit()
     return {"message": "All history cleared"}
 
-@app.post("/library/save")
-async def save_citation(
+@app.post("/library/save", response_model=CitationResponse)
+def save_citation(
     request: Request,
     source_type: str = Query(...),
     source_id: str = Query(...),
     content: str = Body(...),
     db: Session = Depends(get_db)
 ):
-    current_user = await auth.require_current_user(request, db)
+    current_user = auth.require_current_user(request, db)
     new_citation = models.SavedCitation(
         user_id=current_user.id,
         source_type=source_type,
@@ -329,14 +753,44 @@ async def save_citation(
     db.refresh(new_citation)
     return new_citation
 
-@app.get("/library")
-async def get_library(request: Request, db: Session = Depends(get_db)):
-    current_user = await auth.require_current_user(request, db)
-    return db.query(models.SavedCitation).filter(models.SavedCitation.user_id == current_user.id).order_by(models.SavedCitation.timestamp.desc()).all()
+@app.get("/library", response_model=List[CitationSummary])
+def get_library(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """Newest first, with a content preview; GET /library/{id} returns the full text."""
+    current_user = auth.require_current_user(request, db)
+    query = db.query(
+        models.SavedCitation.id,
+        models.SavedCitation.source_type,
+        models.SavedCitation.source_id,
+        func.substr(models.SavedCitation.content, 1, CONTENT_PREVIEW_CHARS).label("preview"),
+        models.SavedCitation.timestamp,
+    ).filter(models.SavedCitation.user_id == current_user.id)
+    return keyset_page(query, models.SavedCitation.timestamp, models.SavedCitation.id, cursor, limit, response)
+
+@app.get("/library/count")
+def count_library(request: Request, db: Session = Depends(get_db)):
+    current_user = auth.require_current_user(request, db)
+    return {"count": db.query(func.count(models.SavedCitation.id)).filter(models.SavedCitation.user_id == current_user.id).scalar()}
+
+@app.get("/library/{citation_id}", response_model=CitationResponse)
+def get_citation(citation_id: int, request: Request, db: Session = Depends(get_db)):
+    current_user = auth.require_current_user(request, db)
+    citation = db.query(models.SavedCitation).filter(
+        models.SavedCitation.id == citation_id,
+        models.SavedCitation.user_id == current_user.id
+    ).first()
+    if not citation:
+        raise HTTPException(status_code=404, detail="Citation not found")
+    return citation
 
 @app.delete("/library/{citation_id}")
-async def delete_citation(citation_id: int, request: Request, db: Session = Depends(get_db)):
-    current_user = await auth.require_current_user(request, db)
+def delete_citation(citation_id: int, request: Request, db: Session = Depends(get_db)):
+    current_user = auth.require_current_user(request, db)
     citation = db.query(models.SavedCitation).filter(
         models.SavedCitation.id == citation_id,
         models.SavedCitation.user_id == current_user.id
@@ -348,31 +802,99 @@ async def delete_citation(citation_id: int, request: Request, db: Session = Depe
     return {"message": "Citation deleted"}
 
 @app.get("/usage")
-async def get_usage(request: Request, db: Session = Depends(get_db)):
-    current_user = await auth.require_current_user(request, db)
-    
-    # Check for daily reset here too for fresh data
-    now = datetime.utcnow()
-    if not current_user.last_usage_reset or current_user.last_usage_reset.date() < now.date():
-        current_user.usage_count = 0
-        current_user.last_usage_reset = now
-        db.commit()
-        
-    return {
-        "tier": current_user.tier,
-        "usage_count": current_user.usage_count,
-        "usage_limit": current_user.usage_limit,
-        "is_unlimited": current_user.tier == "pro"
-    }
+def get_usage(request: Request, db: Session = Depends(get_db)):
+    current_user = auth.require_current_user(request, db)
+    return metering.read_usage(db, current_user.id)
 
 @app.post("/upgrade")
-async def upgrade_user(request: Request, db: Session = Depends(get_db)):
-    current_user = await auth.require_current_user(request, db)
+def upgrade_user(request: Request, db: Session = Depends(get_db)):
+    current_user = db.get(models.User, auth.require_current_user(request, db).id)
     current_user.tier = "pro"
     current_user.usage_limit = 999999 # Effectively unlimited
     db.commit()
+    auth.invalidate_user(current_user.id)
     return {"message": "Successfully upgraded to Pro tier!", "tier": "pro"}
 
+@app.get("/stats")
+def get_stats():
+    """Operator counters for retrieval, web search and per-model LLM routing."""
+    return {
+        "embedding_cache": rag_engine.embedding_cache.stats(),
+        "embedding_batches": rag_engine.query_batcher.stats(),
+        "web_search": search_tool.stats(),
+        "llm": llm_provider.stats(),
+        "answer_cache": answer_cache.stats(),
+        "user_cache": auth.user_cache.stats(),
+        "password_hashing": auth.password_hasher.stats(),
+        "db_pool": pool_stats(),
+        "history_writer": history_writer.stats(),
+        "context": context_builder.stats(),
+        "lexical_index": {model.__tablename__: index.stats() for model, index in rag_engine.lexical_indexes.items()},
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Stage and request latency histograms and LLM / web search counters, in the Prometheus text format."""
+    return PlainTextResponse(telemetry.registry.render(), media_type=telemetry.CONTENT_TYPE)
+
+def warm_up():
+    """
+    Does the first-use work ahead of traffic: opens the pool's connections,
+    loads the resident vector and keyword indexes, reads the corpus metadata
+    the reference resolver and answer cache key on, and creates the API
+    clients. Makes no calls to Gemini, Groq or Tavily.
+    """
+    def open_pool():
+        connections = [engine.connect() for _ in range(engine.pool.size() if isinstance(engine.pool, QueuePool) else 1)]
+        for connection in connections:
+            connection.execute(text("SELECT 1"))
+            connection.close()
+
+    def load_indexes(get_index):
+        db = SessionLocal()
+        try:
+            for model in (models.QuranVerse, models.Hadith, models.FiqhSource):
+                get_index(model).refresh(db)
+        finally:
+            db.close()
+
+    def read_corpus_metadata():
+        db = SessionLocal()
+        try:
+            reference_resolver.book_names(db)
+            rag_engine.corpus_version(db)
+        finally:
+            db.close()
+
+    def create_clients():
+        llm_provider.client
+        search_tool.client
+        if rag_engine.api_available:
+            rag_engine.genai
+
+    readiness.run("db_pool", open_pool)
+    if rag_engine.api_available:
+        readiness.run("vector_indexes", load_indexes, rag_engine.get_index)
+    if config.settings.LEXICAL_SEARCH:
+        readiness.run("lexical_indexes", load_indexes, rag_engine.get_lexical_index)
+    readiness.run("corpus_metadata", read_corpus_metadata)
+    readiness.run("clients", create_clients)
+    readiness.mark_ready()
+
+@app.get("/ready")
+def readiness_check(response: Response):
+    """Readiness probe: 503 until migrations and the optional warm-up finish, or while the database is unreachable."""
+    status = readiness.stats()
+    if status["ready"]:
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+        except Exception as e:
+            status.update(ready=False, error=str(e))
+    if not status["ready"]:
+        response.status_code = 503
+    return status
+
 @app.get("/health")
 def health_check(db: Session = Depends(get_db)):
     try:
@@ -381,6 +903,8 @@ def health_check(db: Session = Depends(get_db)):
     except Exception as e:
         return {"status": "unhealthy", "error": str(e)}
 
+readiness.imported()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,45 @@
+from datetime import datetime
+from sqlalchemy import case, or_
+from sqlalchemy.orm import Session
+from . import models
+
+User = models.User
+
+def _day_start(now: datetime) -> datetime:
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def consume_quota(db: Session, user_id: int, now: datetime = None) -> bool:
+    """
+    Counts one query against the user's daily limit, resetting the count first
+    if it was last reset before today, all in a single conditional UPDATE.
+    Returns False (and changes nothing) when a free-tier user is at the limit.
+    Concurrent calls can't overshoot: the database serializes the row update
+    and re-checks the condition. Does not commit, so the caller can fold it
+    into the rest of its transaction.
+    """
+    now = now or datetime.utcnow()
+    stale = or_(User.last_usage_reset.is_(None), User.last_usage_reset < _day_start(now))
+    result = db.execute(
+        User.__table__.update()
+        .where(User.id == user_id, or_(User.tier != "free", stale, User.usage_count < User.usage_limit))
+        .values(
+            usage_count=case((stale, 1), else_=User.usage_count + 1),
+            last_usage_reset=case((stale, now), else_=User.last_usage_reset),
+        )
+    )
+    return result.rowcount == 1
+
+def read_usage(db: Session, user_id: int, now: datetime = None) -> dict:
+    """Today's usage without writing: a count last reset before today reads as 0."""
+    now = now or datetime.utcnow()
+    tier, usage_count, usage_limit, last_reset = db.query(
+        User.tier, User.usage_count, User.usage_limit, User.last_usage_reset
+    ).filter(User.id == user_id).one()
+    if not last_reset or last_reset < _day_start(now):
+        usage_count = 0
+    return {
+        "tier": tier,
+        "usage_count": usage_count or 0,
+        "usage_limit": usage_limit,
+        "is_unlimited": tier == "pro",
+    }
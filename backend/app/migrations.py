@@ -0,0 +1,108 @@
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from . import config, models
+from .vector_index import ensure_ann_indexes
+
+logger = logging.getLogger(__name__)
+
+# Bookkeeping lives outside models.Base so the base schema step never creates it by accident.
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Held for the whole run on PostgreSQL so workers starting together don't race each other.
+_ADVISORY_LOCK_KEY = 0x11A1
+
+def _base_schema(conn):
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+    models.Base.metadata.create_all(bind=conn)
+
+def _create_index(conn, model, name):
+    index = next(index for index in model.__table__.indexes if index.name == name)
+    index.create(bind=conn, checkfirst=True)
+
+def _listing_indexes(conn):
+    # Databases created before these indexes existed; a fresh database already has them from the base schema.
+    _create_index(conn, models.ChatSession, "ix_chat_sessions_user_created")
+    _create_index(conn, models.ChatHistory, "ix_chat_histories_user_session_timestamp")
+    _create_index(conn, models.SavedCitation, "ix_saved_citations_user_timestamp")
+
+def _corpus_versions(conn):
+    models.CorpusVersion.__table__.create(bind=conn, checkfirst=True)
+
+# Append only: each step runs once per database, in version order.
+MIGRATIONS = [
+    (1, "base schema", _base_schema),
+    (2, "composite indexes for per-user listings", _listing_indexes),
+    (3, "corpus version counters", _corpus_versions),
+]
+
+def applied_versions(conn) -> set:
+    if not inspect(conn).has_table(schema_migrations.name):
+        return set()
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+@contextmanager
+def migration_lock(engine):
+    """Holds the migration advisory lock on its own connection (PostgreSQL only), so one process migrates at a time."""
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+        conn.commit()
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+            conn.commit()
+
+def _upgrade(engine) -> list:
+    applied = []
+    with engine.connect() as conn:
+        try:
+            _metadata.create_all(bind=conn)
+            done = applied_versions(conn)
+            conn.commit()
+            for version, name, step in MIGRATIONS:
+                if version in done:
+                    continue
+                logger.info(f"Applying migration {version}: {name}")
+                step(conn)
+                conn.execute(schema_migrations.insert().values(version=version, name=name, applied_at=datetime.utcnow()))
+                conn.commit()
+                applied.append(version)
+        finally:
+            conn.rollback()
+    return applied
+
+def upgrade(engine) -> list:
+    """Applies pending migrations in order, each committed on its own; returns the versions applied."""
+    with migration_lock(engine):
+        return _upgrade(engine)
+
+def migrate(engine) -> list:
+    """
+    Schema migrations, then the pgvector ANN indexes for the configured index type,
+    all under the migration lock: workers starting together would otherwise race
+    on CREATE INDEX IF NOT EXISTS, which can still fail on PostgreSQL. The first
+    worker builds the indexes; the rest wait, then find them in place.
+    """
+    with migration_lock(engine):
+        applied = _upgrade(engine)
+        ensure_ann_indexes(
+            engine,
+            index_type=config.settings.VECTOR_ANN_INDEX,
+            m=config.settings.HNSW_M,
+            ef_construction=config.settings.HNSW_EF_CONSTRUCTION,
+            lists=config.settings.IVFFLAT_LISTS,
+        )
+    return applied
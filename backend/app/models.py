@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, PickleType, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, PickleType, DateTime, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 try:
@@ -8,6 +8,8 @@ except ImportError:
 
 from .database import Base, engine
 
+MADHAHIB = ("Hanafi", "Shafi'i", "Maliki", "Hanbali")
+
 # Helper to determine vector type
 def get_vector_type(dim: int):
     if Vector and engine.dialect.name == "postgresql":
@@ -45,6 +47,13 @@ class ChatSession(Base):
     user = relationship("User", back_populates="chat_sessions")
     messages = relationship("ChatHistory", back_populates="session", cascade="all, delete-orphan")
 
+    # Serves GET /sessions, which keyset-paginates a user's sessions ordered by
+    # (created_at DESC, id DESC): user_id for the equality filter, then the sort
+    # columns, so a page is a backward index range scan with no sort.
+    __table_args__ = (
+        Index("ix_chat_sessions_user_created", "user_id", "created_at", "id"),
+    )
+
 class ChatHistory(Base):
     __tablename__ = "chat_histories"
 
@@ -59,6 +68,10 @@ class ChatHistory(Base):
     user = relationship("User", back_populates="chat_histories")
     session = relationship("ChatSession", back_populates="messages")
 
+    __table_args__ = (
+        Index("ix_chat_histories_user_session_timestamp", "user_id", "session_id", "timestamp", "id"),
+    )
+
 class SavedCitation(Base):
     __tablename__ = "saved_citations"
 
@@ -71,6 +84,10 @@ class SavedCitation(Base):
 
     user = relationship("User", back_populates="saved_citations")
 
+    __table_args__ = (
+        Index("ix_saved_citations_user_timestamp", "user_id", "timestamp", "id"),
+    )
+
 class QuranVerse(Base):
     __tablename__ = "quran_verses"
 
@@ -107,3 +124,13 @@ class FiqhSource(Base):
     arabic_text = Column(Text)
     translation = Column(Text)
     embedding = Column(get_vector_type(384))
+
+class CorpusVersion(Base):
+    """
+    Per-table counter bumped by every corpus write (see vector_index.mark_corpus_changed),
+    so in-place edits that keep the row count and max id still refresh the indexes.
+    """
+    __tablename__ = "corpus_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
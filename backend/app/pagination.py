@@ -0,0 +1,41 @@
+import base64
+from datetime import datetime
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{row_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_query(query, timestamp_column, id_column, cursor: str, limit: int, descending: bool = True):
+    """`query` ordered by (timestamp, id) and limited to `limit` rows after `cursor`."""
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        # A row-value comparison, so both SQLite and PostgreSQL treat it as one index range bound.
+        key = tuple_(timestamp_column, id_column)
+        query = query.filter(key < (timestamp, row_id) if descending else key > (timestamp, row_id))
+    order = (timestamp_column.desc(), id_column.desc()) if descending else (timestamp_column.asc(), id_column.asc())
+    return query.order_by(*order).limit(limit)
+
+def keyset_page(query, timestamp_column, id_column, cursor: str, limit: int, response: Response, descending: bool = True):
+    """
+    One page of `query` ordered by (timestamp, id), starting after `cursor`.
+    The seek condition is a range on the composite (user_id, ..., timestamp, id)
+    indexes instead of an OFFSET scan. When more rows remain, the cursor for the
+    next page is sent in the X-Next-Cursor header, so the body stays a plain list.
+    """
+    rows = keyset_query(query, timestamp_column, id_column, cursor, limit + 1, descending).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(getattr(last, timestamp_column.key), getattr(last, id_column.key))
+    return rows
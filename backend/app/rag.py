@@ -1,41 +1,109 @@
 import os
+import threading
+import time
 import numpy as np
-import google.generativeai as genai
 import logging
 from dotenv import load_dotenv
+from . import config
+from .database import engine
+from .embedding_cache import EmbeddingCache
+from .batching import MicroBatcher
+from . import models
+from .models import Vector
+from .vector_index import VectorIndex, PgVectorIndex, fetch_rows, table_signature
+from .lexical_index import LexicalIndex, reciprocal_rank_fusion
+from .telemetry import stage
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Metadata columns each corpus index can filter on without a full scan
+PARTITION_COLUMNS = {
+    models.Hadith: ("book_name", "grade"),
+    models.FiqhSource: ("madhhab",),
+}
+
 class RAGEngine:
     def __init__(self):
-        # Configure Gemini API
-        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-            self.api_available = True
-            logger.info("Configured Gemini Embeddings API")
-        else:
-            self.api_available = False
+        # The Gemini SDK is imported and configured on first use (see `genai`), not at import.
+        self.api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+        self.api_available = bool(self.api_key)
+        if not self.api_available:
             logger.warning("GEMINI_API_KEY not found. Semantic search will be disabled.")
-        
+        self._genai = None
+        self._genai_lock = threading.Lock()
+
         # Using Gemini's latest embedding model
         self.model_name = "models/text-embedding-004"
+        self.indexes = {}
+        self.lexical_indexes = {}
+        self._corpus_version = None
+        self._corpus_checked_at = 0.0
+        self.embedding_cache = EmbeddingCache(config.settings.EMBEDDING_CACHE_SIZE, config.settings.EMBEDDING_CACHE_PATH)
+        # Concurrent query embeddings are sent to Gemini as one batch request.
+        self.query_batcher = MicroBatcher(
+            lambda texts: self.embed_batch(texts, task_type="retrieval_query"),
+            window=config.settings.EMBEDDING_BATCH_WINDOW_MS / 1000,
+            max_batch_size=config.settings.EMBEDDING_BATCH_MAX_SIZE,
+            name="gemini-embed",
+        )
+
+    @property
+    def genai(self):
+        """The google.generativeai module, configured with our key and endpoint."""
+        if self._genai is None:
+            with self._genai_lock:
+                if self._genai is None:
+                    import google.generativeai as genai
+                    if config.settings.GEMINI_API_ENDPOINT:
+                        # REST, since the default gRPC transport can't reach a plain HTTP endpoint.
+                        genai.configure(api_key=self.api_key, transport="rest", client_options={"api_endpoint": config.settings.GEMINI_API_ENDPOINT})
+                    else:
+                        genai.configure(api_key=self.api_key)
+                    logger.info("Configured Gemini Embeddings API")
+                    self._genai = genai
+        return self._genai
 
-    def get_embedding(self, text: str):
+    def get_embedding(self, text: str, task_type: str = "retrieval_query"):
         if not self.api_available or not text:
             return None
-        try:
-            result = genai.embed_content(
-                model=self.model_name,
-                content=text,
-                task_type="retrieval_query"
-            )
-            return result['embedding']
-        except Exception as e:
-            logger.error(f"Failed to generate embedding via Gemini API: {e}")
-            return None
+        with stage("embedding"):
+            key = self.embedding_cache.make_key(text, self.model_name, task_type)
+            cached = self.embedding_cache.get(key)
+            if cached is not None:
+                return cached
+            try:
+                if task_type == "retrieval_query":
+                    embedding = self.query_batcher.submit(text)
+                else:
+                    result = self.genai.embed_content(
+                        model=self.model_name,
+                        content=text,
+                        task_type=task_type
+                    )
+                    embedding = result['embedding']
+            except Exception as e:
+                logger.error(f"Failed to generate embedding via Gemini API: {e}")
+                return None
+            self.embedding_cache.put(key, embedding)
+            return embedding
+
+    def embed_batch(self, texts, task_type: str = "retrieval_document"):
+        """
+        Embeds many texts in one batched API call. Unlike get_embedding, errors
+        propagate so bulk callers can retry, and results bypass the query cache.
+        """
+        if not self.api_available:
+            raise RuntimeError("GEMINI_API_KEY not configured")
+        if not texts:
+            return []
+        result = self.genai.embed_content(
+            model=self.model_name,
+            content=list(texts),
+            task_type=task_type
+        )
+        return result['embedding']
 
     def cosine_similarity(self, vec1, vec2):
         if vec1 is None or vec2 is None:
@@ -60,14 +128,100 @@ class RAGEngine:
             return []
             
         scored_candidates = []
-        for item in candidates:
-            if hasattr(item, 'embedding') and item.embedding:
-                score = self.cosine_similarity(query_vector, item.embedding)
-                scored_candidates.append((score, item))
-            
-        scored_candidates.sort(key=lambda x: x[0], reverse=True)
+        with stage("semantic_scoring"):
+            for item in candidates:
+                if hasattr(item, 'embedding') and item.embedding:
+                    score = self.cosine_similarity(query_vector, item.embedding)
+                    scored_candidates.append((score, item))
+
+            scored_candidates.sort(key=lambda x: x[0], reverse=True)
         return [item for score, item in scored_candidates[:top_k] if score >= threshold]
 
+    def get_index(self, model):
+        index = self.indexes.get(model)
+        if index is None:
+            settings = config.settings
+            if Vector and engine.dialect.name == "postgresql":
+                index = PgVectorIndex(model, settings.VECTOR_ANN_INDEX, settings.HNSW_EF_SEARCH, settings.IVFFLAT_PROBES)
+            else:
+                index = VectorIndex(
+                    model, settings.VECTOR_INDEX_REFRESH_SECONDS, settings.EMBEDDING_STORE_DIR,
+                    partition_by=PARTITION_COLUMNS.get(model, ()),
+                )
+            index = self.indexes.setdefault(model, index)
+        return index
+
+    def get_lexical_index(self, model) -> LexicalIndex:
+        index = self.lexical_indexes.get(model)
+        if index is None:
+            index = self.lexical_indexes.setdefault(model, LexicalIndex(
+                model, config.settings.VECTOR_INDEX_REFRESH_SECONDS, min_score=config.settings.LEXICAL_MIN_SCORE,
+                partition_by=PARTITION_COLUMNS.get(model, ()),
+            ))
+        return index
+
+    def retrieve(self, db, model, query_vector, top_k=3, threshold=0.3, query_text=None, filters=None):
+        """
+        Top-k rows of `model`. Semantic candidates come from pgvector on PostgreSQL
+        or the resident in-process index elsewhere; with `query_text`, BM25
+        candidates are merged in by reciprocal rank fusion, so keyword queries
+        still work when no query embedding is available. The BM25 index is
+        (re)built in the background, so a query arriving before the first build
+        finishes gets semantic results only. `filters` ({column:
+        value(s)} over PARTITION_COLUMNS) restrict both searches to the matching
+        partitions. Only the winning rows are loaded from the database.
+        """
+        rankings = []
+        pool = top_k * 3
+        if query_vector:
+            with stage("semantic_scoring"):
+                rankings.append(self.get_index(model).search_ids(db, query_vector, top_k=pool, threshold=threshold, filters=filters))
+        if query_text and config.settings.LEXICAL_SEARCH:
+            with stage("lexical_search"):
+                lexical = self.get_lexical_index(model)
+                lexical.refresh(db, background=True)
+                rankings.append(lexical.search(query_text, top_k=pool, filters=filters))
+        with stage("db_load"):
+            return fetch_rows(db, model, self._fuse(rankings)[:top_k])
+
+    def retrieve_groups(self, db, model, query_vector, column, values, top_k=3, threshold=0.3, query_text=None):
+        """
+        Top-k rows for each value of a partition column (e.g. every madhhab), from a
+        single pass over those partitions. Returns {value: rows}.
+        """
+        values = list(values)
+        pool = top_k * 3
+        semantic = lexical = {}
+        if query_vector:
+            with stage("semantic_scoring"):
+                semantic = self.get_index(model).search_groups(db, query_vector, column, values, top_k=pool, threshold=threshold)
+        if query_text and config.settings.LEXICAL_SEARCH:
+            with stage("lexical_search"):
+                index = self.get_lexical_index(model)
+                index.refresh(db, background=True)
+                lexical = index.search_groups(query_text, column, values, top_k=pool)
+        winners = {value: self._fuse([semantic.get(value), lexical.get(value)])[:top_k] for value in values}
+        with stage("db_load"):
+            rows = fetch_rows(db, model, [pair for ranked in winners.values() for pair in ranked])
+        by_id = {row.id: row for row in rows}
+        return {value: [by_id[row_id] for row_id, _ in ranked if row_id in by_id] for value, ranked in winners.items()}
+
+    def _fuse(self, rankings):
+        rankings = [ranking for ranking in rankings if ranking]
+        if not rankings:
+            return []
+        return rankings[0] if len(rankings) == 1 else reciprocal_rank_fusion(rankings, k=config.settings.RRF_K)
+
+    def corpus_version(self, db):
+        """Fingerprint of the corpus tables (their table signatures), re-read at most once per refresh interval."""
+        now = time.monotonic()
+        if self._corpus_version is None or now - self._corpus_checked_at >= config.settings.VECTOR_INDEX_REFRESH_SECONDS:
+            self._corpus_version = tuple(
+                table_signature(db, model) for model in (models.QuranVerse, models.Hadith, models.FiqhSource)
+            )
+            self._corpus_checked_at = now
+        return self._corpus_version
+
     def construct_system_prompt(self, context: str, web_context: str = "", madhhab: str = "General", language: str = "en", mode: str = "standard"):
         """
         Constructs a specialized system prompt for the Islamic AI assistant with personalization.
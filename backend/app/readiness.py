@@ -0,0 +1,59 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class Readiness:
+    """
+    Startup progress reported by GET /ready. Steps (migrations, then the
+    optional warm-up) are timed as they run; the process is ready once
+    `mark_ready` is called. A required step (migrations) that fails is
+    re-raised so startup stops. A failed warm-up step is logged and skipped:
+    whatever it would have loaded is loaded on first use instead.
+    """
+
+    def __init__(self, started: float = None):
+        self.started = time.perf_counter() if started is None else started
+        self.import_seconds = None
+        self.steps = {}
+        self.errors = {}
+        self.ready_seconds = None
+        self._lock = threading.Lock()
+
+    def imported(self):
+        self.import_seconds = time.perf_counter() - self.started
+
+    def run(self, name: str, fn, *args, required: bool = False):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        except Exception as e:
+            logger.error(f"Startup step {name} failed: {e}")
+            with self._lock:
+                self.errors[name] = str(e)
+            if required:
+                raise
+        finally:
+            with self._lock:
+                self.steps[name] = round(time.perf_counter() - started, 3)
+
+    def mark_ready(self):
+        with self._lock:
+            self.ready_seconds = time.perf_counter() - self.started
+        steps = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.steps.items())
+        logger.info(f"Ready {self.ready_seconds:.2f}s after import began (import {self.import_seconds or 0:.2f}s{', ' + steps if steps else ''})")
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_seconds is not None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "import_seconds": round(self.import_seconds, 3) if self.import_seconds is not None else None,
+                "ready_seconds": round(self.ready_seconds, 3) if self.ready_seconds is not None else None,
+                "steps": dict(self.steps),
+                "errors": dict(self.errors),
+            }
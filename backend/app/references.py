@@ -0,0 +1,284 @@
+import re
+import threading
+import time
+from collections import namedtuple
+from sqlalchemy.orm import Session
+from . import models
+
+# (transliterated name, English name, verse count) for surahs 1..114
+SURAHS = [
+    ("Al-Fatihah", "The Opening", 7), ("Al-Baqarah", "The Cow", 286), ("Ali 'Imran", "The Family of Imran", 200),
+    ("An-Nisa", "The Women", 176), ("Al-Ma'idah", "The Table Spread", 120), ("Al-An'am", "The Cattle", 165),
+    ("Al-A'raf", "The Heights", 206), ("Al-Anfal", "The Spoils of War", 75), ("At-Tawbah", "The Repentance", 129),
+    ("Yunus", "Jonah", 109), ("Hud", "Hud", 123), ("Yusuf", "Joseph", 111),
+    ("Ar-Ra'd", "The Thunder", 43), ("Ibrahim", "Abraham", 52), ("Al-Hijr", "The Rocky Tract", 99),
+    ("An-Nahl", "The Bee", 128), ("Al-Isra", "The Night Journey", 111), ("Al-Kahf", "The Cave", 110),
+    ("Maryam", "Mary", 98), ("Taha", "Ta-Ha", 135), ("Al-Anbiya", "The Prophets", 112),
+    ("Al-Hajj", "The Pilgrimage", 78), ("Al-Mu'minun", "The Believers", 118), ("An-Nur", "The Light", 64),
+    ("Al-Furqan", "The Criterion", 77), ("Ash-Shu'ara", "The Poets", 227), ("An-Naml", "The Ant", 93),
+    ("Al-Qasas", "The Stories", 88), ("Al-'Ankabut", "The Spider", 69), ("Ar-Rum", "The Romans", 60),
+    ("Luqman", "Luqman", 34), ("As-Sajdah", "The Prostration", 30), ("Al-Ahzab", "The Combined Forces", 73),
+    ("Saba", "Sheba", 54), ("Fatir", "The Originator", 45), ("Ya-Sin", "Ya Sin", 83),
+    ("As-Saffat", "Those Who Set the Ranks", 182), ("Sad", "The Letter Sad", 88), ("Az-Zumar", "The Troops", 75),
+    ("Ghafir", "The Forgiver", 85), ("Fussilat", "Explained in Detail", 54), ("Ash-Shura", "The Consultation", 53),
+    ("Az-Zukhruf", "The Ornaments of Gold", 89), ("Ad-Dukhan", "The Smoke", 59), ("Al-Jathiyah", "The Crouching", 37),
+    ("Al-Ahqaf", "The Wind-Curved Sandhills", 35), ("Muhammad", "Muhammad", 38), ("Al-Fath", "The Victory", 29),
+    ("Al-Hujurat", "The Rooms", 18), ("Qaf", "The Letter Qaf", 45), ("Adh-Dhariyat", "The Winnowing Winds", 60),
+    ("At-Tur", "The Mount", 49), ("An-Najm", "The Star", 62), ("Al-Qamar", "The Moon", 55),
+    ("Ar-Rahman", "The Beneficent", 78), ("Al-Waqi'ah", "The Inevitable", 96), ("Al-Hadid", "The Iron", 29),
+    ("Al-Mujadilah", "The Pleading Woman", 22), ("Al-Hashr", "The Exile", 24), ("Al-Mumtahanah", "She That Is to Be Examined", 13),
+    ("As-Saff", "The Ranks", 14), ("Al-Jumu'ah", "The Congregation", 11), ("Al-Munafiqun", "The Hypocrites", 11),
+    ("At-Taghabun", "The Mutual Disillusion", 18), ("At-Talaq", "The Divorce", 12), ("At-Tahrim", "The Prohibition", 12),
+    ("Al-Mulk", "The Sovereignty", 30), ("Al-Qalam", "The Pen", 52), ("Al-Haqqah", "The Reality", 52),
+    ("Al-Ma'arij", "The Ascending Stairways", 44), ("Nuh", "Noah", 28), ("Al-Jinn", "The Jinn", 28),
+    ("Al-Muzzammil", "The Enshrouded One", 20), ("Al-Muddaththir", "The Cloaked One", 56), ("Al-Qiyamah", "The Resurrection", 40),
+    ("Al-Insan", "The Man", 31), ("Al-Mursalat", "The Emissaries", 50), ("An-Naba", "The Tidings", 40),
+    ("An-Nazi'at", "Those Who Drag Forth", 46), ("'Abasa", "He Frowned", 42), ("At-Takwir", "The Overthrowing", 29),
+    ("Al-Infitar", "The Cleaving", 19), ("Al-Mutaffifin", "The Defrauding", 36), ("Al-Inshiqaq", "The Sundering", 25),
+    ("Al-Buruj", "The Mansions of the Stars", 22), ("At-Tariq", "The Nightcomer", 17), ("Al-A'la", "The Most High", 19),
+    ("Al-Ghashiyah", "The Overwhelming", 26), ("Al-Fajr", "The Dawn", 30), ("Al-Balad", "The City", 20),
+    ("Ash-Shams", "The Sun", 15), ("Al-Layl", "The Night", 21), ("Ad-Duha", "The Morning Hours", 11),
+    ("Ash-Sharh", "The Relief", 8), ("At-Tin", "The Fig", 8), ("Al-'Alaq", "The Clot", 19),
+    ("Al-Qadr", "The Power", 5), ("Al-Bayyinah", "The Clear Proof", 8), ("Az-Zalzalah", "The Earthquake", 8),
+    ("Al-'Adiyat", "The Coursers", 11), ("Al-Qari'ah", "The Calamity", 11), ("At-Takathur", "The Rivalry in World Increase", 8),
+    ("Al-'Asr", "The Declining Day", 3), ("Al-Humazah", "The Traducer", 9), ("Al-Fil", "The Elephant", 5),
+    ("Quraysh", "Quraysh", 4), ("Al-Ma'un", "The Small Kindnesses", 7), ("Al-Kawthar", "The Abundance", 3),
+    ("Al-Kafirun", "The Disbelievers", 6), ("An-Nasr", "The Divine Support", 3), ("Al-Masad", "The Palm Fiber", 5),
+    ("Al-Ikhlas", "The Sincerity", 4), ("Al-Falaq", "The Daybreak", 5), ("An-Nas", "Mankind", 6),
+]
+
+# Other names in common use
+SURAH_ALIASES = {
+    "Al Imran": 3, "Bani Isra'il": 17, "Al-Mu'min": 40, "Ha-Mim As-Sajdah": 41, "Ad-Dahr": 76,
+    "Al-Inshirah": 94, "Alam Nashrah": 94, "Al-Lahab": 111, "Tabbat": 111, "At-Tawhid": 112,
+}
+
+# Canonical collection key -> spellings users write (normalized with collection_key)
+HADITH_COLLECTIONS = {
+    "bukhari": ["bukhari", "al-bukhari", "sahih bukhari", "sahih al-bukhari"],
+    "muslim": ["muslim", "sahih muslim"],
+    "abudawud": ["abu dawud", "abu dawood", "abu daud", "sunan abu dawud", "sunan abi dawud"],
+    "tirmidhi": ["tirmidhi", "tirmizi", "at-tirmidhi", "jami at-tirmidhi", "jami' at-tirmidhi", "sunan at-tirmidhi"],
+    "nasai": ["nasai", "nasa'i", "an-nasai", "an-nasa'i", "sunan an-nasai", "sunan an-nasa'i"],
+    "ibnmajah": ["ibn majah", "ibn maja", "sunan ibn majah"],
+    "malik": ["muwatta", "muwatta malik", "malik"],
+    "ahmad": ["ahmad", "musnad ahmad"],
+}
+
+SURAH_WORDS = frozenset({"surah", "sura", "surat", "chapter"})
+AYAH_WORDS = frozenset({"ayah", "ayat", "aya", "ayahs", "verse", "verses", "v"})
+HADITH_WORDS = frozenset({"hadith", "no", "number", "#"})
+# Leading words that mark a collection name as a citation: "Sahih Muslim 5", not "muslim 5 times".
+COLLECTION_PREFIXES = frozenset({"sahih", "sunan", "musnad", "muwatta", "jami", "jami'"})
+# Neighbours that make `N:M` a clock time or a ratio rather than surah:ayah.
+NOT_VERSE_BEFORE = frozenset({"at", "by", "until", "till", "around", "before", "after", "ratio"})
+NOT_VERSE_AFTER = frozenset({"am", "pm", "ratio", "odds"})
+# Words that may surround a reference without asking for anything beyond its text.
+FILLER_WORDS = frozenset({
+    "show", "me", "read", "recite", "quote", "give", "text", "full", "please", "the", "of", "and", "in",
+    "quran", "qur'an", "from", "says", "say", "translation", "hadith", "explain", "meaning", "tafsir",
+})
+
+_ARTICLE = re.compile(r"^(?:al|an|ar|as|at|ash|az|ad|adh|ath)[\s\-]+")
+_TOKEN = re.compile(r"\d+|[^\W\d_]+(?:['’`\-][^\W\d_]+)*|[:\-–,#]")
+
+QuranReference = namedtuple("QuranReference", "surah start end")
+HadithReference = namedtuple("HadithReference", "collection number")
+# `standalone`: the query asks for nothing beyond the referenced passages.
+ParsedReferences = namedtuple("ParsedReferences", "references standalone")
+
+def surah_key(name: str) -> str:
+    """Folds the usual transliteration variants: Al-Baqara, al baqarah, Baqarah -> baqara."""
+    key = _ARTICLE.sub("", re.sub(r"^the\s+", "", name.lower()).replace("’", "'").replace("`", "'").strip("' "))
+    key = re.sub(r"[^a-z]", "", key).replace("ee", "i").replace("oo", "u").replace("ou", "u").replace("au", "aw")
+    key = re.sub(r"(.)\1+", r"\1", key)
+    return key[:-1] if key.endswith("h") and len(key) > 3 else key
+
+def collection_key(name: str) -> str:
+    return re.sub(r"[^a-z]", "", name.lower())
+
+_TRANSLITERATED = {surah_key(name): number for number, (name, _, _) in enumerate(SURAHS, start=1)}
+_TRANSLITERATED.update((surah_key(name), number) for name, number in SURAH_ALIASES.items())
+_ENGLISH = {surah_key(english): number for number, (_, english, _) in enumerate(SURAHS, start=1)}
+_COLLECTIONS = {collection_key(alias): key for key, aliases in HADITH_COLLECTIONS.items() for alias in aliases}
+
+def _number(token: str):
+    return int(token) if token.isdigit() else None
+
+def _verse_range(tokens, i, surah):
+    """Reads `N` or `N-M` at tokens[i]; returns (start, end, next index) or None."""
+    start = _number(tokens[i]) if i < len(tokens) else None
+    if start is None:
+        return None
+    end, j = start, i + 1
+    if j + 1 < len(tokens) and tokens[j] in ("-", "–") and _number(tokens[j + 1]) is not None:
+        end, j = _number(tokens[j + 1]), j + 2
+    count = SURAHS[surah - 1][2]
+    if not 1 <= start <= end or start > count:
+        return None
+    return start, min(end, count), j
+
+def _match_name(tokens, i, table, max_words=4, min_length=1):
+    """Longest run of words starting at tokens[i] that names an entry of `table`."""
+    for length in range(min(max_words, len(tokens) - i), 0, -1):
+        words = tokens[i:i + length]
+        if any(not w[0].isalpha() for w in words):
+            continue
+        key = surah_key(" ".join(words)) if table is not _COLLECTIONS else collection_key("".join(words))
+        if key in table and len(key) >= min_length:
+            return table[key], i + length
+    return None
+
+def parse_references(query: str) -> ParsedReferences:
+    """
+    Finds scripture references in a query: `2:255`, `2:1-5`, `Al-Baqarah 2:255`,
+    `Surah Al-Baqarah ayah 43`, `Yasin 1-12`, `surah 36`, `Bukhari 1`,
+    `Sahih Muslim hadith 8`. A reference introduced by a marker (surah, ayah,
+    hadith, `#`, a Sahih/Sunan prefix) always counts, as does an in-range
+    `surah:ayah` that doesn't read as a time or ratio ("at 5:30", "2:1 ratio").
+    A bare name and number (`Yunus 10`, `Muslim 5`) and a surah named without
+    verses only count when the query asks for nothing else, so "Yunus 10
+    times" is left to ordinary retrieval.
+    """
+    tokens = _TOKEN.findall(query.lower())
+    found = []  # (reference, explicit)
+    consumed = set()
+    whole_surahs = []
+
+    def marked(start, end):
+        before = tokens[start - 1] if start else None
+        return before in SURAH_WORDS or before in AYAH_WORDS or before == "hadith" or any(
+            t in SURAH_WORDS or t in AYAH_WORDS or t in HADITH_WORDS or t in COLLECTION_PREFIXES for t in tokens[start:end]
+        )
+
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+
+        # 2:255 or 2:1-5 (but not "at 5:30 pm" or "a 2:1 ratio")
+        surah = _number(token)
+        if surah and 1 <= surah <= len(SURAHS) and i + 2 < len(tokens) and tokens[i + 1] == ":":
+            verses = _verse_range(tokens, i + 2, surah)
+            if verses and not (
+                (i > 0 and tokens[i - 1] in NOT_VERSE_BEFORE)
+                or (verses[2] < len(tokens) and tokens[verses[2]] in NOT_VERSE_AFTER)
+            ):
+                found.append((QuranReference(surah, verses[0], verses[1]), True))
+                consumed.update(range(i, verses[2]))
+                i = verses[2]
+                continue
+
+        # Surah by name or number, with or without a leading "surah"
+        prefixed = token in SURAH_WORDS
+        j = i + 1 if prefixed else i
+        named = None
+        if prefixed and j < len(tokens) and _number(tokens[j]) and _number(tokens[j]) <= len(SURAHS):
+            named = (_number(tokens[j]), j + 1)
+        elif j < len(tokens):
+            # Short names (Sad, Tin, Hud) read as ordinary words unless introduced by "surah".
+            named = (
+                _match_name(tokens, j, _TRANSLITERATED, min_length=1 if prefixed else 4)
+                or (_match_name(tokens, j, _ENGLISH) if prefixed else None)
+            )
+        if named:
+            surah, k = named
+            # Al-Baqarah 2:255: the surah number repeated before the colon
+            colon_form = k + 2 < len(tokens) and _number(tokens[k]) == surah and tokens[k + 1] == ":"
+            if colon_form:
+                k += 2
+            while k < len(tokens) and (tokens[k] in AYAH_WORDS or tokens[k] in (",", ":")):
+                k += 1
+            verses = _verse_range(tokens, k, surah)
+            if verses:
+                found.append((QuranReference(surah, verses[0], verses[1]), colon_form or marked(i, verses[2])))
+                consumed.update(range(i, verses[2]))
+                i = verses[2]
+                continue
+            if prefixed:
+                whole_surahs.append(surah)
+                consumed.update(range(i, k))
+                i = k
+                continue
+
+        # Bukhari 1, Sahih Muslim hadith 8, Abu Dawud #12
+        collection = _match_name(tokens, i, _COLLECTIONS)
+        if collection:
+            key, k = collection
+            while k < len(tokens) and tokens[k] in HADITH_WORDS:
+                k += 1
+            number = _number(tokens[k]) if k < len(tokens) else None
+            if number:
+                found.append((HadithReference(key, number), marked(i, k)))
+                consumed.update(range(i, k + 1))
+                i = k + 1
+                continue
+        i += 1
+
+    standalone = all(
+        t in FILLER_WORDS or t in AYAH_WORDS or not t[0].isalnum() for n, t in enumerate(tokens) if n not in consumed
+    )
+    if standalone:
+        references = [reference for reference, _ in found]
+        references.extend(QuranReference(surah, 1, SURAHS[surah - 1][2]) for surah in whole_surahs)
+    else:
+        references = [reference for reference, explicit in found if explicit]
+    return ParsedReferences(list(dict.fromkeys(references)), standalone and bool(references))
+
+class ReferenceResolver:
+    """
+    Loads the passages named by parsed references straight from the
+    (surah_number, ayah_number) and (book_name, hadith_number) indexes,
+    skipping embedding and similarity search entirely.
+    """
+
+    def __init__(self, max_verses: int = 40, refresh_interval: float = 30.0):
+        self.max_verses = max_verses
+        self.refresh_interval = refresh_interval
+        self._book_names = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def book_names(self, db: Session):
+        """Collection key -> the book_name values stored for it (e.g. "bukhari" -> ["Sahih Bukhari"])."""
+        with self._lock:
+            if self._book_names is None or time.monotonic() - self._checked_at >= self.refresh_interval:
+                names = {}
+                for (book_name,) in db.query(models.Hadith.book_name).distinct():
+                    if not book_name:
+                        continue
+                    key = _COLLECTIONS.get(collection_key(book_name))
+                    if key is None:
+                        # Stored names often carry a prefix, e.g. "Sahih Bukhari", "Sunan Abu Dawud".
+                        key = next((k for alias, k in _COLLECTIONS.items() if collection_key(book_name).endswith(alias)), None)
+                    if key:
+                        names.setdefault(key, []).append(book_name)
+                self._book_names = names
+                self._checked_at = time.monotonic()
+            return self._book_names
+
+    def resolve(self, db: Session, references):
+        """Returns (verses, hadiths) in reference order, at most `max_verses` verses in total."""
+        verses, hadiths = [], []
+        budget = self.max_verses
+        for ref in references:
+            if isinstance(ref, QuranReference):
+                if budget <= 0:
+                    continue
+                rows = (
+                    db.query(models.QuranVerse)
+                    .filter(models.QuranVerse.surah_number == ref.surah, models.QuranVerse.ayah_number.between(ref.start, ref.end))
+                    .order_by(models.QuranVerse.ayah_number)
+                    .limit(budget)
+                    .all()
+                )
+                verses.extend(rows)
+                budget -= len(rows)
+            else:
+                names = self.book_names(db).get(ref.collection)
+                if names:
+                    hadiths.extend(
+                        db.query(models.Hadith)
+                        .filter(models.Hadith.book_name.in_(names), models.Hadith.hadith_number == ref.number)
+                        .all()
+                    )
+        return verses, hadiths
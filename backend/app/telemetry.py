@@ -0,0 +1,197 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from starlette.datastructures import MutableHeaders
+
+# Seconds; spans a cached embedding lookup (~ms) up to a slow Groq completion.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # An unlabelled counter is exported as 0 before its first increment.
+        self._values = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [per-bucket counts (last is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][slot] += 1
+            series[1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = sorted((key, list(counts), total) for key, (counts, total) in self._series.items())
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+class Registry:
+    """Metrics rendered in the Prometheus text exposition format for GET /metrics."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    "ilmai_http_request_duration_seconds", "Time from request to the end of the response body.", ("method", "route", "status"),
+)
+STAGE_SECONDS = registry.histogram(
+    "ilmai_stage_duration_seconds", "Time spent in each stage of answering a query.", ("stage",),
+)
+WEB_SEARCHES = registry.counter(
+    "ilmai_web_search_total", "Web searches by outcome (fallback, speculative_used, speculative_wasted, timed_out).", ("outcome",),
+)
+LLM_REQUESTS = registry.counter(
+    "ilmai_llm_requests_total", "Groq calls by model and outcome (success, rate_limited, error).", ("model", "outcome"),
+)
+LLM_FALLBACKS = registry.counter(
+    "ilmai_llm_fallbacks_total", "Times a query moved past a model to the next one in the fallback order.", ("model",),
+)
+LLM_UNAVAILABLE = registry.counter(
+    "ilmai_llm_unavailable_total", "Queries answered with an error because every model was rate limited or failed.",
+)
+LLM_TOKENS = registry.counter(
+    "ilmai_llm_tokens_total", "Tokens Groq reported, by model and direction (in = prompt, out = completion).", ("model", "direction"),
+)
+USAGE_LIMIT_REJECTIONS = registry.counter(
+    "ilmai_usage_limit_rejections_total", "Queries refused because the user reached their daily limit.",
+)
+
+# The current request's (stage, seconds) list. Threadpool calls and gathered tasks run in a copy
+# of the request's context, so they append to the same list.
+_request_timings: ContextVar = ContextVar("request_timings", default=None)
+
+def record_stage(name: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+@contextmanager
+def stage(name: str):
+    """Times the block into the stage histogram and the current request's Server-Timing header."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+def server_timing(timings, total: float) -> str:
+    """
+    Server-Timing header value. A stage that ran more than once (e.g. retrieval
+    for each corpus, in parallel) is reported once with its summed duration.
+    """
+    merged = {}
+    for name, seconds in timings:
+        duration, calls = merged.get(name, (0.0, 0))
+        merged[name] = (duration + seconds, calls + 1)
+    parts = [
+        f'{name};dur={duration * 1000:.1f}' + (f';desc="{calls} calls"' if calls > 1 else "")
+        for name, (duration, calls) in merged.items()
+    ]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+class TimingMiddleware:
+    """
+    Collects stage timings per request, adds them as a Server-Timing header
+    (stages finished before the response starts; for a stream, the retrieval
+    before its first frame) and records each request's duration by route.
+    """
+
+    def __init__(self, app, server_timing_header: bool = True):
+        self.app = app
+        self.server_timing_header = server_timing_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = []
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing_header:
+                    MutableHeaders(scope=message).append("Server-Timing", server_timing(timings, time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"], route=getattr(route, "path", "unmatched"), status=status,
+            )
@@ -1,17 +1,66 @@
-from tavily import TavilyClient
 import os
+import re
+import threading
 from dotenv import load_dotenv
+from .. import config
+from ..telemetry import stage, WEB_SEARCHES
 
 load_dotenv()
 
+# Topics the Quran/Hadith corpus cannot answer on its own: contemporary matters,
+# named scholars and bodies, dates and "latest" style questions.
+CONTEMPORARY_MARKERS = re.compile(
+    r"\b(today|current|currently|latest|recent|news|modern|nowadays|this year|(19|20)\d\d|"
+    r"crypto\w*|bitcoin|stocks?|shares|mortgage|insurance|interest rate|bank(ing)?|loan|"
+    r"vaccines?|covid|organ donation|ivf|surrogacy|online|internet|social media|app|"
+    r"fatwa|council|dar al[- ]ifta|al[- ]azhar|islamqa|scholars? say|who is|when is|where is)\b",
+    re.IGNORECASE,
+)
+
 class SearchTool:
     def __init__(self):
         self.api_key = os.getenv("TAVILY_API_KEY")
         if not self.api_key:
             print("Warning: TAVILY_API_KEY not found in environment.")
-        self.client = TavilyClient(api_key=self.api_key) if self.api_key else None
+        self._client = None
+        self.outcomes = {"speculative_used": 0, "speculative_wasted": 0, "fallback": 0, "timed_out": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """The Tavily client, created on first use; None without an API key."""
+        if self._client is None and self.api_key:
+            with self._lock:
+                if self._client is None:
+                    from tavily import TavilyClient
+                    self._client = TavilyClient(api_key=self.api_key, api_base_url=config.settings.TAVILY_API_BASE_URL or None)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def should_prefetch(self, query: str, local_search_available: bool = True) -> bool:
+        """
+        Cheap guess, made before retrieval, that local sources will come up short.
+        Without any local search (no query embeddings and no keyword index), always prefetch.
+        """
+        if not self.client:
+            return False
+        if not local_search_available:
+            return True
+        return bool(CONTEMPORARY_MARKERS.search(query))
+
+    def record(self, outcome: str):
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        WEB_SEARCHES.inc(outcome=outcome)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.outcomes)
 
-    def search(self, query: str, search_depth: str = "advanced", max_results: int = 5):
+    def search(self, query: str, search_depth: str = "advanced", max_results: int = 5, timeout: float = 60):
         """
         Performs a web search using Tavily.
         """
@@ -20,7 +69,8 @@ class SearchTool:
         
         try:
             # Filter for Islamic/Religious content if needed, but Tavily is generally good with query intent
-            response = self.client.search(query=query, search_depth=search_depth, max_results=max_results)
+            with stage("web_search"):
+                response = self.client.search(query=query, search_depth=search_depth, max_results=max_results, timeout=timeout)
             return response.get('results', [])
         except Exception as e:
             print(f"Tavily search error: {e}")
@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """
+    The profile fields of a User that handlers read on every request. Usage
+    counters are deliberately left out: they change on every query, so they
+    are always read from the database.
+    """
+    id: int
+    email: str
+    full_name: str
+    preferred_madhhab: str
+    ui_language: str
+    is_active: bool
+    tier: str
+    usage_limit: int
+
+    @classmethod
+    def from_user(cls, user) -> "UserSnapshot":
+        return cls(
+            id=user.id,
+            email=user.email,
+            full_name=user.full_name,
+            preferred_madhhab=user.preferred_madhhab,
+            ui_language=user.ui_language,
+            is_active=user.is_active,
+            tier=user.tier,
+            usage_limit=user.usage_limit,
+        )
+
+class UserCache:
+    """
+    Bounded LRU of user id -> UserSnapshot, with entries expiring after `ttl`
+    seconds. Writes to a user go through `invalidate`; other worker processes
+    keep their copy until it expires, so `ttl` bounds how stale a profile can be.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user id -> (snapshot, expires_at)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, snapshot: UserSnapshot):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[snapshot.id] = (snapshot, time.monotonic() + self.ttl)
+            self._entries.move_to_end(snapshot.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
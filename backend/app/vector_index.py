@@ -0,0 +1,333 @@
+import logging
+import re
+import threading
+import time
+import numpy as np
+from sqlalchemy import func, literal, select, text, union_all
+from sqlalchemy.orm import Session
+from .embedding_store import MappedEmbeddingStore
+from .models import MADHAHIB, CorpusVersion
+
+logger = logging.getLogger(__name__)
+
+def table_signature(db: Session, model):
+    """(row count, max id, corpus version) of a corpus table; any write through mark_corpus_changed changes it."""
+    version = select(CorpusVersion.version).where(CorpusVersion.table_name == model.__tablename__).scalar_subquery()
+    count, max_id, version = db.query(func.count(model.id), func.max(model.id), func.coalesce(version, 0)).one()
+    return (count, max_id, version)
+
+def mark_corpus_changed(db: Session, model):
+    """
+    Bumps `model`'s corpus version in the caller's transaction. Ingest and
+    re-embedding scripts call this with their writes, so every worker's indexes,
+    embedding stores and answer cache pick the change up on their next check.
+    """
+    table = CorpusVersion.__table__
+    bumped = db.execute(
+        table.update().where(table.c.table_name == model.__tablename__).values(version=table.c.version + 1)
+    ).rowcount
+    if not bumped:
+        db.execute(table.insert().values(table_name=model.__tablename__, version=1))
+
+def fetch_rows(db: Session, model, scored):
+    """Loads the rows for (id, score) pairs, preserving score order."""
+    if not scored:
+        return []
+    rows = db.query(model).filter(model.id.in_([row_id for row_id, _ in scored])).all()
+    by_id = {row.id: row for row in rows}
+    return [by_id[row_id] for row_id, _ in scored if row_id in by_id]
+
+class Partitions:
+    """
+    Inverted lists from metadata values (madhhab, grade, book_name, ...) to row
+    positions in an index, so a filtered search scans only the matching rows
+    instead of filtering after a full scan.
+    """
+
+    def __init__(self, columns, rows):
+        """`rows` holds one tuple of column values per index position."""
+        self.columns = tuple(columns)
+        self.lists = {column: {} for column in self.columns}
+        for position, values in enumerate(rows):
+            for column, value in zip(self.columns, values):
+                self.lists[column].setdefault(value, []).append(position)
+        self.lists = {
+            column: {value: np.array(positions, dtype=np.int64) for value, positions in lists.items()}
+            for column, lists in self.lists.items()
+        }
+
+    def positions(self, filters):
+        """
+        Sorted positions of rows matching every filter ({column: value or list of
+        values}), or None when there is nothing to filter on.
+        """
+        filters = {column: value for column, value in (filters or {}).items() if value is not None}
+        if not filters:
+            return None
+        matched = None
+        for column, wanted in filters.items():
+            if column not in self.lists:
+                raise ValueError(f"Index is not partitioned on {column!r}")
+            values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            lists = [self.lists[column][v] for v in values if v in self.lists[column]]
+            rows = np.unique(np.concatenate(lists)) if lists else np.empty(0, dtype=np.int64)
+            matched = rows if matched is None else np.intersect1d(matched, rows, assume_unique=True)
+        return matched
+
+    def stats(self) -> dict:
+        return {column: {str(value): len(rows) for value, rows in lists.items()} for column, lists in self.lists.items()}
+
+def load_partitions(db: Session, model, columns, ids):
+    """Builds Partitions over `columns` aligned with the index's `ids` array."""
+    if not columns:
+        return None
+    values = {row[0]: tuple(row[1:]) for row in db.query(model.id, *[getattr(model, c) for c in columns])}
+    empty = (None,) * len(columns)
+    return Partitions(columns, [values.get(int(row_id), empty) for row_id in ids])
+
+class VectorIndex:
+    """
+    Process-resident embedding index for one corpus table.
+
+    Embeddings are held as a contiguous, L2-normalized float32 matrix with the
+    row ids alongside it, so a search is one matrix-vector product plus a
+    partial sort. The index reloads itself when the table's signature (row
+    count, max id and corpus version) changes.
+
+    With `store_dir` set, the matrix is instead a memory-mapped, int8-quantized
+    MappedEmbeddingStore shared by all workers, rebuilt only when the table
+    signature no longer matches the one on disk.
+
+    Columns in `partition_by` can be used as search filters; only the rows
+    in the matching partitions are scored.
+    """
+
+    def __init__(self, model, refresh_interval: float = 30.0, store_dir: str = "", partition_by=()):
+        self.model = model
+        self.refresh_interval = refresh_interval
+        self.store_dir = store_dir
+        self.partition_by = tuple(partition_by)
+        self.partitions = None
+        self.store = None
+        self.ids = np.empty(0, dtype=np.int64)
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    def _table_signature(self, db: Session):
+        return table_signature(db, self.model)
+
+    def invalidate(self):
+        self._signature = None
+        self._checked_at = 0.0
+
+    def refresh(self, db: Session, force: bool = False):
+        now = time.monotonic()
+        if not force and self._signature is not None and now - self._checked_at < self.refresh_interval:
+            return
+
+        with self._lock:
+            if not force and self._signature is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+                return
+            signature = self._table_signature(db)
+            self._checked_at = time.monotonic()
+            if not force and signature == self._signature:
+                return
+            store, matrix = None, self.matrix
+            if self.store_dir:
+                store = MappedEmbeddingStore.open_or_build(db, self.model, self.store_dir, signature)
+                ids = store.ids
+            else:
+                ids, matrix = self._load(db)
+            # Partitions are built before the swap so searches never see them out of step with ids.
+            partitions = load_partitions(db, self.model, self.partition_by, ids)
+            self.store, self.ids, self.matrix, self.partitions = store, ids, matrix, partitions
+            self._signature = signature
+
+    def _load(self, db: Session):
+        start = time.perf_counter()
+        # Only the two columns we need; no ORM objects are hydrated.
+        rows = db.query(self.model.id, self.model.embedding).filter(self.model.embedding.isnot(None)).all()
+
+        dims = {}
+        for _, emb in rows:
+            if emb is not None and len(emb):
+                dims[len(emb)] = dims.get(len(emb), 0) + 1
+        if not dims:
+            return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+
+        # Mixed-model ingests can leave vectors of different sizes; keep the majority.
+        dim = max(dims, key=dims.get)
+        kept = [(row_id, emb) for row_id, emb in rows if emb is not None and len(emb) == dim]
+        if len(kept) < len(rows):
+            logger.warning(f"{self.model.__tablename__}: skipped {len(rows) - len(kept)} rows without a {dim}-d embedding")
+
+        ids = np.fromiter((row_id for row_id, _ in kept), dtype=np.int64, count=len(kept))
+        matrix = np.asarray([emb for _, emb in kept], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+
+        logger.info(f"Loaded {len(ids)} {dim}-d vectors for {self.model.__tablename__} in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return ids, np.ascontiguousarray(matrix)
+
+    def search(self, query_vector, top_k: int = 3, threshold: float = 0.3, filters=None):
+        """Returns a list of (id, score) pairs, best first."""
+        store, ids, matrix, partitions = self.store, self.ids, self.matrix, self.partitions
+        if query_vector is None or len(ids) == 0 or top_k <= 0:
+            return []
+        if filters and partitions is None:
+            raise ValueError(f"{self.model.__tablename__} index has no partitions")
+        rows = partitions.positions(filters) if filters else None
+        if rows is not None and len(rows) == 0:
+            return []
+
+        q = np.asarray(query_vector, dtype=np.float32)
+        dim = store.dim if store is not None else matrix.shape[1]
+        if q.shape[0] != dim:
+            logger.warning(f"{self.model.__tablename__}: query has {q.shape[0]} dims, index has {dim}")
+            return []
+        norm = np.linalg.norm(q)
+        if norm == 0:
+            return []
+        if store is not None:
+            return store.search(q / norm, top_k=top_k, threshold=threshold, rows=rows)
+
+        if rows is None:
+            scores, row_ids = matrix @ (q / norm), ids
+        else:
+            scores, row_ids = matrix[rows] @ (q / norm), ids[rows]
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row_ids[i]), float(scores[i])) for i in top if scores[i] >= threshold]
+
+    def search_ids(self, db: Session, query_vector, top_k: int = 3, threshold: float = 0.3, filters=None):
+        self.refresh(db)
+        return self.search(query_vector, top_k=top_k, threshold=threshold, filters=filters)
+
+    def search_groups(self, db: Session, query_vector, column: str, values, top_k: int = 3, threshold: float = 0.3):
+        """Top-k (id, score) pairs per value of a partition column; each partition is scanned once."""
+        self.refresh(db)
+        return {value: self.search(query_vector, top_k=top_k, threshold=threshold, filters={column: value}) for value in values}
+
+    def retrieve(self, db: Session, query_vector, top_k: int = 3, threshold: float = 0.3, filters=None):
+        return fetch_rows(db, self.model, self.search_ids(db, query_vector, top_k=top_k, threshold=threshold, filters=filters))
+
+class PgVectorIndex:
+    """
+    Server-side ANN search for PostgreSQL: similarity is computed by pgvector
+    (`ORDER BY embedding <=> :q LIMIT k`) so the corpus never leaves the database.
+    """
+
+    def __init__(self, model, index_type: str = "hnsw", ef_search: int = 40, probes: int = 10):
+        self.model = model
+        self.index_type = index_type
+        self.ef_search = ef_search
+        self.probes = probes
+
+    def refresh(self, db: Session, force: bool = False):
+        pass
+
+    def invalidate(self):
+        pass
+
+    def _tune(self, db: Session):
+        # SET LOCAL only lasts for the current transaction, so pooled connections stay clean.
+        if self.index_type == "hnsw":
+            db.execute(text(f"SET LOCAL hnsw.ef_search = {int(self.ef_search)}"))
+        elif self.index_type == "ivfflat":
+            db.execute(text(f"SET LOCAL ivfflat.probes = {int(self.probes)}"))
+
+    def _filtered(self, query, filters):
+        for column, wanted in (filters or {}).items():
+            if wanted is None:
+                continue
+            values = list(wanted) if isinstance(wanted, (list, tuple, set)) else [wanted]
+            query = query.filter(getattr(self.model, column).in_(values))
+        return query
+
+    def search_ids(self, db: Session, query_vector, top_k: int = 3, threshold: float = 0.3, filters=None):
+        """Returns a list of (id, score) pairs, best first."""
+        if query_vector is None or top_k <= 0:
+            return []
+        self._tune(db)
+        distance = self.model.embedding.cosine_distance(list(query_vector)).label("distance")
+        query = db.query(self.model.id, distance).filter(self.model.embedding.isnot(None))
+        rows = self._filtered(query, filters).order_by(distance).limit(top_k).all()
+        return [(row_id, 1.0 - dist) for row_id, dist in rows if 1.0 - dist >= threshold]
+
+    def search_groups(self, db: Session, query_vector, column: str, values, top_k: int = 3, threshold: float = 0.3):
+        """
+        Top-k (id, score) pairs per value of `column` in one round trip: a UNION ALL
+        of per-value LIMIT queries, each able to use that value's partial ANN index.
+        """
+        values = list(values)
+        if query_vector is None or top_k <= 0 or not values:
+            return {value: [] for value in values}
+        self._tune(db)
+        distance = self.model.embedding.cosine_distance(list(query_vector)).label("distance")
+        parts = [
+            select(
+                select(self.model.id, literal(position).label("grp"), distance)
+                .where(self.model.embedding.isnot(None), getattr(self.model, column) == value)
+                .order_by(distance)
+                .limit(top_k)
+                .subquery()
+            )
+            for position, value in enumerate(values)
+        ]
+        groups = {value: [] for value in values}
+        for row_id, position, dist in db.execute(union_all(*parts)):
+            if 1.0 - dist >= threshold:
+                groups[values[position]].append((row_id, 1.0 - dist))
+        for ranked in groups.values():
+            ranked.sort(key=lambda item: item[1], reverse=True)
+        return groups
+
+    def retrieve(self, db: Session, query_vector, top_k: int = 3, threshold: float = 0.3, filters=None):
+        return fetch_rows(db, self.model, self.search_ids(db, query_vector, top_k=top_k, threshold=threshold, filters=filters))
+
+ANN_TABLES = ("quran_verses", "hadiths", "fiqh_sources")
+# table -> (column, values): extra partial ANN indexes, one per value, so a
+# filtered search walks a graph holding only that partition's rows.
+ANN_PARTITIONS = {"fiqh_sources": ("madhhab", MADHAHIB)}
+
+def ensure_ann_indexes(engine, index_type: str = "hnsw", m: int = 16, ef_construction: int = 64, lists: int = 100, rebuild: bool = False):
+    """Creates (or with `rebuild`, recreates) the pgvector ANN index on each corpus table."""
+    if engine.dialect.name != "postgresql" or index_type not in ("hnsw", "ivfflat"):
+        return
+
+    with engine.connect() as conn:
+        for table in ANN_TABLES:
+            name = f"ix_{table}_embedding_{index_type}"
+            if rebuild:
+                conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            if index_type == "hnsw":
+                options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+            else:
+                options = f"lists = {int(lists)}"
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {name} ON {table} "
+                f"USING {index_type} (embedding vector_cosine_ops) WITH ({options})"
+            ))
+            logger.info(f"Ensured {index_type} index {name}")
+
+            column, values = ANN_PARTITIONS.get(table, (None, ()))
+            for value in values:
+                partial = f"{name}_{re.sub(r'[^a-z0-9]', '', value.lower())}"
+                if rebuild:
+                    conn.execute(text(f"DROP INDEX IF EXISTS {partial}"))
+                literal_value = value.replace("'", "''")
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {partial} ON {table} "
+                    f"USING {index_type} (embedding vector_cosine_ops) WITH ({options}) "
+                    f"WHERE {column} = '{literal_value}'"
+                ))
+                logger.info(f"Ensured partial {index_type} index {partial}")
+        conn.commit()
@@ -0,0 +1,412 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+
+# Add the parent directory to sys.path to find the app module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "benchmark_baseline.json")
+
+# Corpus sizes at --scale 1: the whole Quran, Sahih al-Bukhari, and a fiqh table across the four madhhabs.
+HADITH_COUNT = 7563
+FIQH_COUNT = 2000
+HISTORY_TURNS = 2000
+DIM = 384
+
+ARABIC_LETTERS = "ابتثجحخدذرزسشصضطظعغفقكلمنهوي"
+TOPIC_WORDS = (
+    "prayer fasting charity zakat pilgrimage hajj ramadan ablution wudu mosque intention faith mercy "
+    "forgiveness repentance patience gratitude parents orphans marriage divorce inheritance trade usury "
+    "knowledge prophet companions angels paradise hellfire judgment night dawn sunset travel sick"
+).split()
+
+def synthetic_vocabulary(rng, size: int = 4000):
+    syllables = ["ka", "ta", "ri", "mo", "lu", "sen", "dar", "qi", "ha", "no", "ven", "ist", "ul", "ber", "sha"]
+    words = {"".join(rng.choice(syllables, size=rng.integers(2, 5))) for _ in range(size * 2)}
+    return TOPIC_WORDS + sorted(words)[:size]
+
+class TextGenerator:
+    """Zipf-distributed words, so BM25 sees realistic posting-list lengths."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.vocabulary = np.array(synthetic_vocabulary(rng))
+        weights = 1.0 / np.arange(1, len(self.vocabulary) + 1)
+        self.weights = weights / weights.sum()
+
+    def sentence(self, words: int) -> str:
+        chosen = self.rng.choice(self.vocabulary, size=words, p=self.weights)
+        return " ".join(chosen).capitalize() + "."
+
+    def paragraph(self, words: int) -> str:
+        sentences, left = [], words
+        while left > 0:
+            length = min(left, int(self.rng.integers(8, 25)))
+            sentences.append(self.sentence(length))
+            left -= length
+        return " ".join(sentences)
+
+    def arabic(self, words: int) -> str:
+        return " ".join("".join(self.rng.choice(list(ARABIC_LETTERS), size=self.rng.integers(2, 7))) for _ in range(words))
+
+    def query(self) -> str:
+        return " ".join(self.rng.choice(TOPIC_WORDS, size=self.rng.integers(2, 5), replace=False))
+
+def unit_vectors(rng, count: int):
+    vectors = rng.standard_normal((count, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def populate(engine, scale: int, rng):
+    """Bulk-loads the synthetic corpora and a user's chat history; returns the corpus vectors for making queries."""
+    from sqlalchemy import insert
+    from app import models
+    from app.references import SURAHS
+
+    text = TextGenerator(rng)
+    vectors = {}
+
+    verses = [(surah, ayah) for _ in range(scale) for surah, (_, _, count) in enumerate(SURAHS, 1) for ayah in range(1, count + 1)]
+    vectors[models.QuranVerse] = unit_vectors(rng, len(verses))
+    quran_rows = [{
+        "surah_number": surah, "ayah_number": ayah,
+        "arabic_text": text.arabic(int(rng.integers(5, 40))),
+        "english_text": text.paragraph(int(rng.integers(10, 60))),
+        "embedding": vectors[models.QuranVerse][i].tolist(),
+    } for i, (surah, ayah) in enumerate(verses)]
+
+    hadith_count = HADITH_COUNT * scale
+    vectors[models.Hadith] = unit_vectors(rng, hadith_count)
+    # Most narrations are a few sentences; a long tail runs to thousands of characters.
+    hadith_lengths = np.minimum(rng.lognormal(4.3, 0.8, hadith_count).astype(int) + 15, 1500)
+    hadith_rows = [{
+        "book_name": "Sahih al-Bukhari", "book_number": int(i * 97 // hadith_count) + 1, "hadith_number": i % HADITH_COUNT + 1,
+        "arabic_text": text.arabic(int(hadith_lengths[i] * 0.8)),
+        "english_text": text.paragraph(int(hadith_lengths[i])),
+        "grade": "Sahih",
+        "embedding": vectors[models.Hadith][i].tolist(),
+    } for i in range(hadith_count)]
+
+    fiqh_count = FIQH_COUNT * scale
+    vectors[models.FiqhSource] = unit_vectors(rng, fiqh_count)
+    fiqh_rows = [{
+        "madhhab": models.MADHAHIB[i % len(models.MADHAHIB)],
+        "ruling_title": text.sentence(int(rng.integers(3, 8))),
+        "source_book": "Synthetic Compendium", "reference_page": str(i),
+        "translation": text.paragraph(int(rng.integers(40, 200))),
+        "embedding": vectors[models.FiqhSource][i].tolist(),
+    } for i in range(fiqh_count)]
+
+    history_rows = [{
+        "user_id": 1, "session_id": 1 + i // 50, "query": text.query(),
+        "response": text.paragraph(int(rng.integers(80, 400))), "language": "en",
+        "timestamp": datetime(2024, 1, 1) + (datetime(2024, 6, 1) - datetime(2024, 1, 1)) * (i / HISTORY_TURNS),
+    } for i in range(HISTORY_TURNS)]
+
+    with engine.begin() as conn:
+        for model, rows in ((models.QuranVerse, quran_rows), (models.Hadith, hadith_rows), (models.FiqhSource, fiqh_rows), (models.ChatHistory, history_rows)):
+            for start in range(0, len(rows), 5000):
+                conn.execute(insert(model), rows[start:start + 5000])
+    return vectors, text
+
+def queries_near(rng, corpus, count: int, noise: float = 0.6):
+    """Query vectors close to random corpus rows, so searches clear the similarity threshold as real ones do."""
+    picks = corpus[rng.integers(0, len(corpus), count)]
+    queries = picks + noise * unit_vectors(rng, count) / np.sqrt(2)
+    return [q / np.linalg.norm(q) for q in queries]
+
+def summarize(times) -> dict:
+    times = sorted(times)
+    return {
+        "runs": len(times),
+        "median_ms": round(times[len(times) // 2] * 1000, 4),
+        "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))] * 1000, 4),
+        "min_ms": round(times[0] * 1000, 4),
+    }
+
+def measure(fn, repeats: int, warmup: int = 1, time_budget: float = 10.0) -> dict:
+    """Runs `fn` `warmup` times untimed, then up to `repeats` timed runs (at least 3, within `time_budget` seconds)."""
+    for _ in range(warmup):
+        fn()
+    times, started = [], time.perf_counter()
+    for _ in range(repeats):
+        run_started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - run_started)
+        if len(times) >= 3 and time.perf_counter() - started > time_budget:
+            break
+    return summarize(times)
+
+class StubGroq:
+    """Stands in for the Groq client: answers instantly with a fixed completion."""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(with_raw_response=self))
+
+    def create(self, messages, model, temperature, stream=False, **kwargs):
+        if stream:
+            completion = iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="Stub answer."))])])
+        else:
+            usage = SimpleNamespace(prompt_tokens=len(messages[0]["content"]) // 4, completion_tokens=3, total_tokens=len(messages[0]["content"]) // 4 + 3)
+            completion = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Stub answer."))], usage=usage, model=model)
+        return SimpleNamespace(headers={}, parse=lambda: completion)
+
+class StubTavily:
+    """Stands in for TavilyClient: five results of a few thousand characters, like an advanced search."""
+
+    def __init__(self, text):
+        self.results = [{"url": f"https://example.org/{i}", "content": text.paragraph(450), "score": 0.9 - i / 10} for i in range(5)]
+
+    def search(self, query, **kwargs):
+        return {"results": self.results}
+
+def install_stubs(text, query_vectors):
+    """Gemini query embeddings, Groq completions and Tavily results are answered in-process."""
+    from app.rag import rag_engine
+    from app.llm import llm_provider
+    from app.tools.tavily_search import search_tool
+
+    vectors = {}
+    fallback = itertools.cycle(query_vectors)
+
+    def embed_batch(texts, task_type="retrieval_document"):
+        return [vectors.setdefault(t, next(fallback).tolist()) for t in texts]
+
+    rag_engine.api_available = True
+    rag_engine.embed_batch = embed_batch
+    llm_provider.client = StubGroq()
+    search_tool.client = StubTavily(text)
+
+def run_benchmarks(scale: int, repeats: int, only: str, seed: int) -> dict:
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}"
+    os.environ.setdefault("GROQ_API_KEY", "unused")
+    os.environ.pop("GEMINI_API_KEY", None)
+    os.environ.pop("GOOGLE_API_KEY", None)
+    os.environ["EMBEDDING_STORE_DIR"] = ""
+    logging.disable(logging.WARNING)
+
+    from app import models
+    from app.database import engine, SessionLocal
+    from app.migrations import upgrade
+    from app.vector_index import VectorIndex, fetch_rows
+    from app.embedding_store import MappedEmbeddingStore
+    from app.lexical_index import LexicalIndex
+    from app.context_builder import ContextBuilder, Passage, count_tokens_any
+    from app.llm import MODELS_TO_TRY
+    from app.pagination import keyset_query
+    from app.rag import rag_engine, PARTITION_COLUMNS
+
+    rng = np.random.default_rng(seed)
+    upgrade(engine)
+    started = time.perf_counter()
+    vectors, text = populate(engine, scale, rng)
+    populate_seconds = time.perf_counter() - started
+    query_vectors = {model: queries_near(rng, corpus, 64) for model, corpus in vectors.items()}
+    query_texts = [text.query() for _ in range(64)]
+    install_stubs(text, query_vectors[models.Hadith])
+
+    results = {}
+    selected = re.compile(only) if only else None
+
+    def case(name, fn, repeats_for_case=repeats, warmup=1):
+        if selected and not selected.search(name):
+            return
+        results[name] = measure(fn, repeats_for_case, warmup)
+        print(f"  {name:<44} median {results[name]['median_ms']:>10.3f} ms   p95 {results[name]['p95_ms']:>10.3f} ms   ({results[name]['runs']} runs)")
+
+    db = SessionLocal()
+    try:
+        corpora = {"quran": models.QuranVerse, "hadith": models.Hadith, "fiqh": models.FiqhSource}
+        build_repeats = max(3, repeats // 20)
+
+        # Index builds
+        for name, model in corpora.items():
+            case(f"vector_index.build[{name}]", lambda model=model: VectorIndex(model, partition_by=PARTITION_COLUMNS.get(model, ())).refresh(db, force=True), build_repeats)
+            case(f"lexical_index.build[{name}]", lambda model=model: LexicalIndex(model, partition_by=PARTITION_COLUMNS.get(model, ())).refresh(db, force=True), build_repeats)
+        store_root = tempfile.mkdtemp()
+        store_build = itertools.count()
+        case("embedding_store.build[hadith]", lambda: MappedEmbeddingStore.open_or_build(db, models.Hadith, store_root, ("bench", next(store_build))), build_repeats)
+
+        # Top-k search over resident indexes
+        indexes, lexical = {}, {}
+        for name, model in corpora.items():
+            indexes[name] = VectorIndex(model, partition_by=PARTITION_COLUMNS.get(model, ()))
+            indexes[name].refresh(db, force=True)
+            lexical[name] = LexicalIndex(model, partition_by=PARTITION_COLUMNS.get(model, ()))
+            lexical[name].refresh(db, force=True)
+            vector_queries = itertools.cycle(query_vectors[model])
+            text_queries = itertools.cycle(query_texts)
+            case(f"vector_index.search[{name}]", lambda name=name, q=vector_queries: indexes[name].search(next(q), top_k=9))
+            case(f"lexical_index.search[{name}]", lambda name=name, q=text_queries: lexical[name].search(next(q), top_k=9))
+        fiqh_queries = itertools.cycle(query_vectors[models.FiqhSource])
+        case("vector_index.search_filtered[fiqh madhhab]", lambda: indexes["fiqh"].search(next(fiqh_queries), top_k=9, filters={"madhhab": "Hanafi"}))
+        case("vector_index.search_groups[fiqh madhhab]", lambda: indexes["fiqh"].search_groups(db, next(fiqh_queries), "madhhab", models.MADHAHIB, top_k=6))
+        store = MappedEmbeddingStore.open_or_build(db, models.Hadith, store_root, ("bench", "search"))
+        hadith_queries = itertools.cycle(query_vectors[models.Hadith])
+        case("embedding_store.search[hadith]", lambda: store.search(np.asarray(next(hadith_queries)), top_k=9, threshold=0.3))
+
+        # The original per-row cosine loop, over the rows the old code loaded per query.
+        verse_rows = db.query(models.QuranVerse).limit(6236).all()
+        verse_queries = itertools.cycle(query_vectors[models.QuranVerse])
+        case("rag.search_semantic[quran, per-row cosine]", lambda: rag_engine.search_semantic(next(verse_queries).tolist(), verse_rows, top_k=3), max(3, repeats // 10))
+        db.expunge_all()
+
+        # DB retrieval: hybrid search plus loading the winning rows from SQLite
+        for name, model in corpora.items():
+            rag_engine.indexes[model] = indexes[name]
+            rag_engine.lexical_indexes[model] = lexical[name]
+        ranked = [(int(i), 1.0) for i in rng.choice(indexes["hadith"].ids, 3, replace=False)]
+        case("db.fetch_rows[hadith, 3 rows]", lambda: (fetch_rows(db, models.Hadith, ranked), db.expunge_all()))
+        retrieve_queries = itertools.cycle(zip(query_vectors[models.Hadith], query_texts))
+
+        def retrieve():
+            vector, query = next(retrieve_queries)
+            rag_engine.retrieve(db, models.Hadith, vector.tolist(), top_k=3, query_text=query)
+            db.expunge_all()
+        case("rag.retrieve[hadith, hybrid + rows]", retrieve)
+        history = db.query(models.ChatHistory.id, models.ChatHistory.query, models.ChatHistory.response, models.ChatHistory.timestamp).filter(
+            models.ChatHistory.user_id == 1, models.ChatHistory.session_id == 3
+        )
+        case("db.history_page[50 turns]", lambda: keyset_query(history, models.ChatHistory.timestamp, models.ChatHistory.id, None, 100, descending=False).all())
+
+        # Prompt assembly from typical retrieval output, with and without web results
+        rows = fetch_rows(db, models.Hadith, [(int(i), 1.0) for i in rng.choice(indexes["hadith"].ids, 3, replace=False)])
+        verses = fetch_rows(db, models.QuranVerse, [(int(i), 1.0) for i in rng.choice(indexes["quran"].ids, 3, replace=False)])
+        local = [Passage("quran", f"Quran {v.surah_number}:{v.ayah_number} - ", v.english_text, rank=r) for r, v in enumerate(verses)]
+        local += [Passage("hadith", f"Hadith ({h.book_name}) #{h.hadith_number} - ", h.english_text, rank=r) for r, h in enumerate(rows)]
+        web = [Passage("web", f"Source: {res['url']}\nContent: ", res["content"], rank=r) for r, res in enumerate(StubTavily(text).results)]
+        builder = ContextBuilder()
+
+        def assemble(passages):
+            instructions = rag_engine.construct_system_prompt("", "")
+            built = builder.build("reward of fasting in ramadan", passages, MODELS_TO_TRY, count_tokens_any(instructions, MODELS_TO_TRY))
+            return rag_engine.construct_system_prompt(built.context, built.web_context)
+        case("prompt.assemble[local]", lambda: assemble(local))
+        case("prompt.assemble[local + web]", lambda: assemble(local + web))
+    finally:
+        db.close()
+
+    if not selected or selected.search("pipeline"):
+        results.update(pipeline_benchmarks(repeats, query_texts))
+    return {
+        "meta": {
+            "scale": scale,
+            "seed": seed,
+            "corpus": {name: int(len(vectors[model])) for name, model in (("quran", models.QuranVerse), ("hadith", models.Hadith), ("fiqh", models.FiqhSource))},
+            "populate_seconds": round(populate_seconds, 2),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "recorded_at": datetime.utcnow().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+
+def pipeline_benchmarks(repeats: int, query_texts) -> dict:
+    """Whole /query requests in-process (auth, metering, retrieval, prompt, stub generation, history queue)."""
+    import httpx
+    from app import models
+    from app.database import SessionLocal
+    from app.main import app
+
+    async def run():
+        results = {}
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+                await client.post("/signup", json={"email": "bench@example.com", "password": "bench-password"})
+                db = SessionLocal()
+                db.query(models.User).update({models.User.tier: "pro"})
+                db.commit()
+                db.close()
+                token = (await client.post("/login", data={"username": "bench@example.com", "password": "bench-password"})).json()["access_token"]
+                headers = {"Authorization": f"Bearer {token}"}
+                counter = itertools.count()
+
+                for name, extra in (("pipeline./query", {}), ("pipeline./query[comparative]", {"mode": "comparative"}), ("pipeline./query[reference]", None)):
+                    times = []
+                    for i in range(repeats + 1):
+                        # Unique queries, so the answer cache never short-circuits generation.
+                        if extra is None:
+                            params = {"query": f"2:{255 + i % 20}"}
+                        else:
+                            params = {"query": f"{query_texts[i % len(query_texts)]} {next(counter)}", **extra}
+                        started = time.perf_counter()
+                        response = await client.post("/query", params=params, headers=headers)
+                        response.raise_for_status()
+                        if i:
+                            times.append(time.perf_counter() - started)
+                    results[name] = summarize(times)
+                    print(f"  {name:<44} median {results[name]['median_ms']:>10.3f} ms   p95 {results[name]['p95_ms']:>10.3f} ms   ({results[name]['runs']} runs)")
+        return results
+
+    return asyncio.run(run())
+
+def compare(current: dict, baseline: dict, threshold: float, noise_floor_ms: float) -> list:
+    """Cases whose median got slower than the baseline by more than `threshold` (and `noise_floor_ms`)."""
+    regressions = []
+    print(f"\n{'case':<46} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<46} {'-':>12} {result['median_ms']:>10.3f}ms {'new':>8}")
+            continue
+        before, after = base["median_ms"], result["median_ms"]
+        change = (after - before) / before if before else 0.0
+        regressed = after > before * (1 + threshold) and after - before > noise_floor_ms
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<46} {before:>10.3f}ms {after:>10.3f}ms {change:>+7.0%}{'  REGRESSION' if regressed else ''}")
+    if baseline["meta"].get("scale") != current["meta"]["scale"]:
+        print(f"\nNote: baseline was recorded at scale {baseline['meta'].get('scale')}, this run is scale {current['meta']['scale']}.")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark index builds, top-k search, prompt assembly and SQLite retrieval on synthetic corpora, with Gemini, Groq and Tavily stubbed.")
+    parser.add_argument("--scale", type=int, default=1, help="Corpus multiplier: 1 = 6,236 verses and 7,563 hadith; 10 for a stress run")
+    parser.add_argument("--repeats", type=int, default=100, help="Timed runs per search case (builds and slow cases run fewer)")
+    parser.add_argument("--only", help="Regex; run only the cases whose names match")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Overwrite the baseline with this run instead of comparing")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed median slowdown before a case counts as a regression (0.25 = 25%%)")
+    parser.add_argument("--noise-floor-ms", type=float, default=0.2, help="Ignore slowdowns smaller than this many milliseconds")
+    args = parser.parse_args()
+
+    print(f"Benchmarking at scale {args.scale}...")
+    current = run_benchmarks(args.scale, args.repeats, args.only, args.seed)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one.")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.threshold, args.noise_floor_ms)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.threshold:.0%}.")
+
+if __name__ == "__main__":
+    main()
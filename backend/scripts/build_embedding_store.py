@@ -0,0 +1,28 @@
+import sys
+import os
+
+# Add the parent directory to sys.path to find the app module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.database import SessionLocal
+from app import models, config
+from app.embedding_store import MappedEmbeddingStore
+from app.vector_index import table_signature
+
+def build_stores():
+    root = config.settings.EMBEDDING_STORE_DIR
+    if not root:
+        print("Set EMBEDDING_STORE_DIR to the directory the API workers read from.")
+        return
+
+    db = SessionLocal()
+    try:
+        for model in (models.QuranVerse, models.Hadith, models.FiqhSource):
+            signature = table_signature(db, model)
+            store = MappedEmbeddingStore.open_or_build(db, model, root, signature)
+            print(f"{model.__tablename__}: {len(store.ids)} vectors, {store.dim} dims -> {store.path}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    build_stores()
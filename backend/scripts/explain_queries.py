@@ -0,0 +1,81 @@
+import argparse
+import sys
+import os
+from datetime import datetime
+
+# Add the parent directory to sys.path to find the app module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import func
+from app.database import engine, SessionLocal
+from app import models
+from app.pagination import encode_cursor, keyset_query
+
+def hot_queries(db):
+    """The per-user listing queries as the endpoints build them (second page, so the seek is included), with the index each should use."""
+    cursor = encode_cursor(datetime.utcnow(), 1 << 30)
+    sessions = db.query(models.ChatSession.id, models.ChatSession.title, models.ChatSession.created_at).filter(
+        models.ChatSession.user_id == 1
+    )
+    history = db.query(
+        models.ChatHistory.id, models.ChatHistory.session_id, models.ChatHistory.query,
+        models.ChatHistory.response, models.ChatHistory.language, models.ChatHistory.timestamp,
+    ).filter(models.ChatHistory.user_id == 1, models.ChatHistory.session_id == 1)
+    library = db.query(
+        models.SavedCitation.id, models.SavedCitation.source_type, models.SavedCitation.source_id,
+        func.substr(models.SavedCitation.content, 1, 280).label("preview"), models.SavedCitation.timestamp,
+    ).filter(models.SavedCitation.user_id == 1)
+    return [
+        ("GET /sessions", "ix_chat_sessions_user_created",
+         keyset_query(sessions, models.ChatSession.created_at, models.ChatSession.id, cursor, 51)),
+        ("GET /history/{id}", "ix_chat_histories_user_session_timestamp",
+         keyset_query(history, models.ChatHistory.timestamp, models.ChatHistory.id, cursor, 101, descending=False)),
+        ("GET /library", "ix_saved_citations_user_timestamp",
+         keyset_query(library, models.SavedCitation.timestamp, models.SavedCitation.id, cursor, 51)),
+        ("GET /library/count", "ix_saved_citations_user_timestamp",
+         db.query(func.count(models.SavedCitation.id)).filter(models.SavedCitation.user_id == 1)),
+    ]
+
+def explain(conn, statement):
+    compiled = statement.compile(dialect=conn.dialect)
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    if conn.dialect.name == "postgresql":
+        return [row[0] for row in conn.exec_driver_sql(f"EXPLAIN {compiled}", params)]
+    return [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)]
+
+def uses_index(plan, index_name) -> bool:
+    return any(index_name in line for line in plan)
+
+def sorts(plan) -> bool:
+    # SQLite: "USE TEMP B-TREE FOR ORDER BY"; PostgreSQL: a Sort node.
+    return any("TEMP B-TREE" in line or line.strip().lstrip("-> ").startswith("Sort") for line in plan)
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN the hot per-user queries and check each uses its composite index without a sort.")
+    parser.add_argument("--allow-seqscan", action="store_true",
+                        help="PostgreSQL: leave sequential scans enabled (on small tables the planner rightly prefers them)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    failures = 0
+    try:
+        with engine.connect() as conn:
+            if conn.dialect.name == "postgresql" and not args.allow_seqscan:
+                conn.exec_driver_sql("SET enable_seqscan = off")
+            for name, index_name, query in hot_queries(db):
+                plan = explain(conn, query.statement)
+                ok = uses_index(plan, index_name) and not sorts(plan)
+                failures += not ok
+                print(f"{'OK  ' if ok else 'FAIL'} {name}  (expects {index_name}, no sort)")
+                for line in plan:
+                    print(f"       {line}")
+            conn.rollback()
+    finally:
+        db.close()
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+
+import numpy as np
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+# Stand-ins for the Gemini embedding, Groq chat-completion and Tavily search APIs,
+# served on one port for load tests. Point the app at them with:
+#   GEMINI_API_ENDPOINT=http://127.0.0.1:PORT GROQ_BASE_URL=http://127.0.0.1:PORT TAVILY_API_BASE_URL=http://127.0.0.1:PORT
+
+ANSWER_WORDS = (
+    "In the name of Allah, the Most Gracious, the Most Merciful. The sources above indicate that the "
+    "scholars differ on the details, but the principle is clear from the Quran and the Sunnah, and "
+    "Allah knows best."
+).split()
+
+class Latency:
+    """Log-normal delays given as a median and a 99th percentile, in seconds."""
+
+    def __init__(self, median: float, p99: float = None):
+        self.median = median
+        self.sigma = math.log(p99 / median) / 2.326 if p99 and median and p99 > median else 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "Latency":
+        """"0.8" or "0.8:3" (median:p99)."""
+        median, _, p99 = spec.partition(":")
+        return cls(float(median), float(p99) if p99 else None)
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        return random.lognormvariate(math.log(self.median), self.sigma) if self.sigma else self.median
+
+class FakeService:
+    def __init__(self, latency: Latency, rate_limit_rate: float = 0.0):
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.requests = 0
+        self.rate_limited = 0
+
+    def should_rate_limit(self) -> bool:
+        self.requests += 1
+        if random.random() < self.rate_limit_rate:
+            self.rate_limited += 1
+            return True
+        return False
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "rate_limited": self.rate_limited}
+
+class FakeAPIs:
+    """
+    Embeddings are a corpus vector picked by hashing the text, plus noise, so
+    queries find neighbours above the similarity threshold the way real ones
+    do; without a corpus they are hash-seeded random vectors. Completions
+    stream `stream_chunks` words spread over the sampled latency.
+    """
+
+    def __init__(self, gemini: FakeService, groq: FakeService, tavily: FakeService,
+                 corpus_vectors: np.ndarray = None, dim: int = 384, stream_chunks: int = 40):
+        self.gemini = gemini
+        self.groq = groq
+        self.tavily = tavily
+        self.corpus = corpus_vectors
+        self.dim = corpus_vectors.shape[1] if corpus_vectors is not None else dim
+        self.stream_chunks = stream_chunks
+
+    def embed(self, text: str):
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        rng = np.random.default_rng(seed)
+        noise = rng.standard_normal(self.dim)
+        if self.corpus is not None and len(self.corpus):
+            vector = self.corpus[seed % len(self.corpus)] + 0.4 * noise / np.linalg.norm(noise)
+        else:
+            vector = noise
+        return (vector / np.linalg.norm(vector)).round(6).tolist()
+
+    # Gemini: POST /v1beta/models/{model}:embedContent and :batchEmbedContents
+    async def gemini_embed(self, request: Request):
+        await asyncio.sleep(self.gemini.latency.sample())
+        if self.gemini.should_rate_limit():
+            return JSONResponse({"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).", "status": "RESOURCE_EXHAUSTED"}}, status_code=429)
+        body = await request.json()
+        method = request.path_params["method"]
+        if method.endswith(":batchEmbedContents"):
+            return JSONResponse({"embeddings": [{"values": self.embed(self._text(r["content"]))} for r in body.get("requests", [])]})
+        return JSONResponse({"embedding": {"values": self.embed(self._text(body["content"]))}})
+
+    @staticmethod
+    def _text(content: dict) -> str:
+        return " ".join(part.get("text", "") for part in content.get("parts", []))
+
+    # Groq: POST /openai/v1/chat/completions (OpenAI-compatible, optionally SSE)
+    async def groq_completion(self, request: Request):
+        body = await request.json()
+        model = body.get("model", "unknown")
+        total = self.groq.latency.sample()
+        if self.groq.should_rate_limit():
+            # Rejected quickly, as Groq does, with the same headers and message the router parses.
+            await asyncio.sleep(min(total, 0.05))
+            retry = round(random.uniform(1, 10), 2)
+            return JSONResponse(
+                {"error": {"message": f"Rate limit reached for model `{model}`. Please try again in {retry}s.", "type": "tokens", "code": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"retry-after": str(math.ceil(retry)), "x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": f"{retry}s"},
+            )
+        prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // 4
+        words = [ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(self.stream_chunks)]
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words), "total_tokens": prompt_tokens + len(words)}
+        headers = {"x-ratelimit-remaining-requests": "1000", "x-ratelimit-remaining-tokens": "100000"}
+        completion_id = f"chatcmpl-{random.getrandbits(48):x}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(total)
+            return JSONResponse({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+                "usage": usage,
+            }, headers=headers)
+
+        async def events():
+            # A third of the time to the first token, the rest spread over the remaining words.
+            await asyncio.sleep(total / 3)
+            gap = total * 2 / 3 / max(1, len(words))
+            for i, word in enumerate(words):
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                if i < len(words) - 1:
+                    await asyncio.sleep(gap)
+            final = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"id": completion_id, "usage": usage}}
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+    # Tavily: POST /search
+    async def tavily_search(self, request: Request):
+        body = await request.json()
+        await asyncio.sleep(self.tavily.latency.sample())
+        if self.tavily.should_rate_limit():
+            return JSONResponse({"detail": {"error": "Rate limit exceeded"}}, status_code=429)
+        query = body.get("query", "")
+        results = [{
+            "title": f"Result {i + 1} for {query}",
+            "url": f"https://example.org/{hashlib.md5(f'{query}{i}'.encode()).hexdigest()[:12]}",
+            "content": f"Scholars have written about {query}. " + " ".join(ANSWER_WORDS) * 8,
+            "score": round(0.9 - i * 0.1, 2),
+        } for i in range(int(body.get("max_results") or 5))]
+        return JSONResponse({"query": query, "results": results, "response_time": 0.0})
+
+    async def stats(self, request: Request):
+        return JSONResponse({"gemini": self.gemini.stats(), "groq": self.groq.stats(), "tavily": self.tavily.stats()})
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[
+            Route("/v1beta/models/{method}", self.gemini_embed, methods=["POST"]),
+            Route("/openai/v1/chat/completions", self.groq_completion, methods=["POST"]),
+            Route("/search", self.tavily_search, methods=["POST"]),
+            Route("/_stats", self.stats, methods=["GET"]),
+        ])
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve local stand-ins for the Gemini, Groq and Tavily APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--gemini-latency", default="0.08:0.4", help="median[:p99] seconds per embedding request")
+    parser.add_argument("--groq-latency", default="1.5:6", help="median[:p99] seconds per completion")
+    parser.add_argument("--tavily-latency", default="1.2:4", help="median[:p99] seconds per search")
+    parser.add_argument("--gemini-429-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--groq-429-rate", type=float, default=0.05)
+    parser.add_argument("--tavily-429-rate", type=float, default=0.0)
+    parser.add_argument("--stream-chunks", type=int, default=40, help="Words per completion")
+    parser.add_argument("--corpus-vectors", help=".npy matrix of corpus embeddings for queries to land near")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    fakes = FakeAPIs(
+        FakeService(Latency.parse(args.gemini_latency), args.gemini_429_rate),
+        FakeService(Latency.parse(args.groq_latency), args.groq_429_rate),
+        FakeService(Latency.parse(args.tavily_latency), args.tavily_429_rate),
+        corpus_vectors=np.load(args.corpus_vectors) if args.corpus_vectors else None,
+        stream_chunks=args.stream_chunks,
+    )
+    uvicorn.run(fakes.app(), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
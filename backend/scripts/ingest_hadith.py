@@ -1,14 +1,15 @@
+import argparse
 import requests
 import sys
 import os
-import time
 
 # Add the parent directory to sys.path to find the app module
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app.database import SessionLocal
 from app import models
-from app.rag import rag_engine
+from ingest_pipeline import IngestionPipeline, add_pipeline_arguments, make_embedder, load_fixture
+
+CHECKPOINT_PATH = os.path.join(os.path.dirname(__file__), ".ingest_hadith.checkpoint.json")
 
 def fetch_hadith_book(edition):
     url = f"https://cdn.jsdelivr.net/gh/fawazahmed0/hadith-api@1/editions/{edition}.json"
@@ -20,44 +21,49 @@ def fetch_hadith_book(edition):
         print(f"Error fetching Hadith {edition}: {response.status_code}")
         return None
 
-def ingest_hadith():
-    db = SessionLocal()
-    
+def build_records(hadiths, limit=None):
+    seen = set()
+    for h in hadiths[:limit]:
+        # Some API versions might have slightly different structures
+        text = h.get('text', '')
+        if not text: continue
+
+        number = int(h.get('hadithnumber', 0))
+        if number in seen: continue
+        seen.add(number)
+
+        yield {
+            "book_name": "Sahih Bukhari",
+            "hadith_number": number,
+            "arabic_text": "", # We could fetch Arabic too, but English is priority for retrieval
+            "english_text": text,
+            "grade": "Sahih",
+            "embed_text": text[:500], # Embed first 500 chars for speed
+        }
+
+def ingest_hadith(args):
     # We'll fetch English Bukhari
-    bukhari_eng = fetch_hadith_book("eng-bukhari")
+    bukhari_eng = load_fixture("hadith_sample.json") if args.fixture else fetch_hadith_book("eng-bukhari")
 
     if not bukhari_eng:
         print("Failed to fetch Hadith data.")
         return
 
-    print("Processing and ingesting Hadiths (Limit 100 for verification)...")
-    # Take a sample for verification
-    for i in range(min(len(bukhari_eng), 100)):
-        h = bukhari_eng[i]
-        
-        # Some API versions might have slightly different structures
-        text = h.get('text', '')
-        if not text: continue
+    pipeline = IngestionPipeline(
+        models.Hadith,
+        key_columns=("book_name", "hadith_number"),
+        embedder=make_embedder(args),
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        checkpoint_path=CHECKPOINT_PATH,
+    )
 
-        embedding = rag_engine.get_embedding(text[:500]) # Embed first 500 chars for speed
-        
-        hadith = models.Hadith(
-            book_name="Sahih Bukhari",
-            hadith_number=int(h.get('hadithnumber', 0)),
-            arabic_text="", # We could fetch Arabic too, but English is priority for retrieval
-            english_text=text,
-            grade="Sahih",
-            embedding=embedding
-        )
-        db.add(hadith)
-        
-        if i % 10 == 0:
-            db.commit()
-            print(f"Ingested {i} hadiths...")
-
-    db.commit()
+    print("Processing and ingesting Hadiths...")
+    pipeline.run(build_records(bukhari_eng, args.limit), dataset_id="fixture" if args.fixture else "eng-bukhari")
     print("Hadith ingestion complete.")
-    db.close()
 
 if __name__ == "__main__":
-    ingest_hadith()
+    parser = argparse.ArgumentParser(description="Ingest Sahih Bukhari with embeddings.")
+    add_pipeline_arguments(parser)
+    parser.add_argument("--limit", type=int, default=None, help="Only ingest the first N hadith")
+    ingest_hadith(parser.parse_args())
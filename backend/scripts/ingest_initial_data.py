@@ -7,6 +7,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from app.database import SessionLocal, engine
 from app import models
 from app.rag import rag_engine
+from app.vector_index import mark_corpus_changed
 
 def ingest_data():
     db = SessionLocal()
@@ -51,7 +52,7 @@ def ingest_data():
             embedding=rag_engine.get_embedding(v["english"])
         )
         db.add(verse)
-    
+    mark_corpus_changed(db, models.QuranVerse)
     db.commit()
     print(f"Successfully ingested {len(sample_verses)} sample verses.")
     db.close()
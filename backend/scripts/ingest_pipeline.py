@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+from sqlalchemy import insert
+
+# Add the parent directory to sys.path to find the app module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.database import SessionLocal
+from app.vector_index import mark_corpus_changed
+
+RATE_LIMIT_MARKERS = ("429", "rate limit", "rate_limit", "resource exhausted", "resourceexhausted", "quota")
+
+class StubEmbedder:
+    """Deterministic offline embedder for fixtures and dry runs: same text, same vector."""
+
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+
+    def embed_batch(self, texts):
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vectors.append(np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32).tolist())
+        return vectors
+
+def is_rate_limited(error: Exception) -> bool:
+    message = f"{type(error).__name__} {error}".lower()
+    return any(marker in message for marker in RATE_LIMIT_MARKERS)
+
+def retry_after_seconds(error: Exception):
+    """Extracts a server-suggested wait ("retry in 12s", "retry_delay { seconds: 12 }") if present."""
+    match = re.search(r"retry(?:[ _-]?(?:after|in|delay))?\D{0,20}?(\d+(?:\.\d+)?)", str(error), re.IGNORECASE)
+    return float(match.group(1)) if match else None
+
+class IngestionPipeline:
+    """
+    Embeds and bulk-inserts corpus records.
+
+    Records are dicts of column values plus an `embed_text` entry. They are
+    split into fixed batches; up to `concurrency` batches are embedded at once
+    (one API call each) with rate-limit-aware retry, and each finished batch is
+    written with a single executemany insert. Completed batch numbers are
+    checkpointed to disk, and rows whose natural key already exists are
+    skipped, so an interrupted run can simply be restarted.
+    """
+
+    def __init__(self, model, key_columns, embedder, batch_size: int = 100, concurrency: int = 4,
+                 max_retries: int = 6, checkpoint_path: str = None):
+        self.model = model
+        self.key_columns = key_columns
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.checkpoint_path = checkpoint_path
+        self.done_batches = set()
+        self.failed_batches = []
+        self.retries = 0
+
+    def _load_checkpoint(self, dataset_id: str):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path) as f:
+            state = json.load(f)
+        if state.get("dataset") == dataset_id and state.get("batch_size") == self.batch_size:
+            self.done_batches = set(state.get("done_batches", []))
+            print(f"Resuming from checkpoint: {len(self.done_batches)} batches already ingested.")
+
+    def _save_checkpoint(self, dataset_id: str):
+        if not self.checkpoint_path:
+            return
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"dataset": dataset_id, "batch_size": self.batch_size, "done_batches": sorted(self.done_batches)}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def clear_checkpoint(self):
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def _existing_keys(self, db):
+        columns = [getattr(self.model, name) for name in self.key_columns]
+        return {tuple(row) for row in db.query(*columns).all()}
+
+    def _embed_with_retry(self, texts):
+        delay = 1.0
+        for attempt in range(self.max_retries + 1):
+            try:
+                vectors = self.embedder.embed_batch(texts)
+                if len(vectors) != len(texts):
+                    raise RuntimeError(f"embedder returned {len(vectors)} vectors for {len(texts)} texts")
+                return vectors
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                wait_for = retry_after_seconds(e) if is_rate_limited(e) else None
+                if wait_for is None:
+                    wait_for = delay * (2 if is_rate_limited(e) else 1)
+                # Jitter keeps concurrent workers from retrying in lockstep.
+                time.sleep(wait_for + random.uniform(0, delay))
+                delay = min(delay * 2, 60.0)
+
+    def run(self, records, dataset_id: str = "default"):
+        records = list(records)
+        batches = [records[i:i + self.batch_size] for i in range(0, len(records), self.batch_size)]
+        self._load_checkpoint(dataset_id)
+
+        db = SessionLocal()
+        existing = self._existing_keys(db)
+        pending = []
+        skipped = 0
+        for number, batch in enumerate(batches):
+            if number in self.done_batches:
+                skipped += len(batch)
+                continue
+            fresh = [r for r in batch if tuple(r[c] for c in self.key_columns) not in existing]
+            skipped += len(batch) - len(fresh)
+            if fresh:
+                pending.append((number, fresh))
+            else:
+                self.done_batches.add(number)
+
+        total = sum(len(batch) for _, batch in pending)
+        print(f"{len(records)} records, {skipped} already present, {total} to ingest in {len(pending)} batches "
+              f"(batch size {self.batch_size}, concurrency {self.concurrency}).")
+
+        inserted = 0
+        start = time.perf_counter()
+        queue = iter(pending)
+        in_flight = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                def submit_next():
+                    for number, batch in queue:
+                        future = pool.submit(self._embed_with_retry, [r["embed_text"] for r in batch])
+                        in_flight[future] = (number, batch)
+                        return True
+                    return False
+
+                for _ in range(self.concurrency * 2):
+                    if not submit_next():
+                        break
+
+                while in_flight:
+                    finished, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        number, batch = in_flight.pop(future)
+                        submit_next()
+                        try:
+                            vectors = future.result()
+                        except Exception as e:
+                            print(f"Batch {number} failed after {self.max_retries} retries: {e}")
+                            self.failed_batches.append(number)
+                            continue
+
+                        rows = []
+                        for record, vector in zip(batch, vectors):
+                            row = {k: v for k, v in record.items() if k != "embed_text"}
+                            row["embedding"] = vector
+                            rows.append(row)
+                        db.execute(insert(self.model), rows)
+                        mark_corpus_changed(db, self.model)
+                        db.commit()
+                        self.done_batches.add(number)
+                        self._save_checkpoint(dataset_id)
+
+                        inserted += len(rows)
+                        elapsed = time.perf_counter() - start
+                        rate = inserted / elapsed if elapsed else 0.0
+                        eta = (total - inserted) / rate if rate else 0.0
+                        print(f"  {inserted}/{total} rows ({rate:.1f} rows/s, {self.retries} retries, ETA {eta:.0f}s)")
+        finally:
+            db.close()
+
+        elapsed = time.perf_counter() - start
+        print(f"Inserted {inserted} rows in {elapsed:.1f}s ({inserted / elapsed if elapsed else 0.0:.1f} rows/s), "
+              f"{self.retries} retries, {len(self.failed_batches)} failed batches.")
+        if not self.failed_batches:
+            self.clear_checkpoint()
+        return inserted
+
+def load_fixture(name: str):
+    path = os.path.join(os.path.dirname(__file__), "fixtures", name)
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def add_pipeline_arguments(parser):
+    parser.add_argument("--batch-size", type=int, default=100, help="Texts per embedding request")
+    parser.add_argument("--concurrency", type=int, default=4, help="Embedding requests in flight")
+    parser.add_argument("--fixture", action="store_true", help="Use the bundled fixture dataset instead of downloading")
+    parser.add_argument("--stub-embedder", action="store_true", help="Use deterministic offline vectors instead of Gemini")
+
+def make_embedder(args):
+    if args.stub_embedder:
+        return StubEmbedder()
+    from app.rag import rag_engine
+    return rag_engine
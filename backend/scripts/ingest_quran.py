@@ -1,14 +1,17 @@
+import argparse
 import requests
 import sys
 import os
-import time
 
 # Add the parent directory to sys.path to find the app module
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.database import SessionLocal
 from app import models
-from app.rag import rag_engine
+from app.vector_index import mark_corpus_changed
+from ingest_pipeline import IngestionPipeline, add_pipeline_arguments, make_embedder, load_fixture
+
+CHECKPOINT_PATH = os.path.join(os.path.dirname(__file__), ".ingest_quran.checkpoint.json")
 
 def fetch_quran(edition):
     url = f"https://api.alquran.cloud/v1/quran/{edition}"
@@ -20,51 +23,55 @@ def fetch_quran(edition):
         print(f"Error fetching Quran {edition}: {response.status_code}")
         return None
 
-def ingest_quran():
-    db = SessionLocal()
-    
-    # We'll fetch English (Asad) and Arabic (original)
-    en_surahs = fetch_quran("en.asad")
-    ar_surahs = fetch_quran("quran-simple") # Simple Arabic text
+def build_records(en_surahs, ar_surahs):
+    for en_surah, ar_surah in zip(en_surahs, ar_surahs):
+        for en_ayah, ar_ayah in zip(en_surah['ayahs'], ar_surah['ayahs']):
+            yield {
+                "surah_number": en_surah['number'],
+                "ayah_number": en_ayah['numberInSurah'],
+                "arabic_text": ar_ayah['text'],
+                "english_text": en_ayah['text'],
+                # Use English text for embedding
+                "embed_text": en_ayah['text'],
+            }
+
+def ingest_quran(args):
+    if args.fixture:
+        fixture = load_fixture("quran_sample.json")
+        en_surahs, ar_surahs = fixture["en"], fixture["ar"]
+    else:
+        # We'll fetch English (Asad) and Arabic (original)
+        en_surahs = fetch_quran("en.asad")
+        ar_surahs = fetch_quran("quran-simple") # Simple Arabic text
 
     if not en_surahs or not ar_surahs:
         print("Failed to fetch Quran data.")
         return
 
-    print("Cleaning existing Quran verses for fresh full ingestion...")
-    db.query(models.QuranVerse).delete()
-    db.commit()
+    pipeline = IngestionPipeline(
+        models.QuranVerse,
+        key_columns=("surah_number", "ayah_number"),
+        embedder=make_embedder(args),
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        checkpoint_path=CHECKPOINT_PATH,
+    )
 
-    print("Processing and ingesting full Quran...")
-    for i in range(len(en_surahs)):
-        en_surah = en_surahs[i]
-        ar_surah = ar_surahs[i]
-        
-        surah_num = en_surah['number']
-        print(f"Ingesting Surah {surah_num}: {en_surah['englishName']}...")
-        
-        for j in range(len(en_surah['ayahs'])):
-            en_ayah = en_surah['ayahs'][j]
-            ar_ayah = ar_surah['ayahs'][j]
-            
-            # Use English text for embedding
-            embedding = rag_engine.get_embedding(en_ayah['text'])
-            
-            verse = models.QuranVerse(
-                surah_number=surah_num,
-                ayah_number=en_ayah['numberInSurah'],
-                arabic_text=ar_ayah['text'],
-                english_text=en_ayah['text'],
-                embedding=embedding
-            )
-            db.add(verse)
-        
-        # Commit every surah to avoid huge transactions
+    if args.fresh:
+        print("Cleaning existing Quran verses for fresh full ingestion...")
+        db = SessionLocal()
+        db.query(models.QuranVerse).delete()
+        mark_corpus_changed(db, models.QuranVerse)
         db.commit()
-        print(f"Surah {surah_num} complete.")
+        db.close()
+        pipeline.clear_checkpoint()
 
+    print("Processing and ingesting full Quran...")
+    pipeline.run(build_records(en_surahs, ar_surahs), dataset_id="fixture" if args.fixture else "en.asad+quran-simple")
     print("Quran ingestion complete.")
-    db.close()
 
 if __name__ == "__main__":
-    ingest_quran()
+    parser = argparse.ArgumentParser(description="Ingest the Quran with embeddings.")
+    add_pipeline_arguments(parser)
+    parser.add_argument("--fresh", action="store_true", help="Delete existing verses before ingesting")
+    ingest_quran(parser.parse_args())
@@ -0,0 +1,312 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add the parent directory to sys.path to find the app module
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(BACKEND_DIR)
+
+from benchmark import TOPIC_WORDS, populate
+
+# Relative weight of each action a virtual user takes between think times.
+DEFAULT_MIX = "query=35,comparative=10,stream=10,reference=5,sessions=15,history=15,library=7,save=3"
+
+# Appended to some queries so the app's prefetch heuristic starts a web search, as contemporary questions do.
+CONTEMPORARY_SUFFIXES = ("today", "in modern banking", "according to scholars", "with crypto")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000 if values else float("nan")
+
+async def wait_until_up(client, url: str, timeout: float, process: subprocess.Popen):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args[:4])} exited with status {process.returncode}")
+        try:
+            if (await client.get(url, timeout=2)).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} not up after {timeout:.0f}s")
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}  # endpoint -> [(seconds, ok)]
+
+    def add(self, endpoint: str, seconds: float, ok: bool):
+        self.samples.setdefault(endpoint, []).append((seconds, ok))
+
+    def report(self, duration: float) -> dict:
+        report = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            times = [s for s, ok in samples if ok]
+            report[endpoint] = {
+                "requests": len(samples),
+                "errors": sum(1 for _, ok in samples if not ok),
+                "rps": round(len(samples) / duration, 2),
+                "p50_ms": round(percentile(times, 0.50), 1),
+                "p95_ms": round(percentile(times, 0.95), 1),
+                "p99_ms": round(percentile(times, 0.99), 1),
+            }
+        return report
+
+class VirtualUser:
+    """Signs up, logs in and upgrades, then takes weighted random actions with exponential think times."""
+
+    def __init__(self, client, name: str, rng: random.Random, recorder: Recorder, mix, think_time: float, queries):
+        self.client = client
+        self.email = f"{name}@example.com"
+        self.rng = rng
+        self.recorder = recorder
+        self.actions, self.weights = zip(*mix.items())
+        self.think_time = think_time
+        self.queries = queries
+        self.headers = {}
+        self.sessions = []
+        self.sources = []
+
+    async def request(self, endpoint: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, headers=self.headers, **kwargs)
+            ok = response.status_code < 400
+        except Exception:
+            response, ok = None, False
+        self.recorder.add(endpoint, time.perf_counter() - started, ok)
+        return response if ok else None
+
+    async def start(self):
+        await self.request("POST /signup", "POST", "/signup", json={"email": self.email, "password": "load-test-password"})
+        response = await self.request("POST /login", "POST", "/login", data={"username": self.email, "password": "load-test-password"})
+        if response is None:
+            return False
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        # Pro tier, so the daily inquiry limit doesn't turn the run into a stream of 403s.
+        await self.request("POST /upgrade", "POST", "/upgrade")
+        return True
+
+    def query_text(self) -> str:
+        query = self.rng.choice(self.queries)
+        if self.rng.random() < 0.2:
+            query += " " + self.rng.choice(CONTEMPORARY_SUFFIXES)
+        return query
+
+    async def query(self, endpoint: str, **params):
+        if self.sessions and self.rng.random() < 0.5:
+            params["session_id"] = self.rng.choice(self.sessions)
+        response = await self.request(endpoint, "POST", "/query", params=params, timeout=120)
+        if response is not None:
+            body = response.json()
+            self.sessions.append(body["session_id"])
+            self.sources.extend(body["sources"][:2])
+
+    async def stream(self):
+        started = time.perf_counter()
+        first_token, ok = None, False
+        try:
+            async with self.client.stream("POST", "/query/stream", params={"query": self.query_text()}, headers=self.headers, timeout=120) as response:
+                ok = response.status_code < 400
+                async for line in response.aiter_lines():
+                    if first_token is None and line.startswith("event: token"):
+                        first_token = time.perf_counter() - started
+        except Exception:
+            ok = False
+        self.recorder.add("POST /query/stream", time.perf_counter() - started, ok)
+        if first_token is not None:
+            self.recorder.add("POST /query/stream (first token)", first_token, True)
+
+    async def act(self, action: str):
+        if action == "query":
+            await self.query("POST /query", query=self.query_text())
+        elif action == "comparative":
+            await self.query("POST /query [comparative]", query=self.query_text(), mode="comparative")
+        elif action == "reference":
+            await self.query("POST /query [reference]", query=f"{self.rng.randint(1, 114)}:{self.rng.randint(1, 5)}")
+        elif action == "stream":
+            await self.stream()
+        elif action == "sessions":
+            await self.request("GET /sessions", "GET", "/sessions", params={"limit": 20})
+        elif action == "history" and self.sessions:
+            await self.request("GET /history/{id}", "GET", f"/history/{self.rng.choice(self.sessions)}")
+        elif action == "library":
+            await self.request("GET /library", "GET", "/library", params={"limit": 50})
+        elif action == "save" and self.sources:
+            source = self.rng.choice(self.sources)
+            await self.request("POST /library/save", "POST", "/library/save",
+                               params={"source_type": source["type"], "source_id": source["id"]}, json=source["content"])
+
+    async def run(self, deadline: float):
+        if not await self.start():
+            return
+        while time.monotonic() < deadline:
+            await self.act(self.rng.choices(self.actions, self.weights)[0])
+            if self.think_time:
+                await asyncio.sleep(min(self.rng.expovariate(1 / self.think_time), max(0.0, deadline - time.monotonic())))
+
+async def run_level(app_url: str, fake_url: str, concurrency: int, duration: float, mix, think_time: float, queries, seed: int, label: str) -> dict:
+    import httpx
+
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=concurrency * 2 + 10, max_keepalive_connections=concurrency * 2 + 10)
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=60) as client:
+        before = (await client.get(f"{fake_url}/_stats")).json()
+        started = time.monotonic()
+        users = [
+            VirtualUser(client, f"load-{label}-{i}", random.Random(seed * 1000 + i), recorder, mix, think_time, queries)
+            for i in range(concurrency)
+        ]
+        await asyncio.gather(*[user.run(started + duration) for user in users])
+        elapsed = time.monotonic() - started
+        after = (await client.get(f"{fake_url}/_stats")).json()
+
+    endpoints = recorder.report(elapsed)
+    completed = sum(e["requests"] - e["errors"] for name, e in endpoints.items() if "(first token)" not in name)
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 1),
+        "throughput_rps": round(completed / elapsed, 2),
+        "endpoints": endpoints,
+        "upstream": {
+            service: {key: after[service][key] - before[service][key] for key in after[service]}
+            for service in after
+        },
+    }
+
+def print_level(result: dict):
+    print(f"\n== {result['concurrency']} concurrent users, {result['seconds']}s: {result['throughput_rps']} req/s ==")
+    print(f"{'endpoint':<36} {'requests':>8} {'errors':>7} {'req/s':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, e in result["endpoints"].items():
+        print(f"{name:<36} {e['requests']:>8} {e['errors']:>7} {e['rps']:>7} {e['p50_ms']:>9} {e['p95_ms']:>9} {e['p99_ms']:>9}")
+    print("upstream " + ", ".join(f"{service} {s['requests']} calls ({s['rate_limited']} answered 429)" for service, s in result["upstream"].items()))
+
+def seed_database(database_url: str, scale: int, seed: int, vectors_path: str):
+    """Migrates and fills the database with the benchmark's synthetic corpus; saves its vectors for the fake embedder."""
+    os.environ["DATABASE_URL"] = database_url
+    from app.database import engine
+    from app.migrations import upgrade
+
+    upgrade(engine)
+    vectors, _ = populate(engine, scale, np.random.default_rng(seed))
+    np.save(vectors_path, np.concatenate(list(vectors.values())))
+    engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description=(
+        "Drive mixed multi-user traffic at the API, served by uvicorn against local stand-ins for "
+        "Gemini, Groq and Tavily, and report throughput and p50/p95/p99 per endpoint at each concurrency."
+    ))
+    parser.add_argument("--concurrency", default="1,5,10,25", help="Comma-separated numbers of concurrent users, one run each")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per concurrency level")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean seconds a user waits between actions")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Action weights (query, comparative, stream, reference, sessions, history, library, save)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--database-url", help="Database to seed and serve from (default: a temporary SQLite file)")
+    parser.add_argument("--no-seed", action="store_true", help="Use the database as it is (already migrated and loaded)")
+    parser.add_argument("--scale", type=int, default=1, help="Synthetic corpus size multiplier, as in benchmark.py")
+    parser.add_argument("--gemini-latency", default="0.08:0.4", help="median[:p99] seconds")
+    parser.add_argument("--groq-latency", default="1.5:6", help="median[:p99] seconds")
+    parser.add_argument("--tavily-latency", default="1.2:4", help="median[:p99] seconds")
+    parser.add_argument("--gemini-429-rate", type=float, default=0.0)
+    parser.add_argument("--groq-429-rate", type=float, default=0.05)
+    parser.add_argument("--tavily-429-rate", type=float, default=0.0)
+    parser.add_argument("--stream-chunks", type=int, default=40)
+    parser.add_argument("--free-tier-budgets", action="store_true",
+                        help="Keep the app's client-side Groq free-tier budgets (they cap answers at a few per minute)")
+    parser.add_argument("--warmup", type=float, default=10, help="Seconds of traffic before the first measured level (index loads, caches)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the per-level results as JSON to this file")
+    args = parser.parse_args()
+
+    import httpx
+
+    mix = {name: float(weight) for name, weight in (part.split("=") for part in args.mix.split(","))}
+    levels = [int(n) for n in args.concurrency.split(",")]
+    rng = random.Random(args.seed)
+    queries = [" ".join(rng.sample(TOPIC_WORDS, rng.randint(2, 4))) for _ in range(300)]
+
+    # Fresh accounts every run, so --no-seed against a database used before still signs up cleanly.
+    run_id = f"{random.getrandbits(32):08x}"
+    workdir = tempfile.mkdtemp(prefix="ilmai-load-")
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'load.db')}"
+    vectors_path = os.path.join(workdir, "corpus_vectors.npy")
+    if not args.no_seed:
+        print(f"Seeding {database_url} at scale {args.scale}...")
+        seed_database(database_url, args.scale, args.seed, vectors_path)
+
+    fake_port, app_port = free_port(), free_port()
+    fake_url, app_url = f"http://127.0.0.1:{fake_port}", f"http://127.0.0.1:{app_port}"
+    fake_cmd = [
+        sys.executable, os.path.join(os.path.dirname(__file__), "fake_apis.py"), "--port", str(fake_port),
+        "--gemini-latency", args.gemini_latency, "--groq-latency", args.groq_latency, "--tavily-latency", args.tavily_latency,
+        "--gemini-429-rate", str(args.gemini_429_rate), "--groq-429-rate", str(args.groq_429_rate),
+        "--tavily-429-rate", str(args.tavily_429_rate), "--stream-chunks", str(args.stream_chunks), "--seed", str(args.seed),
+    ]
+    if os.path.exists(vectors_path):
+        fake_cmd += ["--corpus-vectors", vectors_path]
+    app_env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "AUTO_MIGRATE": "false",
+        "GROQ_CLIENT_BUDGETS": "true" if args.free_tier_budgets else "false",
+        "GEMINI_API_KEY": "load-test", "GROQ_API_KEY": "load-test", "TAVILY_API_KEY": "load-test",
+        "GEMINI_API_ENDPOINT": fake_url, "GROQ_BASE_URL": fake_url, "TAVILY_API_BASE_URL": fake_url,
+    }
+    app_cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(app_port),
+               "--workers", str(args.workers), "--log-level", "warning"]
+
+    app_log_path = os.path.join(workdir, "app.log")
+    processes = []
+    try:
+        processes.append(subprocess.Popen(fake_cmd))
+        with open(app_log_path, "w") as app_log:
+            processes.append(subprocess.Popen(app_cmd, cwd=BACKEND_DIR, env=app_env, stdout=app_log, stderr=subprocess.STDOUT))
+
+        async def run():
+            async with httpx.AsyncClient() as client:
+                await wait_until_up(client, f"{fake_url}/_stats", 30, processes[0])
+                await wait_until_up(client, f"{app_url}/health", 120, processes[1])
+            print(f"App on {app_url} ({args.workers} worker(s), log in {app_log_path}), fake APIs on {fake_url}")
+            if args.warmup:
+                await run_level(app_url, fake_url, max(2, args.workers * 2), args.warmup, mix, args.think_time, queries, args.seed, f"{run_id}-warmup")
+            results = []
+            for level in levels:
+                result = await run_level(app_url, fake_url, level, args.duration, mix, args.think_time, queries, args.seed + level, f"{run_id}-c{level}")
+                print_level(result)
+                results.append(result)
+            return results
+
+        results = asyncio.run(run())
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "settings": {key: value for key, value in vars(args).items() if key != "output"},
+                "levels": results,
+            }, f, indent=2)
+
+if __name__ == "__main__":
+    main()
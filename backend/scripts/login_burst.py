@@ -0,0 +1,79 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+# Add the parent directory to sys.path to find the app module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000 if values else float("nan")
+
+async def burst(app, logins: int, users: int, probe_interval: float):
+    import httpx
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://burst") as client:
+        for i in range(users):
+            await client.post("/signup", json={"email": f"burst{i}@example.com", "password": "burst-password"})
+
+        login_times, statuses, probe_times = [], {}, []
+        done = asyncio.Event()
+
+        async def login(i):
+            started = time.perf_counter()
+            r = await client.post("/login", data={"username": f"burst{i % users}@example.com", "password": "burst-password"})
+            statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+            if r.status_code == 200:
+                login_times.append(time.perf_counter() - started)
+
+        async def probe():
+            # A cheap endpoint polled throughout the burst: it should not stall behind bcrypt.
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/")
+                probe_times.append(time.perf_counter() - started)
+                await asyncio.sleep(probe_interval)
+
+        prober = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*[login(i) for i in range(logins)])
+        elapsed = time.perf_counter() - started
+        done.set()
+        await prober
+        stats = (await client.get("/stats")).json()["password_hashing"]
+
+    print(f"{logins} concurrent logins in {elapsed:.2f}s; statuses {dict(sorted(statuses.items()))}")
+    print(f"login  p50 {percentile(login_times, 0.5):7.1f} ms   p99 {percentile(login_times, 0.99):7.1f} ms")
+    print(f"probe  p50 {percentile(probe_times, 0.5):7.1f} ms   p99 {percentile(probe_times, 0.99):7.1f} ms   ({len(probe_times)} requests to /)")
+    print(f"hasher {stats}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Fire a synthetic login burst at the app in-process and report login latency.")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rounds", type=int, help="bcrypt cost (defaults to BCRYPT_ROUNDS)")
+    parser.add_argument("--workers", type=int, help="bcrypt threads (defaults to PASSWORD_HASH_WORKERS)")
+    parser.add_argument("--queue-limit", type=int, help="defaults to PASSWORD_HASH_QUEUE_LIMIT")
+    parser.add_argument("--probe-interval", type=float, default=0.01)
+    args = parser.parse_args()
+
+    # Settings are read at import, so configure the environment first; never touch the real database.
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'login_burst.db')}"
+    os.environ.setdefault("GROQ_API_KEY", "unused")
+    for flag, name in ((args.rounds, "BCRYPT_ROUNDS"), (args.workers, "PASSWORD_HASH_WORKERS"), (args.queue_limit, "PASSWORD_HASH_QUEUE_LIMIT")):
+        if flag is not None:
+            os.environ[name] = str(flag)
+    logging.disable(logging.INFO)
+
+    from app.main import app
+    from app.database import engine
+    from app.migrations import upgrade
+    upgrade(engine)  # ASGITransport doesn't run the app's lifespan
+    asyncio.run(burst(app, args.logins, args.users, args.probe_interval))
+
+if __name__ == "__main__":
+    main()
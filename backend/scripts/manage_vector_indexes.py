@@ -0,0 +1,36 @@
+import argparse
+import sys
+import os
+
+# Add the parent directory to sys.path to find the app module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.database import engine
+from app import config
+from app.migrations import migration_lock
+from app.vector_index import ensure_ann_indexes
+
+def main():
+    parser = argparse.ArgumentParser(description="Create or rebuild the pgvector ANN indexes on the corpus tables.")
+    parser.add_argument("--type", default=config.settings.VECTOR_ANN_INDEX, choices=["hnsw", "ivfflat"])
+    parser.add_argument("--rebuild", action="store_true", help="Drop and recreate (e.g. after a bulk re-ingest for ivfflat)")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        print("ANN indexes are only used on PostgreSQL; the in-process index is used on this database.")
+        return
+
+    # Under the migration lock, so a starting worker doesn't race the rebuild.
+    with migration_lock(engine):
+        ensure_ann_indexes(
+            engine,
+            index_type=args.type,
+            m=config.settings.HNSW_M,
+            ef_construction=config.settings.HNSW_EF_CONSTRUCTION,
+            lists=config.settings.IVFFLAT_LISTS,
+            rebuild=args.rebuild,
+        )
+    print(f"{args.type} indexes ready.")
+
+if __name__ == "__main__":
+    main()
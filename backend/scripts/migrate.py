@@ -0,0 +1,28 @@
+import argparse
+import sys
+import os
+
+# Add the parent directory to sys.path to find the app module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.database import engine
+from app.migrations import MIGRATIONS, applied_versions, migrate
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations and ensure the ANN indexes exist.")
+    parser.add_argument("--status", action="store_true", help="List migrations and whether each is applied, without changing anything")
+    args = parser.parse_args()
+
+    if args.status:
+        with engine.connect() as conn:
+            done = applied_versions(conn)
+            conn.commit()
+        for version, name, _ in MIGRATIONS:
+            print(f"{version:>4}  {'applied' if version in done else 'pending':<8} {name}")
+        return
+
+    applied = migrate(engine)
+    print(f"Applied migrations {applied}." if applied else "Schema is up to date.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add the parent directory to sys.path to find the app module
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(BACKEND_DIR)
+
+from load_test import free_port, seed_database
+
+IMPORT_PROBE = "import time; started = time.perf_counter(); import app.main; print(time.perf_counter() - started)"
+
+def import_times(runs: int, env: dict):
+    """Seconds to import app.main in fresh interpreters (module caches cold, bytecode warm)."""
+    times = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True).stdout
+        times.append(float(output.strip().splitlines()[-1]))
+    return times
+
+async def time_to_ready(env: dict, workers: int, timeout: float):
+    """Seconds from spawning uvicorn until /health, then /ready, first answer 200; and the /ready payload."""
+    import httpx
+
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    healthy = ready = payload = None
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=2) as client:
+            while ready is None and time.perf_counter() - started < timeout:
+                if process.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with status {process.returncode}")
+                try:
+                    if healthy is None and (await client.get("/health")).status_code == 200:
+                        healthy = time.perf_counter() - started
+                    if healthy is not None:
+                        response = await client.get("/ready")
+                        if response.status_code == 200:
+                            ready, payload = time.perf_counter() - started, response.json()
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.01)
+    finally:
+        process.terminate()
+        process.wait(10)
+    return healthy, ready, payload
+
+def summary(times) -> str:
+    return f"median {statistics.median(times):.3f}s  min {min(times):.3f}s  max {max(times):.3f}s  ({len(times)} runs)"
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how long importing the app takes, and how long a uvicorn process takes to become healthy and ready.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--warmup", choices=("on", "off", "both"), default="both", help="Measure time-to-ready with WARMUP on, off or both")
+    parser.add_argument("--database-url", help="Database to start against (default: a temporary SQLite file)")
+    parser.add_argument("--scale", type=int, default=1, help="Seed the temporary database with the benchmark corpus at this scale; 0 leaves it empty")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if not database_url:
+        workdir = tempfile.mkdtemp(prefix="ilmai-startup-")
+        database_url = f"sqlite:///{os.path.join(workdir, 'startup.db')}"
+        if args.scale:
+            print(f"Seeding {database_url} at scale {args.scale}...")
+            seed_database(database_url, args.scale, 7, os.path.join(workdir, "vectors.npy"))
+    # Placeholder keys, so startup takes the same paths as in production; nothing here calls the APIs.
+    env = {"GEMINI_API_KEY": "unused", "GROQ_API_KEY": "unused", "TAVILY_API_KEY": "unused", **os.environ, "DATABASE_URL": database_url}
+
+    print(f"import app.main: {summary(import_times(args.runs, env))}")
+    for warmup in (("on", "off") if args.warmup == "both" else (args.warmup,)):
+        healthy, ready, steps = [], [], {}
+        for _ in range(args.runs):
+            h, r, payload = asyncio.run(time_to_ready({**env, "WARMUP": "true" if warmup == "on" else "false"}, args.workers, args.timeout))
+            healthy.append(h)
+            ready.append(r)
+            for name, seconds in payload["steps"].items():
+                steps.setdefault(name, []).append(seconds)
+        print(f"\nWARMUP={warmup}, {args.workers} worker(s)")
+        print(f"  spawn -> /health 200: {summary(healthy)}")
+        print(f"  spawn -> /ready 200:  {summary(ready)}")
+        for name, seconds in steps.items():
+            print(f"    {name:<16} median {statistics.median(seconds):.3f}s")
+
+if __name__ == "__main__":
+    main()
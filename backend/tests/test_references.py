@@ -0,0 +1,26 @@
+import os
+import sys
+
+# Add the parent directory to sys.path to find the app module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.references import HadithReference, QuranReference, parse_references
+
+def test_surah_name_with_colon_reference():
+    parsed = parse_references("Al-Baqarah 2:255")
+    assert parsed.references == [QuranReference(2, 255, 255)]
+    assert parsed.standalone
+
+def test_colon_reference_inside_a_question_is_kept():
+    parsed = parse_references("what does 2:255 say about intercession")
+    assert parsed.references == [QuranReference(2, 255, 255)]
+    assert not parsed.standalone
+
+def test_standalone_references():
+    assert parse_references("2:1-5") == ([QuranReference(2, 1, 5)], True)
+    assert parse_references("Sahih Muslim hadith 8") == ([HadithReference("muslim", 8)], True)
+    assert parse_references("Yasin 1-12") == ([QuranReference(36, 1, 12)], True)
+
+def test_times_ratios_and_bare_names_are_not_references():
+    for query in ("Is it ok to pray at 5:30", "I have 2:1 ratio", "muslim 5 times prayer", "I read Yunus 10 times"):
+        assert parse_references(query).references == [], query
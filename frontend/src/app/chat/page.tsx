@@ -63,6 +63,7 @@ function ChatContent() {
   const [input, setInput] = useState("");
   const [isLoading, setIsLoading] = useState(false);
   const [sessions, setSessions] = useState<{ id: number; title: string; created_at: string }[]>([]);
+  const [sessionsCursor, setSessionsCursor] = useState<string | null>(null);
   const currentSessionIdRef = useRef<number | null>(null);
   const [currentSessionId, setCurrentSessionId] = useState<number | null>(null);
   const scrollRef = useRef<HTMLDivElement>(null);
@@ -116,6 +117,7 @@ function ChatContent() {
       newChat: "New Chat",
       history: "Research History",
       noHistory: "No history yet",
+      loadMore: "Load more",
       signOut: "Sign Out",
       researchMode: "Research Mode",
       scholarlyAssistant: "Scholarly Assistant",
@@ -137,6 +139,7 @@ function ChatContent() {
       newChat: "নতুন চ্যাট",
       history: "গবেষণার ইতিহাস",
       noHistory: "এখনো কোনো ইতিহাস নেই",
+      loadMore: "আরও দেখুন",
       signOut: "সাইন আউট",
       researchMode: "গবেষণা মোড",
       scholarlyAssistant: "পাণ্ডিত্যপূর্ণ সহকারী",
@@ -155,22 +158,27 @@ function ChatContent() {
     }
   }[language];
 
+  // Sessions are paged newest first; X-Next-Cursor points at the next page.
+  const fetchSessions = async (cursor: string | null = null) => {
+    if (!token) return;
+    try {
+      const url = new URL(`${API_BASE_URL}/sessions`);
+      if (cursor) url.searchParams.append("cursor", cursor);
+      const res = await fetch(url.toString(), {
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      if (res.ok) {
+        const data = await res.json();
+        setSessions(prev => (cursor ? [...prev, ...data] : data));
+        setSessionsCursor(res.headers.get("X-Next-Cursor"));
+      }
+    } catch (err) {
+      console.error("Failed to fetch sessions:", err);
+    }
+  };
+
   // Fetch sessions on load
   useEffect(() => {
-    const fetchSessions = async () => {
-      if (!token) return;
-      try {
-        const res = await fetch(`${API_BASE_URL}/sessions`, {
-          headers: { Authorization: `Bearer ${token}` },
-        });
-        if (res.ok) {
-          const data = await res.json();
-          setSessions(data);
-        }
-      } catch (err) {
-        console.error("Failed to fetch sessions:", err);
-      }
-    };
     fetchSessions();
   }, [token]);
 
@@ -181,11 +189,22 @@ function ChatContent() {
     // Clear URL params to avoid re-triggering search on reload
     router.replace('/chat');
     try {
-      const res = await fetch(`${API_BASE_URL}/history/${sessionId}`, {
-        headers: { Authorization: `Bearer ${token}` },
-      });
+      // History is paged oldest first; follow the cursor to load the whole conversation.
+      const data: any[] = [];
+      let cursor: string | null = null;
+      let res: Response;
+      do {
+        const url = new URL(`${API_BASE_URL}/history/${sessionId}`);
+        url.searchParams.append("limit", "500");
+        if (cursor) url.searchParams.append("cursor", cursor);
+        res = await fetch(url.toString(), {
+          headers: { Authorization: `Bearer ${token}` },
+        });
+        if (!res.ok) break;
+        data.push(...(await res.json()));
+        cursor = res.headers.get("X-Next-Cursor");
+      } while (cursor);
       if (res.ok) {
-        const data = await res.json();
         const formattedMessages = data.flatMap((m: any) => [
           { role: "user", content: m.query },
           { role: "assistant", content: m.response }
@@ -247,7 +266,7 @@ function ChatContent() {
       const headers: Record<string, string> = { "Content-Type": "application/json" };
       if (token) headers["Authorization"] = `Bearer ${token}`;
 
-      const url = new URL(`${API_BASE_URL}/query`);
+      const url = new URL(`${API_BASE_URL}/query/stream`);
       url.searchParams.append("query", finalQuery);
       url.searchParams.append("mode", researchMode);
       if (sessionId) url.searchParams.append("session_id", sessionId.toString());
@@ -257,24 +276,61 @@ function ChatContent() {
         headers,
       });
 
-      if (!response.ok) throw new Error("Search failed");
-      const data = await response.json();
-
-      setMessages((prev) => [...prev, { 
-        role: "assistant", 
-        content: data.response,
-        sources_found: data.sources_found,
-        citations: data.citations,
-        sources: data.sources
-      }]);
-
-      // If a new session was created, update state
-      if (!currentSessionId && data.session_id) {
-        setCurrentSessionId(data.session_id);
-        const newSession = { id: data.session_id, title: data.session_title, created_at: new Date().toISOString() };
-        setSessions(prev => [newSession, ...prev]);
+      if (!response.ok || !response.body) throw new Error("Search failed");
+
+      // Server-Sent Events: a "sources" frame first, then "token" frames, then "done".
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let started = false;
+
+      const handleEvent = (event: string, data: any) => {
+        if (event === "sources") {
+          started = true;
+          setMessages((prev) => [...prev, {
+            role: "assistant",
+            content: "",
+            sources_found: data.sources_found,
+            citations: data.citations,
+            sources: data.sources
+          }]);
+
+          // If a new session was created, update state
+          if (!currentSessionId && data.session_id) {
+            setCurrentSessionId(data.session_id);
+            const newSession = { id: data.session_id, title: data.session_title, created_at: new Date().toISOString() };
+            setSessions(prev => [newSession, ...prev]);
+          }
+        } else if (event === "token" && started) {
+          setMessages((prev) => {
+            const last = prev[prev.length - 1];
+            return [...prev.slice(0, -1), { ...last, content: last.content + data.text }];
+          });
+        }
+      };
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary = buffer.indexOf("\n\n");
+        while (boundary !== -1) {
+          const frame = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          let event = "message";
+          let data = "";
+          for (const line of frame.split("\n")) {
+            if (line.startsWith("event: ")) event = line.slice(7);
+            else if (line.startsWith("data: ")) data += line.slice(6);
+          }
+          if (data) handleEvent(event, JSON.parse(data));
+          boundary = buffer.indexOf("\n\n");
+        }
       }
 
+      if (!started) throw new Error("Empty stream");
+
     } catch {
       setMessages((prev) => [...prev, {
         role: "assistant",
@@ -409,6 +465,14 @@ function ChatContent() {
                 <p className="text-[10px] font-black uppercase tracking-widest">{t.noHistory}</p>
               </div>
             )}
+            {sessionsCursor && (
+              <button
+                onClick={() => fetchSessions(sessionsCursor)}
+                className="w-full py-3 text-[10px] font-black uppercase tracking-widest text-slate-600 hover:text-emerald-400 transition-colors"
+              >
+                {t.loadMore}
+              </button>
+            )}
           </nav>
           
           <div className="p-4 border-t border-slate-800 bg-slate-950/20">
@@ -38,12 +38,12 @@ export default function DashboardPage() {
     const fetchHistory = async () => {
       if (!token) return;
       try {
-        const res = await fetch(`${API_BASE_URL}/sessions`, {
+        const res = await fetch(`${API_BASE_URL}/sessions?limit=5`, {
           headers: { Authorization: `Bearer ${token}` }
         });
         if (res.ok) {
           const data = await res.json();
-          setHistoryItems(data.slice(0, 5)); // Just top 5 for dashboard
+          setHistoryItems(data); // Just top 5 for dashboard
         }
       } catch (err) {
         console.error("Dashboard history fetch failed:", err);
@@ -52,12 +52,12 @@ export default function DashboardPage() {
     const fetchLibrary = async () => {
       if (!token) return;
       try {
-        const res = await fetch(`${API_BASE_URL}/library`, {
+        const res = await fetch(`${API_BASE_URL}/library/count`, {
           headers: { Authorization: `Bearer ${token}` }
         });
         if (res.ok) {
           const data = await res.json();
-          setLibraryCount(data.length);
+          setLibraryCount(data.count);
         }
       } catch (err) {
         console.error("Dashboard library fetch failed:", err);
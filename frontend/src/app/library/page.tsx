@@ -22,6 +22,8 @@ export default function LibraryPage() {
   const { user, token, isLoading } = useAuth();
   const [citations, setCitations] = useState<any[]>([]);
   const [filter, setFilter] = useState("all");
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [fullContent, setFullContent] = useState<Record<number, string>>({});
   const router = useRouter();
 
   useEffect(() => {
@@ -30,15 +32,19 @@ export default function LibraryPage() {
     }
   }, [user, isLoading, router]);
 
-  const fetchLibrary = async () => {
+  // The list carries previews only; X-Next-Cursor points at the next page.
+  const fetchLibrary = async (cursor: string | null = null) => {
     if (!token) return;
     try {
-      const res = await fetch(`${API_BASE_URL}/library`, {
+      const url = new URL(`${API_BASE_URL}/library`);
+      if (cursor) url.searchParams.append("cursor", cursor);
+      const res = await fetch(url.toString(), {
         headers: { Authorization: `Bearer ${token}` }
       });
       if (res.ok) {
         const data = await res.json();
-        setCitations(data);
+        setCitations(prev => (cursor ? [...prev, ...data] : data));
+        setNextCursor(res.headers.get("X-Next-Cursor"));
       }
     } catch (err) {
       console.error("Library fetch failed:", err);
@@ -49,6 +55,28 @@ export default function LibraryPage() {
     fetchLibrary();
   }, [token]);
 
+  const toggleSource = async (id: number) => {
+    if (fullContent[id] !== undefined) {
+      setFullContent(prev => {
+        const { [id]: _, ...rest } = prev;
+        return rest;
+      });
+      return;
+    }
+    if (!token) return;
+    try {
+      const res = await fetch(`${API_BASE_URL}/library/${id}`, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      if (res.ok) {
+        const data = await res.json();
+        setFullContent(prev => ({ ...prev, [id]: data.content }));
+      }
+    } catch (err) {
+      console.error("Source fetch failed:", err);
+    }
+  };
+
   const deleteCitation = async (id: number) => {
     if (!token) return;
     try {
@@ -108,6 +136,7 @@ export default function LibraryPage() {
 
         <div className="p-8 max-w-7xl mx-auto">
           {filteredCitations.length > 0 ? (
+            <>
             <div className="grid md:grid-cols-2 gap-6">
               {filteredCitations.map((citation, i) => {
                 const style = getTypeStyle(citation.source_type);
@@ -140,8 +169,8 @@ export default function LibraryPage() {
                     </div>
 
                     <div className="flex-1 bg-slate-950/50 rounded-2xl p-4 border border-slate-800/50 mb-4">
-                      <p className="text-sm text-slate-300 line-clamp-4 italic leading-relaxed">
-                        "{citation.content}"
+                      <p className={`text-sm text-slate-300 italic leading-relaxed ${fullContent[citation.id] !== undefined ? "whitespace-pre-wrap" : "line-clamp-4"}`}>
+                        "{fullContent[citation.id] ?? citation.preview}"
                       </p>
                     </div>
 
@@ -149,8 +178,11 @@ export default function LibraryPage() {
                       <span className="text-[10px] font-black uppercase tracking-widest text-slate-600 italic">
                         Saved on {new Date(citation.timestamp).toLocaleDateString()}
                       </span>
-                      <button className="flex items-center gap-2 text-xs font-black text-emerald-500 hover:text-emerald-400 transition-colors uppercase tracking-widest">
-                        View Source
+                      <button
+                        onClick={() => toggleSource(citation.id)}
+                        className="flex items-center gap-2 text-xs font-black text-emerald-500 hover:text-emerald-400 transition-colors uppercase tracking-widest"
+                      >
+                        {fullContent[citation.id] !== undefined ? "Hide Source" : "View Source"}
                         <ExternalLink className="w-3 h-3" />
                       </button>
                     </div>
@@ -158,6 +190,15 @@ export default function LibraryPage() {
                 );
               })}
             </div>
+            {nextCursor && (
+              <button
+                onClick={() => fetchLibrary(nextCursor)}
+                className="mt-8 mx-auto flex items-center gap-2 text-xs font-black text-slate-500 hover:text-emerald-400 transition-colors uppercase tracking-widest"
+              >
+                Load More
+              </button>
+            )}
+            </>
           ) : (
             <div className="bg-slate-900/20 border border-dashed border-slate-800 rounded-3xl p-24 text-center mt-20">
               <Bookmark className="w-16 h-16 text-slate-700 mx-auto mb-6" />